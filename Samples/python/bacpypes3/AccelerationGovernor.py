@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+from bacpypes3.primitivedata import Real
+from PresentValueReadWriter import PresentValueReadWriter
+
+class AccelerationGovernor():
+    """制御の処理時間とエミュレータの遅れに合わせて加速度を調整するクラス
+
+    1ステップごとに制御の処理時間を測り、adjust_interval_stepsステップごとに加速度を見直す。
+    余裕があれば加速度をincreaseだけ上げ（加算的増加）、ステップの取りこぼし、処理時間の超過、
+    エミュレータの遅れのいずれかがあればdecrease倍に下げる（乗算的減少）。
+    加速度はDateTimeControllerのanalogOutput:2に書き込む。
+    """
+
+# region コンストラクタ
+
+    def __init__(self, comm, min_rate=60, max_rate=6000, increase=60, decrease=0.5,
+                 target_utilization=0.7, adjust_interval_steps=10):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス（subscribe_date_time_cov済みであること）
+            min_rate (float): 加速度の下限
+            max_rate (float): 加速度の上限
+            increase (float): 余裕がある場合に上げる加速度
+            decrease (float): 遅れがある場合に加速度に掛ける係数（0～1）
+            target_utilization (float): 1ステップの実時間のうち制御に使ってよい割合（0～1）
+            adjust_interval_steps (int): 加速度を見直す間隔[ステップ]
+        """
+        self.comm = comm
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.target_utilization = target_utilization
+        self.adjust_interval_steps = adjust_interval_steps
+
+        # 見直しまでに記録した値
+        self._latencies = []
+        self._skipped = 0
+        self._max_lag_sec = 0.0
+
+        # 見直しの履歴（適用された加速度, 最大処理時間[sec], 取りこぼしたステップ数, エミュレータの最大の遅れ[sec]）
+        self.history = []
+
+# endregion
+
+# region 加速度の操作
+
+    def get_acceleration_rate(self):
+        """現在の加速度を取得する
+
+        Returns:
+            float: 加速度
+        """
+        return self.comm.acc_rate if 0 < self.comm.acc_rate else self.comm.default_acc_rate
+
+    async def set_acceleration_rate(self, rate):
+        """加速度を書き込む（下限と上限の範囲に収める）
+
+        Args:
+            rate (float): 加速度
+
+        Returns:
+            list(bool,object): 書き込み成功の真偽,エラー
+        """
+        rate = min(self.max_rate, max(self.min_rate, rate))
+        return await self.comm.write_present_value(self.comm.dtc_id, 'analogOutput:2', Real(rate))
+
+    def get_emulator_lag(self):
+        """エミュレータの遅れ[sec]（シミュレーション時間）を取得する
+
+        加速度から外挿した現在の日時と、エミュレータが最後に進めたステップの日時の差から、1ステップ分を除いた値。
+
+        Returns:
+            float: エミュレータの遅れ[sec]
+        """
+        if self.comm.latest_step is None:
+            return 0.0
+        lag = (self.comm.current_date_time() - self.comm.latest_step).total_seconds() - self.comm.timestep_sec
+        return max(0.0, lag)
+
+# endregion
+
+# region 制御の実行
+
+    async def run(self, control):
+        """ステップごとに制御を実行しながら加速度を調整する
+
+        Args:
+            control (callable): ステップの日時を引数にとるコルーチン関数（1ステップ分の制御）
+        """
+        while True:
+            step, skipped = await self.comm.next_step()
+            start = time.perf_counter()
+            await control(step)
+            await self.record(time.perf_counter() - start, skipped)
+
+    async def record(self, latency_sec, skipped_steps=0):
+        """1ステップ分の制御の処理時間を記録し、必要に応じて加速度を見直す
+
+        runを使わずに自前のループで制御する場合に呼ぶ。
+
+        Args:
+            latency_sec (float): 制御の処理時間[sec]
+            skipped_steps (int): 取りこぼしたステップの数
+
+        Returns:
+            float: 見直した場合は適用された加速度（書き込めなかった場合は元の加速度）、見直さなかった場合はNone
+        """
+        self._latencies.append(latency_sec)
+        self._skipped += skipped_steps
+        self._max_lag_sec = max(self._max_lag_sec, self.get_emulator_lag())
+        if len(self._latencies) < self.adjust_interval_steps:
+            return None
+        return await self._adjust()
+
+    async def _adjust(self):
+        rate = self.get_acceleration_rate()
+        max_latency = max(self._latencies)
+
+        # 1ステップの実時間[sec]
+        budget = self.comm.timestep_sec / rate if 0 < rate else float('inf')
+        behind = (0 < self._skipped or
+                  budget * self.target_utilization < max_latency or
+                  self.comm.timestep_sec < self._max_lag_sec)
+        new_rate = rate * self.decrease if behind else rate + self.increase
+        new_rate = min(self.max_rate, max(self.min_rate, new_rate))
+
+        # 書き込めなかった場合は加速度は変わっていない
+        if new_rate != rate:
+            success, _ = await self.set_acceleration_rate(new_rate)
+            if not success:
+                new_rate = rate
+
+        self.history.append((new_rate, max_latency, self._skipped, self._max_lag_sec))
+        self._latencies = []
+        self._skipped = 0
+        self._max_lag_sec = 0.0
+        return new_rate
+
+# endregion
+
+# region サンプル
+
+async def main():
+    comm = PresentValueReadWriter(60, 'governor')
+    await comm.subscribe_date_time_cov()
+
+    governor = AccelerationGovernor(comm, min_rate=60, max_rate=3000)
+
+    async def control(step):
+        print(step.strftime('%Y/%m/%d %H:%M:%S') + ' x' + str(governor.get_acceleration_rate()))
+
+    await governor.run(control)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import math
+
+from bacpypes3.apdu import ErrorRejectAbortNack, ErrorPDU, RejectPDU, RejectReason
+from PresentValueReadWriter import PresentValueReadWriter
+from VRFSystemCommunicator import VRFSystemCommunicator
+
+logger = logging.getLogger(__name__)
+
+class AcquisitionPlanner():
+    """点ごとの変化の頻度を観測し、COVと読み取りのどちらで取得するかを切り替えるクラス
+
+    最初は全ての点を読み取りで取得し、replan_interval_secごとに各点の変化の頻度（読み取り周期あたりの変化の回数）を
+    指数移動平均で更新する。COVは変化のたびに通知と確認応答の2パケットを要し、読み取りはRead property multiple 1回
+    （要求と応答の2パケット）でMAX_RPM_OBJECTS点を取得できるため、変化の頻度がその損益分岐点より低い静かな点から順に、
+    subscription_budgetの数までCOVへ切り替える。COVに切り替えた点が分岐点のHYSTERESIS倍より頻繁に変わるようになったら
+    読み取りへ戻す。COVに対応していない点（存在しないオブジェクトなどのエラーが返った点）は以降も読み取りで取得し、
+    無応答などの一時的な理由で購読が切れた点は読み取りへ戻して、次の見直しで再びCOVを試みる。
+    取得した値は登録した関数に渡し、valuesに保持する。
+    """
+
+# region 定数宣言
+
+    # COVに切り替える点とその後読み取りへ戻す点の、変化の頻度の閾値の比
+    HYSTERESIS = 2.0
+
+    # 変化の頻度の指数移動平均の重み
+    RATE_SMOOTHING = 0.5
+
+    # 1回の要求と応答、または1回の通知と確認応答のパケット数
+    PACKETS_PER_EXCHANGE = 2
+
+    # COVに対応していないことを表すエラーコード（これ以外の失敗は一時的なものとみなす）
+    COV_UNSUPPORTED_ERROR_CODES = ('unknown-object', 'unknown-property', 'optional-functionality-not-supported')
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, comm, points, subscription_budget=32, poll_interval_sec=1.0, replan_interval_sec=60.0,
+                 quiet_changes_per_poll=None):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス
+            points (list(list(str,str))): 取得する（通信先のアドレス, オブジェクトID）のリスト
+            subscription_budget (int): 同時に購読するCOVの数の上限
+            poll_interval_sec (float): 読み取りで取得する点を読み取る周期[sec]
+            replan_interval_sec (float): 取得方法を見直す周期[sec]
+            quiet_changes_per_poll (float): 読み取り周期あたりの変化の回数がこれ未満の点をCOVの候補とする
+            （Noneの場合はパケット数の損益分岐点の1/MAX_RPM_OBJECTS）
+        """
+        self.comm = comm
+        self.points = [(addr, obj_id) for addr, obj_id in points]
+        self.subscription_budget = subscription_budget
+        self.poll_interval = poll_interval_sec
+        self.replan_interval = replan_interval_sec
+        self.quiet_threshold = 1.0 / PresentValueReadWriter.MAX_RPM_OBJECTS \
+            if quiet_changes_per_poll is None else quiet_changes_per_poll
+
+        # 点ごとの最新のPresent value
+        self.values = {}
+
+        # 点ごとの状態（'poll'または'cov'）、変化の頻度（読み取り周期あたり）、COVを購読できるか否か
+        self.plan = {point: {'mode': 'poll', 'changes_per_poll': None, 'cov_supported': True} for point in self.points}
+
+        # 見直しの回数と、切り替えた回数
+        self.stats = {'replans': 0, 'switched_to_cov': 0, 'switched_to_poll': 0}
+
+        self._handlers = []
+        self._changes = {point: 0 for point in self.points}
+        self._window_start = None
+        self._cov_tasks = {}
+        self._cov_stops = {}
+        self._tasks = []
+
+# endregion
+
+# region ハンドラの登録
+
+    def add_value_handler(self, handler):
+        """値を取得した際に呼ばれる関数を登録する
+
+        Args:
+            handler (callable): 通信先のアドレス, オブジェクトID, Present valueを引数にとる関数（コルーチン関数も可）
+        """
+        self._handlers.append(handler)
+
+    def remove_value_handler(self, handler):
+        """値を取得した際に呼ばれる関数の登録を解除する
+
+        Args:
+            handler (callable): 登録済みの関数
+        """
+        self._handlers.remove(handler)
+
+# endregion
+
+# region 開始と停止
+
+    def start(self):
+        """読み取りと見直しのタスクを開始する
+        """
+        if len(self._tasks) == 0:
+            self._window_start = asyncio.get_running_loop().time()
+            self._tasks = [asyncio.create_task(self._poll_loop()), asyncio.create_task(self._replan_loop())]
+
+    async def stop(self):
+        """全てのCOVの購読を解除し、タスクを止める
+        """
+        for point in list(self._cov_tasks):
+            self._cov_stops[point].set()
+        await asyncio.gather(*self._cov_tasks.values(), return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+# endregion
+
+# region 計画
+
+    def get_plan(self):
+        """現在の取得方法と、見込みのパケット数を取得する
+
+        Returns:
+            dict: 点ごとの状態（'points'）、COVの点の数（'cov'）、読み取りの点の数（'poll'）、
+            1時間あたりの見込みのパケット数（'packets_per_hour'）、
+            シミュレーション上の1時間あたりの見込みのパケット数（'packets_per_sim_hour'、加速度が不明な場合はNone）
+        """
+        packets_per_sec = self.estimate_packets_per_sec()
+        acc_rate = getattr(self.comm, 'acc_rate', None) if getattr(self.comm, 'dt_synchronized', False) else None
+        return {
+            'points': {point: dict(state) for point, state in self.plan.items()},
+            'cov': sum(1 for state in self.plan.values() if state['mode'] == 'cov'),
+            'poll': sum(1 for state in self.plan.values() if state['mode'] == 'poll'),
+            'packets_per_hour': packets_per_sec * 3600,
+            'packets_per_sim_hour': None if not acc_rate else packets_per_sec * 3600 / acc_rate,
+        }
+
+    def estimate_packets_per_sec(self):
+        """現在の取得方法で見込まれる1秒あたりのパケット数を求める
+
+        Returns:
+            float: パケット数[/sec]
+        """
+        polled = {}
+        cov_changes_per_poll = 0.0
+        for (addr, _), state in self.plan.items():
+            if state['mode'] == 'poll':
+                polled[addr] = polled.get(addr, 0) + 1
+            else:
+                cov_changes_per_poll += state['changes_per_poll'] or 0.0
+        requests = sum(math.ceil(n / PresentValueReadWriter.MAX_RPM_OBJECTS) for n in polled.values())
+        return self.PACKETS_PER_EXCHANGE * (requests + cov_changes_per_poll) / self.poll_interval
+
+    def replan(self):
+        """観測した変化の頻度から取得方法を見直す
+
+        Returns:
+            list(list(str,str)): （点, 新しい取得方法）のリスト
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        polls = max(1e-9, (now - self._window_start) / self.poll_interval)
+        self._window_start = now
+        for point, state in self.plan.items():
+            rate = self._changes[point] / polls
+            self._changes[point] = 0
+            old = state['changes_per_poll']
+            state['changes_per_poll'] = rate if old is None else \
+                self.RATE_SMOOTHING * rate + (1 - self.RATE_SMOOTHING) * old
+
+        switches = []
+        # 頻繁に変わるようになったCOVの点は読み取りへ戻す
+        for point, state in self.plan.items():
+            if state['mode'] == 'cov' and self.HYSTERESIS * self.quiet_threshold <= state['changes_per_poll']:
+                switches.append((point, 'poll'))
+
+        # 静かな点から順に、予算の範囲でCOVへ切り替える
+        cov_count = sum(1 for state in self.plan.values() if state['mode'] == 'cov') - len(switches)
+        candidates = sorted((state['changes_per_poll'], point) for point, state in self.plan.items()
+                            if state['mode'] == 'poll' and state['cov_supported']
+                            and state['changes_per_poll'] < self.quiet_threshold)
+        for _, point in candidates[:max(0, self.subscription_budget - cov_count)]:
+            switches.append((point, 'cov'))
+
+        for point, mode in switches:
+            self._switch(point, mode)
+        self.stats['replans'] += 1
+        return switches
+
+    def _switch(self, point, mode):
+        self.plan[point]['mode'] = mode
+        if mode == 'cov':
+            self.stats['switched_to_cov'] += 1
+            self._cov_stops[point] = asyncio.Event()
+            self._cov_tasks[point] = asyncio.create_task(self._cov(point))
+        else:
+            self.stats['switched_to_poll'] += 1
+            self._cov_stops[point].set()
+
+    async def _replan_loop(self):
+        while True:
+            await asyncio.sleep(self.replan_interval)
+            self.replan()
+
+# endregion
+
+# region 取得
+
+    async def poll(self):
+        """読み取りで取得する点をまとめて読み取る
+        """
+        by_addr = {}
+        for point, state in self.plan.items():
+            if state['mode'] == 'poll':
+                by_addr.setdefault(point[0], []).append(point[1])
+
+        async def read(addr, obj_ids):
+            vals = await self.comm.read_present_values(addr, obj_ids)
+            for obj_id, (success, value) in zip(obj_ids, vals):
+                if success:
+                    await self._on_value(addr, obj_id, value)
+
+        await asyncio.gather(*[read(addr, obj_ids) for addr, obj_ids in by_addr.items()])
+
+    async def _poll_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await self.poll()
+            await asyncio.sleep(max(0.0, self.poll_interval - (loop.time() - start)))
+
+    async def _cov(self, point):
+        addr, obj_id = point
+        stop = self._cov_stops[point]
+        try:
+            await self.comm.subscribe_present_value_cov(addr, obj_id, self._on_value, stop)
+        except asyncio.CancelledError:
+            raise
+        except (Exception, ErrorRejectAbortNack) as err:
+            logger.warning('COV subscription of %s at %s failed (%s), polling instead', obj_id, addr, err)
+            if self._is_cov_unsupported(err):
+                self.plan[point]['cov_supported'] = False
+        finally:
+            # 止められずに購読が終わった点は読み取りへ戻す
+            if not stop.is_set() and self.plan[point]['mode'] == 'cov':
+                self.plan[point]['mode'] = 'poll'
+                self.stats['switched_to_poll'] += 1
+            if self._cov_tasks.get(point) is asyncio.current_task():
+                del self._cov_tasks[point]
+                del self._cov_stops[point]
+
+    def _is_cov_unsupported(self, err):
+        if isinstance(err, RejectPDU):
+            return err.apduAbortRejectReason == RejectReason.unrecognizedService
+        return isinstance(err, ErrorPDU) and str(getattr(err, 'errorCode', '')) in self.COV_UNSUPPORTED_ERROR_CODES
+
+    async def _on_value(self, addr, obj_id, value):
+        point = (addr, obj_id)
+        if point in self.values and self.values[point] != value:
+            self._changes[point] += 1
+        self.values[point] = value
+        for handler in list(self._handlers):
+            rslt = handler(addr, obj_id, value)
+            if asyncio.iscoroutine(rslt):
+                await rslt
+
+# endregion
+
+# region サンプル
+
+async def main():
+    # VRFの全室内機の状態を取得し、変化の少ない点をCOVへ切り替える
+    vrfCom = VRFSystemCommunicator(15)
+    await vrfCom.subscribe_date_time_cov()
+    points = []
+    for oIndx, iIndx in vrfCom._get_iu_indices():
+        for _, obj_type, mem, _ in vrfCom._IU_SNAPSHOT_POINTS:
+            points.append((vrfCom.target_ip, obj_type + ':' + vrfCom._get_iu_objNum(oIndx, iIndx, mem.value)))
+
+    planner = AcquisitionPlanner(vrfCom, points)
+    planner.start()
+    while True:
+        await asyncio.sleep(planner.replan_interval)
+        plan = planner.get_plan()
+        print('cov ' + str(plan['cov']) + ', poll ' + str(plan['poll']) +
+              ', ' + '{:.0f}'.format(plan['packets_per_hour']) + ' packets/h' +
+              ('' if plan['packets_per_sim_hour'] is None else
+               ', ' + '{:.1f}'.format(plan['packets_per_sim_hour']) + ' packets/sim h'))
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -0,0 +1,546 @@
+import asyncio
+import datetime
+import json
+import logging
+import time
+
+from bacpypes3.primitivedata import ObjectIdentifier, Enumerated, Real, Unsigned
+from bacpypes3.basetypes import BinaryPV
+from bacpypes3.apdu import ErrorRejectAbortNack
+from VRFSystemCommunicator import VRFSystemCommunicator
+
+logger = logging.getLogger(__name__)
+
+class GatewayError(Exception):
+    """CachingGatewayが要求をエラーとして返したことを表す例外
+    """
+
+class CachingGateway():
+    """エミュレータの点を1つのクライアントとして取得して保持し、ローカルの複数のクライアントに配信するクラス
+
+    COVを購読できる点はCOVで、それ以外の点は定期的なRead property multipleで取得し、最新の値を保持する。
+    クライアントとはTCPで改行区切りのJSONをやり取りし、購読した点の値が変わるたびに差分を送る。
+    送り切れていない差分は点ごとに最新の値だけを残すため、遅いクライアントがいても他のクライアントやエミュレータを待たせない。
+    クライアントからの書き込みはWRITE_COALESCE_SECの間まとめ、同じ点への書き込みは最後の値だけをエミュレータへ送る。
+
+    要求:
+        {"op": "subscribe", "points": [[addr, obj_id], ...]}（pointsを省略すると全ての点）
+        {"op": "unsubscribe"}
+        {"op": "read", "id": 任意, "points": [[addr, obj_id], ...]}（pointsを省略すると全ての点）
+        {"op": "write", "id": 任意, "addr": addr, "obj_id": obj_id, "value": 値}
+    応答と通知:
+        {"op": "delta", "values": [[addr, obj_id, 値, 更新時刻[UNIX時間]], ...]}（購読した直後は全ての値）
+        {"op": "values", "id": 要求のid, "values": [[addr, obj_id, 値, 更新時刻[UNIX時間]], ...]}
+        {"op": "written", "id": 要求のid, "success": 成功の真偽, "error": エラーの内容}
+        {"op": "error", "id": 要求のid（要求を解釈できなかった場合はNone）, "message": エラーの内容}
+    """
+
+# region 定数宣言
+
+    # 既定の待ち受けポート
+    DEFAULT_PORT = 47900
+
+    # 書き込みをまとめる時間[sec]
+    WRITE_COALESCE_SEC = 0.1
+
+    # COVの購読に失敗した点を読み取りで取得し、購読をやり直すまでの時間[sec]
+    COV_RETRY_SEC = 60.0
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, comm, points, cov_points=(), sweep_interval_sec=1.0, host='127.0.0.1', port=DEFAULT_PORT):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): エミュレータとの通信に使うインスタンス
+            points (list(list(str,str))): 保持する（通信先のアドレス, オブジェクトID）のリスト
+            cov_points (list(list(str,str))): pointsのうちCOVで取得する点のリスト
+            sweep_interval_sec (float): COVで取得しない点を読み取る周期[sec]
+            host (str): 待ち受けるIP Address
+            port (int): 待ち受けるポート
+        """
+        self.comm = comm
+        self.points = [(addr, obj_id) for addr, obj_id in points]
+        self.cov_points = [(addr, obj_id) for addr, obj_id in cov_points]
+        self.sweep_interval = sweep_interval_sec
+        self.host = host
+        self.port = port
+
+        # 点ごとの（値, 更新時刻[UNIX時間]）
+        self.values = {}
+
+        # 統計（読み取りの回数, COVの通知の数, エミュレータへ送った書き込みの数, クライアントから受けた書き込みの数）
+        self.stats = {'sweeps': 0, 'cov_notifications': 0, 'writes_sent': 0, 'writes_received': 0}
+
+        self._point_set = set(self.points)
+        self._cov_active = set()
+        self._clients = []
+        self._pending_writes = {}
+        self._write_event = asyncio.Event()
+        self._server = None
+        self._tasks = []
+        self._write_handlers = set()
+
+# endregion
+
+# region 開始と停止
+
+    async def start(self):
+        """最初の読み取りを行ってから、取得のタスクとクライアントの待ち受けを開始する
+        """
+        await self.sweep()
+        self._tasks = [asyncio.create_task(self._sweep_loop()), asyncio.create_task(self._write_loop())]
+        for addr, obj_id in self.cov_points:
+            self._tasks.append(asyncio.create_task(self._cov_loop(addr, obj_id)))
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+
+    async def stop(self):
+        """クライアントとの接続を閉じ、取得のタスクを止める
+        """
+        if self._server is not None:
+            self._server.close()
+            for client in list(self._clients):
+                client.close()
+            await self._server.wait_closed()
+            self._server = None
+        tasks = self._tasks + list(self._write_handlers)
+        for task in tasks:
+            task.cancel()
+        # 止める前に例外で終わっていたタスクがあっても、残りのタスクを止めきる
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._write_handlers.clear()
+
+    async def serve_forever(self):
+        """開始してから、キャンセルされるまで動き続ける
+        """
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+# endregion
+
+# region 取得
+
+    async def sweep(self):
+        """COVで取得していない点をまとめて読み取る
+        """
+        by_addr = {}
+        for point in self.points:
+            if point not in self._cov_active:
+                by_addr.setdefault(point[0], []).append(point[1])
+
+        async def read(addr, obj_ids):
+            vals = await self.comm.read_present_values(addr, obj_ids)
+            for obj_id, (success, value) in zip(obj_ids, vals):
+                if success:
+                    self._update(addr, obj_id, value)
+
+        await asyncio.gather(*[read(addr, obj_ids) for addr, obj_ids in by_addr.items()])
+        self.stats['sweeps'] += 1
+
+    async def _sweep_loop(self):
+        while True:
+            start = time.monotonic()
+            await self.sweep()
+            await asyncio.sleep(max(0.0, self.sweep_interval - (time.monotonic() - start)))
+
+    async def _cov_loop(self, addr, obj_id):
+        def on_value(addr, obj_id, value):
+            self._cov_active.add((addr, obj_id))
+            self.stats['cov_notifications'] += 1
+            self._update(addr, obj_id, value)
+
+        while True:
+            try:
+                await self.comm.subscribe_present_value_cov(addr, obj_id, on_value)
+            except asyncio.CancelledError:
+                raise
+            except (Exception, ErrorRejectAbortNack) as err:
+                logger.warning('COV subscription of %s at %s failed (%s), polling instead', obj_id, addr, err)
+            finally:
+                self._cov_active.discard((addr, obj_id))
+            await asyncio.sleep(self.COV_RETRY_SEC)
+
+    def _update(self, addr, obj_id, value):
+        point = (addr, obj_id)
+        old = self.values.get(point)
+        now = time.time()
+        self.values[point] = (value, now)
+        if old is not None and old[0] == value:
+            return
+        for client in self._clients:
+            client.push(point, value, now)
+
+# endregion
+
+# region 書き込み
+
+    async def write(self, addr, obj_id, value):
+        """書き込みを受け付け、エミュレータへ送った結果を待つ
+
+        WRITE_COALESCE_SECの間に同じ点へ書き込まれた場合は最後の値だけを送り、全ての呼び出し元にその結果を返す。
+        オブジェクトの種類に合わない値は送らずに失敗とする。
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+            value (object): 書き込む値（オブジェクトの種類に合わせて変換する）
+
+        Returns:
+            list: 書き込み成功の真偽, エラー
+        """
+        self.stats['writes_received'] += 1
+        try:
+            value = self._to_bacnet_value(obj_id, value)
+        except (ValueError, TypeError) as err:
+            return False, err
+        future = asyncio.get_running_loop().create_future()
+        point = (addr, obj_id)
+        _, futures = self._pending_writes.get(point, (None, []))
+        futures.append(future)
+        self._pending_writes[point] = (value, futures)
+        self._write_event.set()
+        return await future
+
+    async def _write_loop(self):
+        while True:
+            await self._write_event.wait()
+            await asyncio.sleep(self.WRITE_COALESCE_SEC)
+            self._write_event.clear()
+            pending = self._pending_writes
+            self._pending_writes = {}
+
+            by_addr = {}
+            for (addr, obj_id), (value, futures) in pending.items():
+                by_addr.setdefault(addr, []).append((obj_id, value, futures))
+
+            async def write(addr, items):
+                # 1つの通信先への書き込みが例外で終わっても、その呼び出し元に結果を返して書き込みを続ける
+                rslts = None
+                try:
+                    rslts = await self.comm.write_present_values(addr, [(obj_id, value) for obj_id, value, _ in items])
+                    self.stats['writes_sent'] += len(items)
+
+                    # 書き込んだ点は結果を返す前に読み直し、書き込んだクライアントが直後に読んでも新しい値が得られるようにする
+                    obj_ids = [obj_id for obj_id, _, _ in items if (addr, obj_id) in self._point_set]
+                    if 0 < len(obj_ids):
+                        vals = await self.comm.read_present_values(addr, obj_ids)
+                        for obj_id, (success, value) in zip(obj_ids, vals):
+                            if success:
+                                self._update(addr, obj_id, value)
+                except asyncio.CancelledError:
+                    raise
+                except (Exception, ErrorRejectAbortNack) as err:
+                    logger.warning('Writing to %s failed (%s)', addr, err)
+                    if rslts is None:
+                        rslts = [(False, err)] * len(items)
+
+                for (_, _, futures), rslt in zip(items, rslts):
+                    for future in futures:
+                        if not future.done():
+                            future.set_result(rslt)
+
+            await asyncio.gather(*[write(addr, items) for addr, items in by_addr.items()])
+
+    def _to_bacnet_value(self, obj_id, value):
+        # 変換できない値はValueErrorかTypeErrorを送出する
+        obj_type = str(ObjectIdentifier(obj_id)[0])
+        if obj_type.startswith('analog'):
+            return Real(float(value))
+        if obj_type.startswith('binary'):
+            return BinaryPV(value) if isinstance(value, str) else Enumerated(int(value))
+        if obj_type.startswith('multi-state'):
+            return Unsigned(int(value))
+        return value
+
+# endregion
+
+# region クライアントとの通信
+
+    class _Client():
+        def __init__(self, gateway, writer):
+            self.gateway = gateway
+            self.writer = writer
+            # 購読している点（Noneの場合は全ての点）
+            self.points = set()
+            # 送っていない差分（点ごとに最新の値だけを残す）
+            self.pending = {}
+            self.event = asyncio.Event()
+            self.sender = asyncio.create_task(self._send_loop())
+
+        def push(self, point, value, updated):
+            if self.points is None or point in self.points:
+                self.pending[point] = (value, updated)
+                self.event.set()
+
+        def send(self, message):
+            self.writer.write((json.dumps(message) + '\n').encode())
+
+        def close(self):
+            self.sender.cancel()
+            self.writer.close()
+
+        async def _send_loop(self):
+            while True:
+                await self.event.wait()
+                self.event.clear()
+                pending = self.pending
+                self.pending = {}
+                self.send({'op': 'delta', 'values': self.gateway._to_json_values(pending)})
+                # 送り切るまで次の差分はまとめておく
+                await self.writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        client = self._Client(self, writer)
+        self._clients.append(client)
+        try:
+            while True:
+                line = await reader.readline()
+                if line == b'':
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    await self._handle_request(client, request)
+                except (ValueError, KeyError, TypeError) as err:
+                    # 要求のidを返し、クライアントが応答を待ち続けないようにする
+                    client.send({'op': 'error', 'id': request.get('id') if isinstance(request, dict) else None,
+                                 'message': str(err)})
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.remove(client)
+            client.close()
+
+    async def _handle_request(self, client, request):
+        op = request['op']
+        if op == 'subscribe':
+            client.points = None if request.get('points') is None else self._to_points(request['points'])
+            for point in (self.points if client.points is None else client.points):
+                if point in self.values:
+                    client.push(point, *self.values[point])
+        elif op == 'unsubscribe':
+            client.points = set()
+            client.pending = {}
+        elif op == 'read':
+            points = self.points if request.get('points') is None else self._to_points(request['points'])
+            values = {point: self.values[point] for point in points if point in self.values}
+            client.send({'op': 'values', 'id': request.get('id'), 'values': self._to_json_values(values)})
+        elif op == 'write':
+            # 書き込みの結果を待つ間も他の要求を受け付ける
+            task = asyncio.create_task(self._handle_write(client, request))
+            self._write_handlers.add(task)
+            task.add_done_callback(self._write_handlers.discard)
+        else:
+            raise ValueError('unknown op ' + str(op))
+
+    async def _handle_write(self, client, request):
+        try:
+            success, err = await self.write(request['addr'], request['obj_id'], request['value'])
+        except asyncio.CancelledError:
+            raise
+        except (Exception, ErrorRejectAbortNack) as exc:
+            # 項目が欠けた要求なども、書き込みの失敗として返す
+            success, err = False, exc
+        client.send({'op': 'written', 'id': request.get('id'), 'success': success,
+                     'error': None if err is None else str(err)})
+
+    def _to_points(self, points):
+        points = set((addr, obj_id) for addr, obj_id in points)
+        unknown = points - self._point_set
+        if 0 < len(unknown):
+            raise KeyError('unknown points ' + str(sorted(unknown)))
+        return points
+
+    def _to_json_values(self, values):
+        return [[addr, obj_id, self._to_json(value), updated] for (addr, obj_id), (value, updated) in values.items()]
+
+    def _to_json(self, value):
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        if isinstance(value, (int, float)):
+            # RealやEnumeratedはfloatやintの派生型のため、JSONの数値に戻す
+            return int(value) if isinstance(value, int) else float(value)
+        return str(value)
+
+# endregion
+
+class GatewayClient():
+    """CachingGatewayに接続するクライアント
+    """
+
+# region コンストラクタ
+
+    def __init__(self, host='127.0.0.1', port=CachingGateway.DEFAULT_PORT):
+        """インスタンスを初期化する
+
+        Args:
+            host (str): CachingGatewayのIP Address
+            port (int): CachingGatewayのポート
+        """
+        self.host = host
+        self.port = port
+
+        # 受け取った点ごとの（値, 更新時刻[UNIX時間]）
+        self.values = {}
+
+        self._reader = None
+        self._writer = None
+        self._receiver = None
+        self._requests = {}
+        self._next_id = 0
+        self._updates = asyncio.Queue()
+
+# endregion
+
+# region 接続
+
+    async def connect(self):
+        """CachingGatewayに接続する
+        """
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._receiver = asyncio.create_task(self._receive_loop())
+
+    async def close(self):
+        """接続を閉じる
+        """
+        if self._receiver is not None:
+            self._receiver.cancel()
+            try:
+                await self._receiver
+            except asyncio.CancelledError:
+                pass
+            self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+# endregion
+
+# region 要求
+
+    async def subscribe(self, points=None):
+        """点の値の変化を購読する（購読した直後に現在の値が届く）
+
+        Args:
+            points (list(list(str,str))): 購読する（通信先のアドレス, オブジェクトID）のリスト（Noneの場合は全ての点）
+        """
+        await self._send({'op': 'subscribe', 'points': None if points is None else [list(p) for p in points]})
+
+    async def unsubscribe(self):
+        """購読をやめる
+        """
+        await self._send({'op': 'unsubscribe'})
+
+    async def read(self, points=None):
+        """CachingGatewayが保持している値を読み取る
+
+        Args:
+            points (list(list(str,str))): 読み取る（通信先のアドレス, オブジェクトID）のリスト（Noneの場合は全ての点）
+
+        Returns:
+            dict: 点ごとの（値, 更新時刻[UNIX時間]）（CachingGatewayが保持していない点を含む場合はGatewayErrorを送出する）
+        """
+        message = await self._request({'op': 'read', 'points': None if points is None else [list(p) for p in points]})
+        return {(addr, obj_id): (value, updated) for addr, obj_id, value, updated in message['values']}
+
+    async def write(self, addr, obj_id, value):
+        """CachingGatewayを介して書き込む
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+            value (object): 書き込む値
+
+        Returns:
+            list: 書き込み成功の真偽, エラーの内容
+        """
+        message = await self._request({'op': 'write', 'addr': addr, 'obj_id': obj_id, 'value': value})
+        return message['success'], message['error']
+
+    async def updates(self):
+        """購読した点の値が変わるたびに（通信先のアドレス, オブジェクトID, 値, 更新時刻[UNIX時間]）を返す
+
+        Returns:
+            AsyncIterator: 値の変化
+        """
+        while True:
+            yield await self._updates.get()
+
+# endregion
+
+# region 補助メソッド
+
+    async def _send(self, message):
+        self._writer.write((json.dumps(message) + '\n').encode())
+        await self._writer.drain()
+
+    async def _request(self, message):
+        self._next_id += 1
+        message['id'] = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._requests[self._next_id] = future
+        try:
+            await self._send(message)
+            return await future
+        finally:
+            self._requests.pop(message['id'], None)
+
+    async def _receive_loop(self):
+        while True:
+            line = await self._reader.readline()
+            if line == b'':
+                break
+            message = json.loads(line)
+            if message['op'] == 'delta':
+                for addr, obj_id, value, updated in message['values']:
+                    self.values[(addr, obj_id)] = (value, updated)
+                    self._updates.put_nowait((addr, obj_id, value, updated))
+            elif message['op'] == 'error':
+                future = self._requests.get(message.get('id'))
+                if future is not None and not future.done():
+                    future.set_exception(GatewayError(message['message']))
+                else:
+                    logger.warning('Gateway error: %s', message['message'])
+            else:
+                future = self._requests.get(message.get('id'))
+                if future is not None and not future.done():
+                    future.set_result(message)
+        for future in self._requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError('gateway closed the connection'))
+
+# endregion
+
+# region サンプル
+
+async def main():
+    # VRFの全室内機の状態と設定を保持する
+    vrfCom = VRFSystemCommunicator(14)
+    points = []
+    for oIndx, iIndx in vrfCom._get_iu_indices():
+        for _, obj_type, mem, _ in vrfCom._IU_SNAPSHOT_POINTS:
+            points.append((vrfCom.target_ip, obj_type + ':' + vrfCom._get_iu_objNum(oIndx, iIndx, mem.value)))
+        for obj_type, mem, _ in vrfCom._IU_SETTING_POINTS.values():
+            points.append((vrfCom.target_ip, obj_type + ':' + vrfCom._get_iu_objNum(oIndx, iIndx, mem.value)))
+
+    gateway = CachingGateway(vrfCom, points)
+    await gateway.start()
+    print('Gateway is listening on ' + gateway.host + ':' + str(gateway.port) + ' (' + str(len(points)) + ' points)')
+
+    # 同じプロセスからクライアントとして接続し、変化を表示する
+    client = GatewayClient()
+    await client.connect()
+    await client.subscribe()
+    async for addr, obj_id, value, updated in client.updates():
+        print(datetime.datetime.fromtimestamp(updated).strftime('%H:%M:%S') + ' ' + obj_id + ' = ' + str(value))
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -0,0 +1,178 @@
+import asyncio
+import weakref
+
+class ChangeEventBus():
+    """値の変化のイベントを購読者に配る、プロセス内のパブリッシュ・サブスクライブ
+
+    購読者ごとに上限のあるキューを持ち、いずれかのキューが一杯の場合はpublishが空くまで待つ。
+    そのため、処理の遅い購読者がいると発行側（読み取り）の速度がそれに合わせて落ちる。
+    ただし待つのはpublish_timeout_secまでとし、それでも空かない購読者は追いついていないとみなして、
+    キューが空になるまでその購読者の最も古いイベントを捨てて新しいイベントを入れる（発行側を際限なく止めないため）。
+    イベントは'kind'（点の種類）を持つdictとし、購読する種類を絞り込める。
+    購読はasync withで使うか、不要になったらcloseする。参照されなくなった購読も配る対象から外れる。
+    """
+
+# region 定数宣言
+
+    # 購読者のキューの既定の上限
+    DEFAULT_MAX_QUEUE = 100
+
+    # 購読者のキューが空くのを待つ既定の上限時間[sec]
+    DEFAULT_PUBLISH_TIMEOUT_SEC = 1.0
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, max_queue=DEFAULT_MAX_QUEUE, publish_timeout_sec=DEFAULT_PUBLISH_TIMEOUT_SEC):
+        """インスタンスを初期化する
+
+        Args:
+            max_queue (int): 購読者のキューの既定の上限
+            publish_timeout_sec (float): 購読者のキューが空くのを待つ上限時間[sec]
+        """
+        self.max_queue = max_queue
+        self.publish_timeout = publish_timeout_sec
+
+        # 統計（発行したイベントの数, 購読者のキューが空くのを待った回数と時間[sec], 捨てたイベントの数）
+        self.stats = {'published': 0, 'blocked': 0, 'blocked_sec': 0.0, 'dropped': 0}
+
+        # 購読（購読者が参照しなくなったら自動的に外れる）
+        self._subscriptions = weakref.WeakSet()
+
+# endregion
+
+# region 購読
+
+    class Subscription():
+        """ChangeEventBusの購読（async forでイベントを順に取り出す、async withで抜けると購読をやめる）
+        """
+
+        # closeしたことを取り出し待ちに知らせる印
+        _CLOSED = object()
+
+        def __init__(self, bus, kinds, max_queue):
+            self.bus = bus
+            self.kinds = None if kinds is None else set(kinds)
+            self.queue = asyncio.Queue(max_queue)
+            self.closed = False
+            self._close_event = asyncio.Event()
+            # 追いついていない（キューが空くまで待たずに古いイベントを捨てる）か否か
+            self.lagging = False
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_details):
+            self.close()
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if self.closed:
+                raise StopAsyncIteration
+            event = await self.queue.get()
+            if event is self._CLOSED:
+                raise StopAsyncIteration
+            if self.queue.empty():
+                self.lagging = False
+            return event
+
+        async def get(self):
+            """次のイベントを取り出す
+
+            Returns:
+                dict: イベント（closeした場合はNone）
+            """
+            try:
+                return await self.__anext__()
+            except StopAsyncIteration:
+                return None
+
+        def close(self):
+            """購読をやめる（取り出しを待っている処理と、キューが空くのを待っている発行を終わらせる）
+            """
+            if self.closed:
+                return
+            self.closed = True
+            self._close_event.set()
+            self.bus.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self._CLOSED)
+
+        async def aclose(self):
+            """購読をやめる（contextlib.aclosingで使うため）
+            """
+            self.close()
+
+    def subscribe(self, kinds=None, max_queue=None):
+        """イベントを購読する
+
+        Args:
+            kinds (list(str)): 購読する点の種類のリスト（Noneの場合は全ての種類）
+            max_queue (int): キューの上限（Noneの場合は既定の上限）
+
+        Returns:
+            ChangeEventBus.Subscription: 購読
+        """
+        subscription = self.Subscription(self, kinds, self.max_queue if max_queue is None else max_queue)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """購読をやめる
+
+        Args:
+            subscription (ChangeEventBus.Subscription): subscribeで得た購読
+        """
+        self._subscriptions.discard(subscription)
+
+# endregion
+
+# region 発行
+
+    async def publish(self, event):
+        """イベントを発行する（購読者のキューが一杯の場合はpublish_timeout_secまで空くのを待つ）
+
+        Args:
+            event (dict): イベント（'kind'で購読者を絞り込む）
+        """
+        loop = asyncio.get_running_loop()
+        for subscription in list(self._subscriptions):
+            if subscription.closed:
+                continue
+            if subscription.kinds is not None and event.get('kind') not in subscription.kinds:
+                continue
+            if not subscription.queue.full():
+                subscription.queue.put_nowait(event)
+                continue
+
+            if not subscription.lagging:
+                self.stats['blocked'] += 1
+                start = loop.time()
+                put = asyncio.create_task(subscription.queue.put(event))
+                closed = asyncio.create_task(subscription._close_event.wait())
+                try:
+                    await asyncio.wait([put, closed], timeout=self.publish_timeout, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    self.stats['blocked_sec'] += loop.time() - start
+                    put_done = put.done()
+                    if not put_done:
+                        put.cancel()
+                    closed.cancel()
+                if put_done:
+                    continue
+                subscription.lagging = True
+            if subscription.closed:
+                continue
+
+            # 追いついていない購読者は、最も古いイベントを捨てて新しいイベントを入れる
+            if subscription.queue.full():
+                subscription.queue.get_nowait()
+                self.stats['dropped'] += 1
+            subscription.queue.put_nowait(event)
+        self.stats['published'] += 1
+
+# endregion
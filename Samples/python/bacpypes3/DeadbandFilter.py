@@ -0,0 +1,229 @@
+import asyncio
+import time
+
+from bacpypes3.primitivedata import ObjectIdentifier
+from ChangeEventBus import ChangeEventBus
+from VRFSystemCommunicator import VRFSystemCommunicator
+from VentilationSystemCommunicator import VentilationSystemCommunicator
+
+class DeadbandFilter():
+    """読み取った値に不感帯を適用し、意味のある変化だけをChangeEventBusへ発行するクラス
+
+    通信クラスの読み取り（COVの通知を含む）の結果を受け取り、最後に発行した値からの変化が不感帯以上の場合だけ
+    イベントを発行する。不感帯は点の種類（室温、CO2濃度など）ごとに絶対値と相対値（最後に発行した値に対する比）で設定し、
+    大きい方を使う。種類を割り当てていない点はBACnetのオブジェクトタイプを種類とする。
+    数値以外の値は変われば発行する。
+    発行はChangeEventBusの購読者のキューが空くまで待つため、購読者が追いつかない間は読み取りも待つ
+    （待つのはChangeEventBusのpublish_timeout_secまでで、それを超えると古いイベントが捨てられる）。
+
+    イベント:
+        {'addr': 通信先のアドレス, 'obj_id': オブジェクトID, 'kind': 点の種類, 'value': 値,
+         'previous': 前回発行した値（初回はNone）, 'time': 受け取った時刻[UNIX時間]}
+    """
+
+# region 定数宣言
+
+    # 点の種類ごとの既定の不感帯（絶対値, 相対値）
+    DEFAULT_DEADBANDS = {
+        'zone_temperature': (0.1, 0.0),      # 室温[°C]
+        'setpoint_temperature': (0.1, 0.0),  # 室温設定値[°C]
+        'relative_humidity': (1.0, 0.0),     # 相対湿度[%]
+        'co2': (10.0, 0.0),                  # CO2濃度[ppm]
+        'electricity': (0.0, 0.01),          # 消費電力
+    }
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, bus=None, deadbands=None):
+        """インスタンスを初期化する
+
+        Args:
+            bus (ChangeEventBus): イベントを発行する先（Noneの場合は作成する）
+            deadbands (dict): 点の種類ごとの（絶対値, 相対値）（Noneの場合はDEFAULT_DEADBANDS）
+        """
+        self.bus = ChangeEventBus() if bus is None else bus
+        self.deadbands = dict(self.DEFAULT_DEADBANDS if deadbands is None else deadbands)
+
+        # 統計（受け取った値の数, 発行したイベントの数）
+        self.stats = {'received': 0, 'published': 0}
+
+        # 点ごとの種類と、点ごとに上書きした不感帯
+        self._kinds = {}
+        self._point_deadbands = {}
+
+        # 点ごとの最後に発行した値
+        self._last = {}
+
+        self._comms = []
+
+# endregion
+
+# region 設定
+
+    def set_deadband(self, kind, absolute=0.0, relative=0.0):
+        """点の種類の不感帯を設定する
+
+        Args:
+            kind (str): 点の種類（BACnetのオブジェクトタイプも可）
+            absolute (float): 不感帯の絶対値
+            relative (float): 不感帯の相対値（最後に発行した値に対する比）
+        """
+        self.deadbands[kind] = (absolute, relative)
+
+    def set_point_deadband(self, addr, obj_id, absolute=0.0, relative=0.0):
+        """点の不感帯を種類の設定より優先して設定する
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+            absolute (float): 不感帯の絶対値
+            relative (float): 不感帯の相対値（最後に発行した値に対する比）
+        """
+        self._point_deadbands[(addr, ObjectIdentifier(obj_id))] = (absolute, relative)
+
+    def assign(self, points, kind):
+        """点に種類を割り当てる
+
+        Args:
+            points (list(list(str,str))): （通信先のアドレス, オブジェクトID）のリスト
+            kind (str): 点の種類
+        """
+        for addr, obj_id in points:
+            self._kinds[(addr, ObjectIdentifier(obj_id))] = kind
+
+    def assign_vrf_points(self, vrf_comm):
+        """VRFの室内機の室温、室温設定値、相対湿度、消費電力の点に種類を割り当てる
+
+        Args:
+            vrf_comm (VRFSystemCommunicator): VRFの通信クラスのインスタンス
+        """
+        kinds = {
+            'return_air_temperature': 'zone_temperature',
+            'setpoint_temperature': 'setpoint_temperature',
+            'return_air_relative_humidity': 'relative_humidity',
+            'electricity': 'electricity',
+        }
+        for oIndx, iIndx in vrf_comm._get_iu_indices():
+            for name, obj_type, mem, _ in vrf_comm._IU_SNAPSHOT_POINTS:
+                if name in kinds:
+                    self.assign([(vrf_comm.target_ip, obj_type + ':' + vrf_comm._get_iu_objNum(oIndx, iIndx, mem.value))],
+                                kinds[name])
+        for oIndx in range(1, len(vrf_comm.I_UNIT_NUM) + 1):
+            for name, obj_type, mem, _ in vrf_comm._OU_SNAPSHOT_POINTS:
+                if name in kinds:
+                    self.assign([(vrf_comm.target_ip, obj_type + ':' + vrf_comm._get_ou_objNum(oIndx, mem.value))],
+                                kinds[name])
+
+    def assign_ventilation_points(self, vent_comm):
+        """換気のテナントのCO2濃度の点に種類を割り当てる
+
+        Args:
+            vent_comm (VentilationSystemCommunicator): 換気の通信クラスのインスタンス
+        """
+        self.assign([(vent_comm.target_ip, 'analogInput:' + str(vent_comm._member.SouthCO2Level.value)),
+                     (vent_comm.target_ip, 'analogInput:' + str(vent_comm._member.NorthCO2Level.value))], 'co2')
+
+    def get_kind(self, addr, obj_id):
+        """点の種類を取得する
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+
+        Returns:
+            str: 点の種類（割り当てていない場合はBACnetのオブジェクトタイプ）
+        """
+        obj_id = ObjectIdentifier(obj_id)
+        return self._kinds.get((addr, obj_id), str(obj_id[0]))
+
+# endregion
+
+# region 受け取り
+
+    def attach(self, comm):
+        """通信クラスの読み取りの結果を受け取り始める
+
+        Args:
+            comm (PresentValueReadWriter): 通信クラスのインスタンス
+        """
+        comm.add_read_observer(self.ingest)
+        self._comms.append(comm)
+
+    def detach(self, comm):
+        """通信クラスの読み取りの結果を受け取るのをやめる
+
+        Args:
+            comm (PresentValueReadWriter): attachした通信クラスのインスタンス
+        """
+        comm.remove_read_observer(self.ingest)
+        self._comms.remove(comm)
+
+    async def ingest(self, addr, obj_id, value):
+        """値を受け取り、不感帯を超えて変化していればイベントを発行する
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (ObjectIdentifier): オブジェクトID
+            value (object): Present value
+
+        Returns:
+            bool: イベントを発行したか否か
+        """
+        self.stats['received'] += 1
+        point = (addr, ObjectIdentifier(obj_id))
+        kind = self._kinds.get(point, str(point[1][0]))
+        previous = self._last.get(point)
+        if point in self._last and not self._is_significant(point, kind, previous, value):
+            return False
+
+        self._last[point] = value
+        self.stats['published'] += 1
+        await self.bus.publish({
+            'addr': addr,
+            'obj_id': str(point[1][0]) + ':' + str(point[1][1]),
+            'kind': kind,
+            'value': value,
+            'previous': previous,
+            'time': time.time(),
+        })
+        return True
+
+    def _is_significant(self, point, kind, old, new):
+        if not (isinstance(old, (int, float)) and isinstance(new, (int, float))):
+            return old != new
+        absolute, relative = self._point_deadbands.get(point, self.deadbands.get(kind, (0.0, 0.0)))
+        return old != new and max(absolute, relative * abs(old)) <= abs(new - old)
+
+# endregion
+
+# region サンプル
+
+async def main():
+    vrfCom = VRFSystemCommunicator(16)
+    vntCom = VentilationSystemCommunicator(17)
+
+    deadband = DeadbandFilter()
+    deadband.assign_vrf_points(vrfCom)
+    deadband.assign_ventilation_points(vntCom)
+    deadband.attach(vrfCom)
+    deadband.attach(vntCom)
+
+    # 室温とCO2濃度の意味のある変化だけを表示する
+    async def show():
+        async with deadband.bus.subscribe(['zone_temperature', 'co2']) as events:
+            async for event in events:
+                print(event['kind'] + ' ' + event['obj_id'] + ': ' + str(event['previous']) + ' -> ' + str(event['value']))
+    task = asyncio.create_task(show())
+
+    while True:
+        await vrfCom.snapshot()
+        await vntCom.get_south_tenant_CO2_level()
+        await vntCom.get_north_tenant_CO2_level()
+        await asyncio.sleep(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
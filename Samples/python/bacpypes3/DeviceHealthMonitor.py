@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import time
+
+from bacpypes3.pdu import Address
+from PresentValueReadWriter import PresentValueReadWriter
+
+class DeviceHealthMonitor():
+    """エミュレータの各デバイスが応答しているかを定期的に確かめるクラス
+
+    既定ではデバイスの専用ポートのDeviceオブジェクトのObject nameを読み取る（エラー応答でも応答があれば動いているとみなす）。
+    エミュレータはI-Amを47808へブロードキャストするため、専用ポートへのWho-Isには他のポートでは応答が届かない。
+    method='who-is'の場合はWho-Isを先に送り、I-Amが返らなければ読み取りで確かめ、以降は読み取りだけで確かめる。
+    応答時間は応答があった方法の所要時間とする。
+    デバイスごとに稼働状態、応答時間、最後に応答した日時を保持し、状態が変わったら登録した関数を呼ぶ。
+    デバイスが復帰した場合は、通信に使うインスタンスのそのデバイスへの回路を閉じる。
+    """
+
+# region 定数宣言
+
+    # 監視するデバイス（名前, デバイスID）
+    DEVICES = [
+        ('DateTimeController', 1),
+        ('VRFController', 2),
+        ('EnvironmentMonitor', 4),
+        ('OccupantMonitor', 5),
+        ('VentilationController', 6),
+        ('DummyDevice', 9),
+    ]
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, comm, interval_sec=5.0, timeout_sec=1.0, down_after=2, devices=None, method='read'):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス
+            interval_sec (float): 確かめる間隔[sec]
+            timeout_sec (float): 応答を待つ時間[sec]
+            down_after (int): 停止とみなすまでの連続した無応答の回数
+            devices (list(list(str,int))): 監視する（名前, デバイスID）のリスト（Noneの場合はDEVICES）
+            method (str): 確かめる方法（'read'または'who-is'）
+        """
+        self.comm = comm
+        self.interval = interval_sec
+        self.timeout = timeout_sec
+        self.down_after = down_after
+
+        # デバイス名ごとの状態
+        self.status = {}
+        for name, device_id in (self.DEVICES if devices is None else devices):
+            self.status[name] = {
+                'device_id': device_id,
+                'addr': comm.emulator_ip + ':' + str(0xBAC0 + device_id),
+                'up': None,          # 稼働しているか否か（まだ確かめていなければNone）
+                'rtt_sec': None,     # 最後の応答時間[sec]
+                'last_seen': None,   # 最後に応答した日時
+                'failures': 0,       # 連続した無応答の回数
+                'method': method,    # 確かめる方法（'read'または'who-is'）
+            }
+
+        self._handlers = []
+        self._task = None
+
+# endregion
+
+# region ハンドラの登録
+
+    def add_state_changed_handler(self, handler):
+        """デバイスの稼働状態が変わった際に呼ばれる関数を登録する
+
+        Args:
+            handler (callable): デバイス名と稼働しているか否かを引数にとる関数（コルーチン関数も可）
+        """
+        self._handlers.append(handler)
+
+    def remove_state_changed_handler(self, handler):
+        """デバイスの稼働状態が変わった際に呼ばれる関数の登録を解除する
+
+        Args:
+            handler (callable): 登録した関数
+        """
+        self._handlers.remove(handler)
+
+# endregion
+
+# region 監視
+
+    def start(self):
+        """定期的に確かめるタスクを開始する
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        """定期的な確認を止める
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_up(self, name):
+        """デバイスが稼働しているか否かを取得する
+
+        Args:
+            name (str): デバイス名
+
+        Returns:
+            bool: 稼働しているか否か（まだ確かめていなければNone）
+        """
+        return self.status[name]['up']
+
+    async def probe_all(self):
+        """全デバイスを並行して確かめる
+
+        Returns:
+            dict: デバイス名ごとの状態
+        """
+        await asyncio.gather(*[self.probe(name) for name in self.status])
+        return self.status
+
+    async def probe(self, name):
+        """デバイスを1回確かめ、状態を更新する
+
+        Args:
+            name (str): デバイス名
+
+        Returns:
+            bool: 応答があったか否か
+        """
+        st = self.status[name]
+        responded = False
+        if st['method'] == 'who-is':
+            start = time.perf_counter()
+            responded = await self._who_is(st)
+        if not responded:
+            # 応答時間にWho-Isを待った時間を含めない
+            start = time.perf_counter()
+            responded = await self.comm.probe_device(st['addr'], self.timeout)
+            if responded:
+                st['method'] = 'read'
+        rtt = time.perf_counter() - start
+
+        was_up = st['up']
+        if responded:
+            st['rtt_sec'] = rtt
+            st['last_seen'] = datetime.datetime.today()
+            st['failures'] = 0
+            st['up'] = True
+        else:
+            st['failures'] += 1
+            if was_up is None or self.down_after <= st['failures']:
+                st['up'] = False
+
+        if st['up'] != was_up:
+            if st['up']:
+                self.comm.reset_circuit(st['addr'])
+            for handler in list(self._handlers):
+                rslt = handler(name, st['up'])
+                if asyncio.iscoroutine(rslt):
+                    await rslt
+        return responded
+
+    async def _monitor_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    async def _who_is(self, st):
+        try:
+            i_ams = await self.comm.bacdevice.who_is(st['device_id'], st['device_id'], Address(st['addr']), self.timeout)
+        except Exception:
+            return False
+        return 0 < len(i_ams)
+
+# endregion
+
+# region サンプル
+
+async def main():
+    comm = PresentValueReadWriter(64, 'health')
+    monitor = DeviceHealthMonitor(comm)
+    monitor.add_state_changed_handler(lambda name, up: print(name + (' is up' if up else ' is down')))
+    monitor.start()
+
+    while True:
+        await asyncio.sleep(10)
+        for name, st in monitor.status.items():
+            print(name + ': ' + ('up' if st['up'] else 'down') +
+                  ('' if st['rtt_sec'] is None else ', rtt ' + '{:.1f}'.format(1000 * st['rtt_sec']) + ' ms') +
+                  ('' if st['last_seen'] is None else ', last seen ' + st['last_seen'].strftime('%H:%M:%S')))
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
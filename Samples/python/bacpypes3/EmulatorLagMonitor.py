@@ -0,0 +1,192 @@
+import asyncio
+import time
+
+from collections import deque
+from PresentValueReadWriter import PresentValueReadWriter
+
+class EmulatorLagMonitor():
+    """エミュレータの遅れを監視するクラス
+
+    加速度から外挿した現在の日時と、DateTimeControllerの現在日時（datetimeValue:1）を定期的に読み取って比べ、
+    エミュレータの遅れ、実時間1秒あたりに進んだステップ数、遅れの発生と解消を指標として記録する。
+    subscribe_date_time_covを呼んでおく必要がある。
+    """
+
+# region コンストラクタ
+
+    def __init__(self, comm, interval_sec=1.0, window_sec=30.0, delay_threshold_steps=2):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス（subscribe_date_time_cov済みであること）
+            interval_sec (float): 読み取る間隔[sec]
+            window_sec (float): ステップの進み方を平均する期間[sec]
+            delay_threshold_steps (float): 遅れとみなすステップ数（1ステップ分は遅れに含めない）
+        """
+        self.comm = comm
+        self.interval = interval_sec
+        self.window = window_sec
+        self.delay_threshold_steps = delay_threshold_steps
+
+        # 読み取った（実時間[sec], エミュレータの現在日時）
+        self._samples = deque()
+
+        # 遅れている最中か否か
+        self.delayed = False
+
+        self.metrics = {
+            'lag_sec': 0.0,            # エミュレータの遅れ（シミュレーション時間）[sec]
+            'lag_wall_sec': 0.0,       # エミュレータの遅れ（実時間）[sec]
+            'steps_per_sec': 0.0,      # 実時間1秒あたりに進んだステップ数
+            'expected_steps_per_sec': 0.0, # 加速度から求めた実時間1秒あたりに進むべきステップ数
+            'max_lag_sec': 0.0,        # これまでの最大の遅れ（シミュレーション時間）[sec]
+            'delay_events': 0,         # 遅れが発生した回数
+            'samples': 0,              # 読み取りに成功した回数
+            'failures': 0,             # 読み取りに失敗した回数
+        }
+
+        self._metrics_handlers = []
+        self._delay_handlers = []
+        self._task = None
+
+# endregion
+
+# region ハンドラの登録
+
+    def add_metrics_handler(self, handler):
+        """指標を更新した際に呼ばれる関数を登録する
+
+        Args:
+            handler (callable): 指標の辞書を引数にとる関数（コルーチン関数も可）
+        """
+        self._metrics_handlers.append(handler)
+
+    def remove_metrics_handler(self, handler):
+        """指標を更新した際に呼ばれる関数の登録を解除する
+
+        Args:
+            handler (callable): 登録した関数
+        """
+        self._metrics_handlers.remove(handler)
+
+    def add_delay_handler(self, handler):
+        """遅れが発生・解消した際に呼ばれる関数を登録する
+
+        Args:
+            handler (callable): 遅れている最中か否かと遅れ（シミュレーション時間）[sec]を引数にとる関数（コルーチン関数も可）
+        """
+        self._delay_handlers.append(handler)
+
+    def remove_delay_handler(self, handler):
+        """遅れが発生・解消した際に呼ばれる関数の登録を解除する
+
+        Args:
+            handler (callable): 登録した関数
+        """
+        self._delay_handlers.remove(handler)
+
+# endregion
+
+# region 監視
+
+    def start(self):
+        """定期的に読み取るタスクを開始する
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        """定期的な読み取りを止める
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_metrics(self):
+        """指標を取得する
+
+        Returns:
+            dict: 指標の名前ごとの値
+        """
+        return dict(self.metrics)
+
+    async def sample(self):
+        """エミュレータの現在日時を1回読み取り、指標を更新する
+
+        Returns:
+            dict: 更新した指標（読み取りに失敗した場合はNone）
+        """
+        val = await self.comm.read_present_value(self.comm.dtc_id, 'datetimeValue:1')
+        now = time.monotonic()
+        if not val[0]:
+            self.metrics['failures'] += 1
+            return None
+
+        emulated = val[1]
+        timestep = self.comm.timestep_sec
+        acc_rate = self.comm.acc_rate if 0 < self.comm.acc_rate else self.comm.default_acc_rate
+
+        # エミュレータはステップ単位でしか現在日時を進めないため、1ステップ分は遅れに含めない
+        lag = max(0.0, (self.comm.current_date_time() - emulated).total_seconds() - timestep)
+
+        self._samples.append((now, emulated))
+        while 2 < len(self._samples) and self.window < now - self._samples[0][0]:
+            self._samples.popleft()
+        steps_per_sec = 0.0
+        if 2 <= len(self._samples) and self._samples[0][0] < now:
+            t0, e0 = self._samples[0]
+            steps_per_sec = (emulated - e0).total_seconds() / timestep / (now - t0)
+
+        self.metrics['lag_sec'] = lag
+        self.metrics['lag_wall_sec'] = lag / acc_rate if 0 < acc_rate else 0.0
+        self.metrics['steps_per_sec'] = steps_per_sec
+        self.metrics['expected_steps_per_sec'] = acc_rate / timestep
+        self.metrics['max_lag_sec'] = max(self.metrics['max_lag_sec'], lag)
+        self.metrics['samples'] += 1
+
+        delayed = self.delay_threshold_steps * timestep < lag
+        if delayed != self.delayed:
+            self.delayed = delayed
+            if delayed:
+                self.metrics['delay_events'] += 1
+            await self._call_handlers(self._delay_handlers, delayed, lag)
+        await self._call_handlers(self._metrics_handlers, self.get_metrics())
+        return self.get_metrics()
+
+    async def _monitor_loop(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    async def _call_handlers(self, handlers, *args):
+        for handler in list(handlers):
+            rslt = handler(*args)
+            if asyncio.iscoroutine(rslt):
+                await rslt
+
+# endregion
+
+# region サンプル
+
+async def main():
+    comm = PresentValueReadWriter(62, 'lagmonitor')
+    await comm.subscribe_date_time_cov()
+
+    monitor = EmulatorLagMonitor(comm)
+    monitor.add_delay_handler(lambda delayed, lag: print(('delay started: ' if delayed else 'delay resolved: ') + '{:.0f}'.format(lag) + ' sec'))
+    monitor.start()
+
+    while True:
+        await asyncio.sleep(5)
+        m = monitor.get_metrics()
+        print('lag ' + '{:.0f}'.format(m['lag_sec']) + ' sec, ' +
+              '{:.2f}'.format(m['steps_per_sec']) + '/' + '{:.2f}'.format(m['expected_steps_per_sec']) + ' steps/sec')
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -28,7 +28,7 @@ class EnvironmentCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
 # endregion
 
-    def __init__(self, id, name='envComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0):
+    def __init__(self, id, name='envComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0, port=None):
         """インスタンスを初期化する
 
         Args:
@@ -36,8 +36,9 @@ class EnvironmentCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             name (str): 通信用のDeviceの名前
             device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
             emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            port (int): 通信に使うDeviceのポート（Noneの場合は0xBAC0+id）
         """
-        super().__init__(id, name, device_ip, emulator_ip, time_out_sec)
+        super().__init__(id, name, device_ip, emulator_ip, time_out_sec, port)
         self.target_ip = emulator_ip + ':' + str(self.ENVIRONMENTMONITOR_EXCLUSIVE_PORT)
 
     async def get_drybulb_temperature(self):
@@ -0,0 +1,182 @@
+import asyncio
+import datetime
+
+from bacpypes3.primitivedata import Real
+from PresentValueReadWriter import PresentValueReadWriter
+from Utilities import is_hvac_time
+
+class IdleFastForwarder():
+    """空調の停止時間帯（夜間・休日）にエミュレータの加速度を上げ、運転時間帯の少し前に元に戻すクラス
+
+    運転時間帯は日時を引数にとる判定関数（既定はis_hvac_time）で与え、
+    add_idle_windowで停止時間帯（祝日など）を追加で宣言できる。
+    切り替えの日時はシミュレーション日時で決め、PresentValueReadWriter.sleep_untilで待つ。
+    加速度はDateTimeControllerのanalogOutput:2に書き込む。
+    """
+
+# region 定数宣言
+
+    # 切り替えの日時を探す最長の期間
+    MAX_SEARCH_PERIOD = datetime.timedelta(days=8)
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, comm, is_active_time=is_hvac_time, idle_rate=6000, active_rate=None,
+                 lead_time=datetime.timedelta(minutes=30), reaction_margin_sec=1.0,
+                 resolution=datetime.timedelta(minutes=1)):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス（subscribe_date_time_cov済みであること）
+            is_active_time (callable): 日時を引数にとり、運転時間帯か否かを返す関数
+            idle_rate (float): 停止時間帯の加速度
+            active_rate (float): 運転時間帯の加速度（Noneの場合は開始時の加速度）
+            lead_time (timedelta): 運転時間帯の開始より前に加速度を戻すシミュレーション時間
+            reaction_margin_sec (float): 加速度を戻す書き込みが反映されるまでの余裕[sec]（実時間）
+            resolution (timedelta): 切り替えの日時を探す刻み
+        """
+        self.comm = comm
+        self.is_active_time = is_active_time
+        self.idle_rate = idle_rate
+        self.active_rate = active_rate
+        self.lead_time = lead_time
+        self.reaction_margin_sec = reaction_margin_sec
+        self.resolution = resolution
+
+        # 追加で宣言した停止時間帯（開始日時, 終了日時）
+        self.idle_windows = []
+
+        # 切り替えの履歴（切り替えたシミュレーション日時, 加速度）
+        self.history = []
+
+# endregion
+
+# region 時間帯の判定
+
+    def add_idle_window(self, start, end):
+        """停止時間帯を追加で宣言する
+
+        Args:
+            start (datetime): 開始日時
+            end (datetime): 終了日時
+        """
+        self.idle_windows.append((start, end))
+
+    def is_active(self, dtime):
+        """運転時間帯か否かを判定する
+
+        Args:
+            dtime (datetime): シミュレーション日時
+
+        Returns:
+            bool: 運転時間帯か否か
+        """
+        for start, end in self.idle_windows:
+            if start <= dtime < end:
+                return False
+        return self.is_active_time(dtime)
+
+    def next_transition(self, dtime):
+        """運転時間帯と停止時間帯が次に切り替わる日時を求める
+
+        Args:
+            dtime (datetime): 探し始めるシミュレーション日時
+
+        Returns:
+            datetime: 切り替わる日時（MAX_SEARCH_PERIOD以内に切り替わらない場合はNone）
+        """
+        active = self.is_active(dtime)
+        end = dtime + self.MAX_SEARCH_PERIOD
+        t = dtime
+        while t < end:
+            t += self.resolution
+            if self.is_active(t) != active:
+                return t
+        return None
+
+    def get_restore_time(self, active_start):
+        """加速度を元に戻すシミュレーション日時を求める
+
+        Args:
+            active_start (datetime): 運転時間帯の開始日時
+
+        Returns:
+            datetime: 加速度を元に戻す日時
+        """
+        margin = datetime.timedelta(seconds=self.reaction_margin_sec * self.idle_rate)
+        return active_start - self.lead_time - margin
+
+# endregion
+
+# region 加速度の切り替え
+
+    async def set_acceleration_rate(self, rate):
+        """加速度を書き込む（現在の加速度と同じ場合は書き込まない）
+
+        Args:
+            rate (float): 加速度
+
+        Returns:
+            list(bool,object): 書き込み成功の真偽,エラー
+        """
+        if self.comm.acc_rate == rate:
+            return True, None
+        rslt = await self.comm.write_present_value(self.comm.dtc_id, 'analogOutput:2', Real(rate))
+        if rslt[0]:
+            self.history.append((self.comm.current_date_time(), rate))
+        return rslt
+
+    async def run(self):
+        """停止時間帯の加速度の切り替えを続ける（キャンセルされると運転時間帯の加速度に戻す）
+        """
+        if self.active_rate is None:
+            self.active_rate = self.comm.acc_rate if 0 < self.comm.acc_rate else self.comm.default_acc_rate
+
+        try:
+            while True:
+                now = self.comm.current_date_time()
+                transition = self.next_transition(now)
+
+                if self.is_active(now):
+                    await self.set_acceleration_rate(self.active_rate)
+                    if transition is None:
+                        return
+                    await self.comm.sleep_until(transition)
+                    continue
+
+                # 停止時間帯：運転時間帯の少し前まで加速する
+                restore_time = None if transition is None else self.get_restore_time(transition)
+                if restore_time is None or now < restore_time:
+                    await self.set_acceleration_rate(self.idle_rate)
+                    if restore_time is None:
+                        await self.comm.sleep_until(now + self.MAX_SEARCH_PERIOD)
+                        continue
+                    await self.comm.sleep_until(restore_time)
+
+                await self.set_acceleration_rate(self.active_rate)
+                await self.comm.sleep_until(transition)
+        except asyncio.CancelledError:
+            await self.set_acceleration_rate(self.active_rate)
+            raise
+
+# endregion
+
+# region サンプル
+
+async def main():
+    comm = PresentValueReadWriter(61, 'fastforward')
+    await comm.subscribe_date_time_cov()
+
+    forwarder = IdleFastForwarder(comm, idle_rate=6000)
+    task = asyncio.create_task(forwarder.run())
+
+    while True:
+        print(comm.current_date_time().strftime('%Y/%m/%d %H:%M:%S') + ' x' + str(comm.acc_rate))
+        await asyncio.sleep(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -0,0 +1,169 @@
+import asyncio
+import time
+
+from bacpypes3.primitivedata import Real
+from PresentValueReadWriter import PresentValueReadWriter
+from LocalEmulator import LocalEmulator
+from Utilities import percentile
+
+class KeepUpAnalyzer():
+    """加速度を段階的に上げながら制御を実行し、制御が追いつける最大の加速度を求めるクラス
+
+    加速度ごとにsteps_per_rateステップの制御を実行し、ステップごとの処理時間を
+    1ステップの実時間（timestep / 加速度）の締め切りと比べる。
+    エミュレータの代わりにLocalEmulatorを相手にしてもよい。
+    CPU時間はプロセス全体の値のため、LocalEmulatorを同じプロセスで動かす場合はその分も含まれる。
+    """
+
+# region コンストラクタ
+
+    def __init__(self, comm, control, rates=(60, 120, 300, 600, 1200, 3000, 6000),
+                 steps_per_rate=30, warmup_steps=2, max_miss_ratio=0.0, stop_on_failure=True):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス（subscribe_date_time_cov済みであること）
+            control (callable): ステップの日時を引数にとるコルーチン関数（1ステップ分の制御）
+            rates (list(float)): 試す加速度（小さい順）
+            steps_per_rate (int): 加速度ごとに記録するステップ数
+            warmup_steps (int): 加速度を変えた後、記録せずに読み飛ばすステップ数
+            max_miss_ratio (float): 追いつけているとみなす締め切り超過の割合の上限
+            stop_on_failure (bool): 追いつけない加速度が見つかったら残りを試さないか否か
+        """
+        self.comm = comm
+        self.control = control
+        self.rates = list(rates)
+        self.steps_per_rate = steps_per_rate
+        self.warmup_steps = warmup_steps
+        self.max_miss_ratio = max_miss_ratio
+        self.stop_on_failure = stop_on_failure
+
+        # 加速度ごとの結果
+        self.results = []
+
+# endregion
+
+# region 解析
+
+    async def run(self):
+        """加速度を順に試し、終わったら元の加速度に戻す
+
+        Returns:
+            float: 追いつけた最大の加速度（どの加速度でも追いつけなかった場合はNone）
+        """
+        original_rate = self.comm.acc_rate
+        self.results = []
+        try:
+            for rate in self.rates:
+                result = await self.measure(rate)
+                self.results.append(result)
+                if not result['sustainable'] and self.stop_on_failure:
+                    break
+        finally:
+            if 0 < original_rate:
+                await self._set_acceleration_rate(original_rate)
+        return self.get_max_sustainable_rate()
+
+    async def measure(self, rate):
+        """1つの加速度で制御を実行し、結果を記録する
+
+        Args:
+            rate (float): 加速度
+
+        Returns:
+            dict: 結果（加速度, 締め切り, 締め切り超過の数と割合, 取りこぼしたステップの数,
+            処理時間の中央値・95%値・最大値[sec], シミュレーション時間での処理時間の95%値[sec],
+            CPU使用率, 追いつけたか否か）
+        """
+        await self._set_acceleration_rate(rate)
+        for _ in range(self.warmup_steps + 1):
+            await self.comm.next_step()
+
+        deadline = self.comm.timestep_sec / rate
+        latencies = []
+        misses = 0
+        skipped_total = 0
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for _ in range(self.steps_per_rate):
+            step, skipped = await self.comm.next_step()
+            start = time.perf_counter()
+            await self.control(step)
+            latency = time.perf_counter() - start
+            latencies.append(latency)
+            skipped_total += skipped
+            if deadline < latency or 0 < skipped:
+                misses += 1
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        miss_ratio = misses / self.steps_per_rate
+        p95 = percentile(latencies, 95)
+        return {
+            'rate': rate,
+            'deadline_sec': deadline,
+            'misses': misses,
+            'miss_ratio': miss_ratio,
+            'skipped_steps': skipped_total,
+            'latency_p50_sec': percentile(latencies, 50),
+            'latency_p95_sec': p95,
+            'latency_max_sec': max(latencies),
+            'sim_latency_p95_sec': p95 * rate,
+            'cpu_utilization': cpu / wall if 0 < wall else 0.0,
+            'sustainable': miss_ratio <= self.max_miss_ratio,
+        }
+
+    def get_max_sustainable_rate(self):
+        """追いつけた最大の加速度を取得する
+
+        Returns:
+            float: 追いつけた最大の加速度（どの加速度でも追いつけなかった場合はNone）
+        """
+        rates = [r['rate'] for r in self.results if r['sustainable']]
+        return max(rates) if 0 < len(rates) else None
+
+    def print_report(self):
+        """結果を表にして表示する
+        """
+        print('    rate  deadline[ms]  misses  skipped  p50[ms]  p95[ms]  max[ms]  sim p95[s]   cpu')
+        for r in self.results:
+            print('{:8.0f}  {:12.1f}  {:6d}  {:7d}  {:7.1f}  {:7.1f}  {:7.1f}  {:10.1f}  {:4.0%}{}'.format(
+                r['rate'], 1000 * r['deadline_sec'], r['misses'], r['skipped_steps'],
+                1000 * r['latency_p50_sec'], 1000 * r['latency_p95_sec'], 1000 * r['latency_max_sec'],
+                r['sim_latency_p95_sec'], r['cpu_utilization'], '' if r['sustainable'] else '  *'))
+        print('max sustainable rate: ' + str(self.get_max_sustainable_rate()))
+
+# endregion
+
+# region 補助メソッド
+
+    async def _set_acceleration_rate(self, rate):
+        await self.comm.write_present_value(self.comm.dtc_id, 'analogOutput:2', Real(rate))
+        # COVを待たずに新しい加速度を反映する
+        await self.comm._update_date_time()
+
+# endregion
+
+# region サンプル
+
+async def main():
+    # エミュレータの代わりにLocalEmulatorを相手にする（エミュレータを相手にする場合は以下の2行を消す）
+    emulator = LocalEmulator()
+    await emulator.start()
+
+    comm = PresentValueReadWriter(63, 'keepup')
+    await comm.subscribe_date_time_cov()
+
+    # 1ステップあたり約20msかかる制御
+    async def control(step):
+        await comm.read_present_value(comm.dtc_id, 'datetimeValue:1')
+        await asyncio.sleep(0.02)
+
+    analyzer = KeepUpAnalyzer(comm, control, steps_per_rate=20)
+    await analyzer.run()
+    analyzer.print_report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
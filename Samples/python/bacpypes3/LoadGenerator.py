@@ -0,0 +1,258 @@
+import asyncio
+import random
+import time
+
+from bacpypes3.pdu import Address
+from bacpypes3.primitivedata import ObjectIdentifier, Real
+from bacpypes3.apdu import ErrorRejectAbortNack
+from PresentValueReadWriter import PresentValueReadWriter
+from LocalEmulator import LocalEmulator
+from Utilities import percentile
+
+class LoadGenerator():
+    """多数のBACnetコントローラを模擬してエミュレータに負荷をかけるクラス
+
+    PresentValueReadWriterの仮想デバイスをN台（IDとポートはそれぞれ別）起動し、各デバイスが
+    ReadProperty、ReadPropertyMultiple、WriteProperty、COV購読を指定の比率と頻度で送り続ける。
+    台数を増やしながら、達成したスループット、要求の種類ごとの遅延の分位点、エラー率を記録する。
+    """
+
+# region 定数宣言
+
+    # 要求の種類
+    OPERATIONS = ('rp', 'rpm', 'wp', 'cov')
+
+    # 要求の種類ごとの既定の比率
+    DEFAULT_MIX = {'rp': 0.5, 'rpm': 0.3, 'wp': 0.1, 'cov': 0.1}
+
+    # COV登録の寿命に加える余裕[sec]（購読中に登録し直さないようにする）
+    COV_LIFETIME_MARGIN_SEC = 10
+
+    # 仮想デバイスを閉じる前に送信が終わるのを待つ時間[sec]
+    CLOSE_WAIT_SEC = 0.5
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, target_addr, read_obj_ids, write_obj_values=(), cov_obj_ids=(),
+                 mix=None, rate_per_device=10.0,
+                 rpm_size=10, cov_hold_sec=1.0, first_device_id=100,
+                 device_ip='127.0.0.1', emulator_ip='127.0.0.1', seed=0):
+        """インスタンスを初期化する
+
+        Args:
+            target_addr (str): 負荷をかけるBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+            read_obj_ids (list(str)): 読み取るオブジェクトIDのリスト
+            write_obj_values (list(list(str,object))): 書き込む（オブジェクトID, Present value）のリスト
+            cov_obj_ids (list(str)): COVを購読するオブジェクトIDのリスト
+            mix (dict): 要求の種類（'rp', 'rpm', 'wp', 'cov'）ごとの比率（Noneの場合はDEFAULT_MIX）
+            rate_per_device (float): 1台あたりの要求の頻度[回/sec]
+            rpm_size (int): 1回のReadPropertyMultipleで読み取るオブジェクトの数
+            cov_hold_sec (float): COVを購読してから解除するまでの時間[sec]
+            first_device_id (int): 仮想デバイスのIDの最初の値（ポートは0xBAC0+ID）
+            device_ip (str): 仮想デバイスのIP Address（xxx.xxx.xxx.xxx）
+            emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            seed (int): 要求の種類と対象を選ぶ乱数の種
+        """
+        self.target_addr = target_addr
+        self.read_obj_ids = list(read_obj_ids)
+        self.write_obj_values = list(write_obj_values)
+        self.cov_obj_ids = list(cov_obj_ids)
+        if mix is None:
+            mix = self.DEFAULT_MIX
+        self.mix = {op: mix.get(op, 0) for op in self.OPERATIONS}
+        if len(self.write_obj_values) == 0:
+            self.mix['wp'] = 0
+        if len(self.cov_obj_ids) == 0:
+            self.mix['cov'] = 0
+        self.rate_per_device = rate_per_device
+        self.rpm_size = rpm_size
+        self.cov_hold_sec = cov_hold_sec
+        self.first_device_id = first_device_id
+        self.device_ip = device_ip
+        self.emulator_ip = emulator_ip
+        self.seed = seed
+
+        # 台数ごとの結果
+        self.results = []
+
+        # 購読中のCOVのタスクと、最後に使ったSubscriber process identifier
+        self._cov_tasks = []
+        self._cov_process_id = 0
+
+# endregion
+
+# region 負荷の生成
+
+    async def run(self, device_counts=(1, 2, 4, 8, 16), duration_sec=10.0):
+        """台数を順に増やしながら負荷をかける
+
+        Args:
+            device_counts (list(int)): 試す台数（小さい順）
+            duration_sec (float): 台数ごとに負荷をかける時間[sec]
+
+        Returns:
+            list(dict): 台数ごとの結果
+        """
+        self.results = []
+        for n in device_counts:
+            self.results.append(await self.run_level(n, duration_sec))
+        return self.results
+
+    async def run_level(self, n_devices, duration_sec):
+        """指定の台数で負荷をかける
+
+        Args:
+            n_devices (int): 仮想デバイスの台数
+            duration_sec (float): 負荷をかける時間[sec]
+
+        Returns:
+            dict: 結果（台数, 目標と達成したスループット[回/sec], 要求の数, エラーの数とエラー率,
+            要求の種類ごとの（数, エラーの数, 遅延の中央値・95%値・99%値[sec]））
+        """
+        comms = [PresentValueReadWriter(self.first_device_id + k, 'load' + str(k),
+                                        self.device_ip, self.emulator_ip)
+                 for k in range(n_devices)]
+        samples = {op: [] for op in self.OPERATIONS}
+        errors = {op: 0 for op in self.OPERATIONS}
+
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*[
+                self._device_loop(comm, random.Random(self.seed + k), start + duration_sec, samples, errors)
+                for k, comm in enumerate(comms)])
+            elapsed = time.perf_counter() - start
+        finally:
+            # COV購読の解除などの送信が終わるのを待ってから閉じる
+            await asyncio.gather(*self._cov_tasks, return_exceptions=True)
+            self._cov_tasks = []
+            await asyncio.sleep(self.CLOSE_WAIT_SEC)
+            for comm in comms:
+                comm.bacdevice.close()
+
+        total = sum(len(v) for v in samples.values())
+        total_errors = sum(errors.values())
+        result = {
+            'devices': n_devices,
+            'target_throughput': n_devices * self.rate_per_device,
+            'throughput': (total - total_errors) / elapsed if 0 < elapsed else 0.0,
+            'requests': total,
+            'errors': total_errors,
+            'error_rate': total_errors / total if 0 < total else 0.0,
+            'operations': {},
+        }
+        for op in self.OPERATIONS:
+            lat = samples[op]
+            if len(lat) == 0:
+                continue
+            result['operations'][op] = {
+                'requests': len(lat),
+                'errors': errors[op],
+                'latency_p50_sec': percentile(lat, 50),
+                'latency_p95_sec': percentile(lat, 95),
+                'latency_p99_sec': percentile(lat, 99),
+            }
+        return result
+
+    async def _device_loop(self, comm, rnd, end_time, samples, errors):
+        ops = [op for op in self.OPERATIONS if 0 < self.mix[op]]
+        weights = [self.mix[op] for op in ops]
+        interval = 1.0 / self.rate_per_device
+        next_time = time.perf_counter()
+        while next_time < end_time:
+            op = rnd.choices(ops, weights)[0]
+            start = time.perf_counter()
+            try:
+                success = await getattr(self, '_' + op)(comm, rnd)
+            except (Exception, ErrorRejectAbortNack):
+                success = False
+            samples[op].append(time.perf_counter() - start)
+            if not success:
+                errors[op] += 1
+
+            # 応答が遅れて頻度を保てない場合は、遅れを取り戻さずに次の要求を送る
+            next_time = max(next_time + interval, time.perf_counter())
+            await asyncio.sleep(max(0, next_time - time.perf_counter()))
+
+    async def _rp(self, comm, rnd):
+        rslt = await comm.read_present_value(self.target_addr, rnd.choice(self.read_obj_ids))
+        return rslt[0]
+
+    async def _rpm(self, comm, rnd):
+        obj_ids = rnd.sample(self.read_obj_ids, min(self.rpm_size, len(self.read_obj_ids)))
+        rslts = await comm.read_present_values(self.target_addr, obj_ids)
+        return all(rslt[0] for rslt in rslts)
+
+    async def _wp(self, comm, rnd):
+        obj_id, value = rnd.choice(self.write_obj_values)
+        rslt = await comm.write_present_value(self.target_addr, obj_id, value)
+        return rslt[0]
+
+    async def _cov(self, comm, rnd):
+        # 登録から最初の通知までを遅延とし、購読はcov_hold_secの間バックグラウンドで続ける
+        first_value = asyncio.get_running_loop().create_future()
+        obj_id = rnd.choice(self.cov_obj_ids)
+        self._cov_tasks.append(asyncio.create_task(self._hold_cov(comm, obj_id, first_value)))
+        return await first_value
+
+    async def _hold_cov(self, comm, obj_id, first_value):
+        try:
+            async with comm.bacdevice.change_of_value(
+                address=Address(self.target_addr),
+                subscriber_process_identifier=self._next_cov_process_id(),
+                monitored_object_identifier=ObjectIdentifier(obj_id),
+                lifetime=int(self.cov_hold_sec) + self.COV_LIFETIME_MARGIN_SEC,
+                issue_confirmed_notifications=False
+            ) as scm:
+                await asyncio.wait_for(scm.get_value(), comm.time_out)
+                first_value.set_result(True)
+                await asyncio.sleep(self.cov_hold_sec)
+        except (Exception, ErrorRejectAbortNack):
+            # 購読の拒否や無応答は失敗として数える
+            pass
+        finally:
+            if not first_value.done():
+                first_value.set_result(False)
+
+    def _next_cov_process_id(self):
+        self._cov_process_id = self._cov_process_id % 0xFFFF + 1
+        return self._cov_process_id
+
+# endregion
+
+# region 結果の表示
+
+    def print_report(self):
+        """結果を表にして表示する
+        """
+        print('devices  target[/s]  achieved[/s]  requests  error rate  op   p50[ms]  p95[ms]  p99[ms]')
+        for r in self.results:
+            head = '{:7d}  {:10.1f}  {:12.1f}  {:8d}  {:10.1%}'.format(
+                r['devices'], r['target_throughput'], r['throughput'], r['requests'], r['error_rate'])
+            for op, o in r['operations'].items():
+                print(head + '  {:<3}  {:7.1f}  {:7.1f}  {:7.1f}'.format(
+                    op, 1000 * o['latency_p50_sec'], 1000 * o['latency_p95_sec'], 1000 * o['latency_p99_sec']))
+                head = ' ' * len(head)
+
+# endregion
+
+# region サンプル
+
+async def main():
+    # エミュレータの代わりにLocalEmulatorを相手にする（エミュレータを相手にする場合は以下の3行を消す）
+    emulator = LocalEmulator()
+    emulator.add_device(2, 'VRFController', [('analogInput:' + str(1000 * o + 100 * i + 12), 24.0) for o in range(1, 5) for i in range(1, 6)] +
+                                            [('analogValue:' + str(1000 * o + 100 * i + 11), 26.0) for o in range(1, 5) for i in range(1, 6)])
+    await emulator.start()
+
+    read_obj_ids = ['analogInput:' + str(1000 * o + 100 * i + 12) for o in range(1, 5) for i in range(1, 6)]
+    write_obj_values = [('analogValue:' + str(1000 * o + 100 * i + 11), Real(26)) for o in range(1, 5) for i in range(1, 6)]
+    generator = LoadGenerator('127.0.0.1:' + str(0xBAC0 + 2), read_obj_ids, write_obj_values, read_obj_ids)
+    await generator.run(device_counts=(1, 2, 4, 8), duration_sec=5)
+    generator.print_report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
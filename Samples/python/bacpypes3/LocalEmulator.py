@@ -0,0 +1,264 @@
+import asyncio
+import datetime
+
+from bacpypes3.pdu import IPv4Address
+from bacpypes3.ipv4.app import NormalApplication
+from bacpypes3.primitivedata import ObjectIdentifier, Date, Time
+from bacpypes3.basetypes import DateTime
+from bacpypes3.object import DateTimeValueObject as _DateTimeValueObject
+from bacpypes3.local.device import DeviceObject
+from bacpypes3.local.object import Object as _Object
+from bacpypes3.local.cov import GenericCriteria
+from bacpypes3.local.analog import AnalogInputObject, AnalogOutputObject, AnalogValueObject
+from bacpypes3.local.binary import BinaryInputObject, BinaryOutputObject, BinaryValueObject
+from bacpypes3.local.multistate import MultiStateInputObject, MultiStateOutputObject, MultiStateValueObject
+
+class DateTimeValueObject(_Object, _DateTimeValueObject):
+    """COVに対応したローカルのDateTime Valueオブジェクト
+    """
+    _cov_criteria = GenericCriteria
+
+class LocalEmulator():
+    """エミュレータの代わりにローカルで動くBACnetデバイス群
+
+    DateTimeController（デバイスID 1）の現在日時（datetimeValue:1）、加速度（analogOutput:2）、
+    加速開始の現実の日時（datetimeValue:3）、加速開始のシミュレーション日時（datetimeValue:4）を持ち、
+    加速度に合わせてタイムステップごとに現在日時を進める。
+    add_deviceで任意のオブジェクトを持つデバイスを追加でき、各デバイスはエミュレータと同じく
+    0xBAC0+デバイスIDの専用ポートで待ち受ける。制御や通信の性能評価に使う。
+    エミュレータと同じく、ステップの処理が遅れた場合は遅れたステップを続けて進めて追い付こうとし、
+    遅れている間はis_delayedをTrueにする。catch_upをFalseにすると遅れを取り戻さずに遅れたまま進める。
+    """
+
+# region 定数宣言
+
+    DATETIMECONTROLLER_DEVICE_ID = 1
+
+    # オブジェクトの種類ごとのローカルオブジェクトのクラス
+    _OBJECT_CLASSES = {
+        'analog-input': AnalogInputObject,
+        'analog-output': AnalogOutputObject,
+        'analog-value': AnalogValueObject,
+        'binary-input': BinaryInputObject,
+        'binary-output': BinaryOutputObject,
+        'binary-value': BinaryValueObject,
+        'multi-state-input': MultiStateInputObject,
+        'multi-state-output': MultiStateOutputObject,
+        'multi-state-value': MultiStateValueObject,
+        'datetime-value': DateTimeValueObject,
+    }
+
+    # 多状態オブジェクトの状態数
+    MULTISTATE_STATES = 16
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, ip='127.0.0.1', start_datetime=datetime.datetime(2024, 1, 1), timestep_sec=60, acc_rate=600,
+                 catch_up=True):
+        """インスタンスを初期化する（デバイスはstartで起動する）
+
+        Args:
+            ip (str): 待ち受けるIP Address（xxx.xxx.xxx.xxx）
+            start_datetime (datetime): シミュレーションの開始日時
+            timestep_sec (float): タイムステップ[sec]
+            acc_rate (float): 加速度の初期値
+            catch_up (bool): 遅れたステップを続けて進めて追い付くか否か（Trueがエミュレータと同じ動作）
+        """
+        self.ip = ip
+        self.catch_up = catch_up
+        self.timestep_sec = timestep_sec
+        self.acc_rate = float(acc_rate)
+        self.current_datetime = start_datetime
+        self.base_real_datetime = datetime.datetime.today()
+        self.base_sim_datetime = start_datetime
+
+        # 進めたステップの数
+        self.steps = 0
+
+        # ステップの進行が実時間に遅れているか否か
+        self.is_delayed = False
+
+        # デバイスIDごとの（デバイスの定義, BACnetアプリケーション）
+        self._devices = {}
+
+        # ステップを進めるたびに呼ばれる関数
+        self._step_handlers = []
+
+        self._task = None
+
+# endregion
+
+# region デバイスの定義
+
+    def add_device(self, device_id, name, objects):
+        """デバイスを追加する（startの前に呼ぶ）
+
+        Args:
+            device_id (int): デバイスID
+            name (str): デバイスの名前
+            objects (list(list(str,object))): （オブジェクトID, Present valueの初期値）のリスト
+        """
+        self._devices[device_id] = [name, list(objects), None]
+
+    def add_step_handler(self, handler):
+        """ステップを進めるたびに呼ばれる関数を登録する
+
+        Args:
+            handler (callable): LocalEmulatorとステップの日時を引数にとる関数（コルーチン関数も可）
+        """
+        self._step_handlers.append(handler)
+
+    def get_object(self, device_id, obj_id):
+        """デバイスのローカルオブジェクトを取得する
+
+        Args:
+            device_id (int): デバイスID
+            obj_id (str): オブジェクトID
+
+        Returns:
+            Object: ローカルオブジェクト（見つからない場合はNone）
+        """
+        app = self._devices[device_id][2]
+        return None if app is None else app.get_object_id(ObjectIdentifier(obj_id))
+
+    def set_present_value(self, device_id, obj_id, value):
+        """オブジェクトのPresent valueを書き換える
+
+        Args:
+            device_id (int): デバイスID
+            obj_id (str): オブジェクトID
+            value (object): Present value
+        """
+        obj = self.get_object(device_id, obj_id)
+        obj.presentValue = self._to_date_time(value) if isinstance(value, datetime.datetime) else value
+
+# endregion
+
+# region 起動と停止
+
+    async def start(self):
+        """デバイスを起動し、日時を進めるタスクを開始する
+        """
+        self._devices[self.DATETIMECONTROLLER_DEVICE_ID] = ['DateTimeController', [
+            ('datetimeValue:1', self.current_datetime),
+            ('analogOutput:2', self.acc_rate),
+            ('datetimeValue:3', self.base_real_datetime),
+            ('datetimeValue:4', self.base_sim_datetime),
+        ], None]
+        for device_id, device in self._devices.items():
+            if device[2] is None:
+                device[2] = self._create_application(device_id, device[0], device[1])
+
+        self._acc_obj = self.get_object(self.DATETIMECONTROLLER_DEVICE_ID, 'analogOutput:2')
+        self._task = asyncio.create_task(self._clock_loop())
+
+    async def stop(self):
+        """日時を進めるタスクを止め、デバイスを閉じる
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for device in self._devices.values():
+            if device[2] is not None:
+                device[2].close()
+                device[2] = None
+
+    def _create_application(self, device_id, name, objects):
+        app = NormalApplication(
+            DeviceObject(
+                objectName=name,
+                objectIdentifier=('device', device_id),
+                maxApduLengthAccepted=1024,
+                segmentationSupported='segmentedBoth',
+                vendorIdentifier=15,
+            ),
+            IPv4Address(self.ip, 0xBAC0 + device_id))
+        for obj_id, value in objects:
+            app.add_object(self._create_object(obj_id, value))
+        return app
+
+    def _create_object(self, obj_id, value):
+        obj_id = ObjectIdentifier(obj_id)
+        obj_type = str(obj_id[0])
+        kwargs = {
+            'objectIdentifier': obj_id,
+            'objectName': obj_type + ':' + str(obj_id[1]),
+            'statusFlags': [0, 0, 0, 0],
+        }
+        if obj_type == 'datetime-value':
+            value = self._to_date_time(value)
+        if obj_type.startswith('analog'):
+            kwargs['covIncrement'] = 0.0
+        if obj_type.startswith('multi-state'):
+            kwargs['numberOfStates'] = self.MULTISTATE_STATES
+        if obj_type.endswith('output'):
+            kwargs['relinquishDefault'] = value
+        kwargs['presentValue'] = value
+        return self._OBJECT_CLASSES[obj_type](**kwargs)
+
+# endregion
+
+# region 日時の進行
+
+    async def _clock_loop(self):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            # 加速度が書き換えられたら、その時点を加速開始の日時とする
+            rate = float(self._acc_obj.presentValue)
+            if rate != self.acc_rate:
+                self.acc_rate = rate
+                self.base_real_datetime = datetime.datetime.today()
+                self.base_sim_datetime = self.current_datetime
+                self.set_present_value(self.DATETIMECONTROLLER_DEVICE_ID, 'datetimeValue:3', self.base_real_datetime)
+                self.set_present_value(self.DATETIMECONTROLLER_DEVICE_ID, 'datetimeValue:4', self.base_sim_datetime)
+                next_time = loop.time() + self.timestep_sec / rate if 0 < rate else float('inf')
+
+            # 加速度の書き換えに気付けるよう、最長でも0.1秒ごとに起きる
+            wait = next_time - loop.time()
+            if 0 < wait:
+                await asyncio.sleep(min(0.1, wait))
+                continue
+
+            self.current_datetime += datetime.timedelta(seconds=self.timestep_sec)
+            self.steps += 1
+            for handler in list(self._step_handlers):
+                rslt = handler(self, self.current_datetime)
+                if asyncio.iscoroutine(rslt):
+                    await rslt
+            self.set_present_value(self.DATETIMECONTROLLER_DEVICE_ID, 'datetimeValue:1', self.current_datetime)
+
+            # 処理が遅れた場合、エミュレータと同じく遅れたステップを待たずに続けて進める
+            # （catch_upがFalseの場合は遅れを取り戻さず、遅れたまま進める）
+            next_time += self.timestep_sec / self.acc_rate
+            self.is_delayed = next_time < loop.time()
+            if not self.catch_up:
+                next_time = max(next_time, loop.time())
+            await asyncio.sleep(0)
+
+    def _to_date_time(self, dtime):
+        return DateTime(
+            date=Date((dtime.year - 1900, dtime.month, dtime.day, dtime.isoweekday())),
+            time=Time((dtime.hour, dtime.minute, dtime.second, dtime.microsecond // 10000)))
+
+# endregion
+
+# region サンプル
+
+async def main():
+    emulator = LocalEmulator(acc_rate=600)
+    emulator.add_device(4, 'EnvironmentMonitor', [('analogInput:1001', 22.0)])
+    emulator.add_step_handler(lambda emu, step: print(step.strftime('%Y/%m/%d %H:%M:%S')))
+    await emulator.start()
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -3,6 +3,12 @@ import time
 import asyncio
 
 from enum import Enum
+from bacpypes3.basetypes import ErrorType
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
@@ -12,6 +18,9 @@ class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
     OCCUPANTMONITOR_EXCLUSIVE_PORT = 0xBAC0 + OCCUPANTMONITOR_DEVICE_ID
 
+    # 変化の割合の指数移動平均の重み
+    CHANGE_RATE_WEIGHT = 0.3
+
 # endregion
 
 # region 列挙型定義
@@ -30,7 +39,24 @@ class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
         # ドラフトによる不満足者率
         Dissatisfied_Draft = 6
         # 上下温度分布による不満足者率
-        Dissatisfied_VerticalTemp = 6
+        Dissatisfied_VerticalTemp = 7
+
+    class _Population():
+        def __init__(self, number):
+            # 在室状況
+            self.availability = np.zeros(number, dtype=bool)
+            # 温冷感
+            self.thermal_sensation = np.zeros(number, dtype=np.int8)
+            # 着衣量
+            self.clothing_index = np.zeros(number, dtype=np.float32)
+            # 一度でも読み取れたか否か
+            self.valid = np.zeros(number, dtype=bool)
+            # 最後に読み取ってからのrefresh_occupantsの回数
+            self.age = np.zeros(number, dtype=np.int32)
+            # 読み取るたびに値が変化した割合（指数移動平均）
+            self.change_rate = np.zeros(number, dtype=np.float32)
+            # 順番に読み取る場合の位置
+            self.cursor = 0
 
     class Tenant(Enum):
         # 南テナント
@@ -58,7 +84,7 @@ class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
 # region コンストラクタ
 
-    def __init__(self, id, name='occComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0):
+    def __init__(self, id, name='occComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0, port=None):
         """インスタンスを初期化する
 
         Args:
@@ -66,10 +92,19 @@ class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             name (str): 通信用のDeviceの名前
             device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
             emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            port (int): 通信に使うDeviceのポート（Noneの場合は0xBAC0+id）
         """
-        super().__init__(id, name, device_ip, emulator_ip, time_out_sec)
+        super().__init__(id, name, device_ip, emulator_ip, time_out_sec, port)
         self.target_ip = emulator_ip + ':' + str(self.OCCUPANTMONITOR_EXCLUSIVE_PORT)
 
+        # テナントごとの執務者の総数（get_total_occupant_numberで調べた値）
+        self._total_occupant_numbers = {}
+
+        # refresh_occupantsで保持するテナントごとの執務者の情報
+        self._populations = {}
+        self._refresh_slice_number = 1
+        self._refresh_prioritized = False
+
 # endregion
 
 # region テナント・ゾーン別
@@ -195,6 +230,167 @@ class OccupantCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
 # endregion
 
+# region 執務者の一括読み取り
+
+    async def get_total_occupant_number(self, tenant):
+        """テナントに属する執務者（不在の執務者を含む）の総数を取得する
+
+        在室状況の点を執務者番号の順にまとめて読み取り、存在しない点に達するまで数える。
+        調べた値は保存し、2回目以降は通信しない。
+
+        Args:
+            tenant (Tenant): テナント
+        Returns:
+            list(bool,int): 読み取り成功の真偽,執務者の総数
+        """
+        if tenant in self._total_occupant_numbers:
+            return True, self._total_occupant_numbers[tenant]
+
+        number = 0
+        while True:
+            insts = [self._get_occupant_inst('binary-input', tenant, number + k + 1, self._member.Availability) for k in range(self.MAX_RPM_OBJECTS)]
+            vals = await self.read_present_values(self.target_ip,insts)
+            for val in vals:
+                if val[0]:
+                    number += 1
+                elif isinstance(val[1], ErrorType):
+                    # 存在しない点に達した
+                    self._total_occupant_numbers[tenant] = number
+                    return True, number
+                else:
+                    return False, val[1]
+
+    async def sweep_occupants(self, tenant):
+        """テナントの全執務者の在室状況、温冷感、着衣量をまとめて読み取る
+
+        各配列のk番目の要素は執務者番号k+1の値。
+        在室状況と値の有効性はnumpy.packbits(bitorder='little')で詰めたビット列で、
+        numpy.unpackbits(x, count=執務者の総数, bitorder='little')で真偽の配列に戻せる。
+
+        Args:
+            tenant (Tenant): テナント
+        Returns:
+            list(bool,ndarray,ndarray,ndarray,ndarray): 読み取り成功の真偽,在室状況(uint8のビット列),温冷感(int8),着衣量(float32),値の有効性(uint8のビット列)
+        """
+        if np is None:
+            raise ImportError('sweep_occupants() requires numpy')
+
+        rslt = await self.get_total_occupant_number(tenant)
+        if not rslt[0]:
+            return False, None, None, None, None
+        number = rslt[1]
+
+        availability, thermal_sensation, clothing_index, valid = await self._read_occupants(tenant, np.arange(number))
+        return (bool(valid.all()),
+                np.packbits(availability, bitorder='little'),
+                thermal_sensation,
+                clothing_index,
+                np.packbits(valid, bitorder='little'))
+
+    def set_progressive_refresh(self, slice_number, prioritized=False):
+        """refresh_occupantsで1回に読み取る執務者の範囲を設定する
+
+        執務者を slice_number 個に分け、1回のrefresh_occupantsでそのうち1つ分だけを読み取る。
+        prioritizedがFalseの場合は順番に、Trueの場合は最近よく変化した執務者と長く読み取っていない執務者を優先して読み取る。
+
+        Args:
+            slice_number (int): 分割数（1の場合は毎回全員を読み取る）
+            prioritized (bool): 変化の頻度で優先順位をつけるか否か
+        """
+        self._refresh_slice_number = max(1, int(slice_number))
+        self._refresh_prioritized = prioritized
+
+    async def refresh_occupants(self, tenant):
+        """執務者の情報を一部だけ読み取り、テナント全員分の最新の情報を取得する
+
+        初回は全員を読み取る。2回目以降はset_progressive_refreshで設定した1つ分だけを読み取り、
+        それ以外の執務者は前回までに読み取った値を返す。経過回数はその執務者を読み取ってから
+        何回refresh_occupantsを呼んだかを表す（今回読み取った執務者は0）。
+
+        Args:
+            tenant (Tenant): テナント
+        Returns:
+            list(bool,ndarray,ndarray,ndarray,ndarray,ndarray): 読み取り成功の真偽,在室状況(uint8のビット列),温冷感(int8),着衣量(float32),値の有効性(uint8のビット列),経過回数(int32)
+        """
+        if np is None:
+            raise ImportError('refresh_occupants() requires numpy')
+
+        pop = self._populations.get(tenant)
+        if pop is None:
+            rslt = await self.get_total_occupant_number(tenant)
+            if not rslt[0]:
+                return False, None, None, None, None, None
+            pop = self._Population(rslt[1])
+            indices = np.arange(rslt[1])
+            self._populations[tenant] = pop
+        else:
+            pop.age += 1
+            indices = self._select_refresh_indices(pop)
+
+        availability, thermal_sensation, clothing_index, valid = await self._read_occupants(tenant, indices)
+
+        # 値が変化した割合を指数移動平均で記録する（初めて読み取れた執務者は比べる値がないため除く）
+        read = indices[valid]
+        known = pop.valid[read]
+        changed = ((pop.availability[read] != availability[valid]) |
+                   (pop.thermal_sensation[read] != thermal_sensation[valid]) |
+                   (pop.clothing_index[read] != clothing_index[valid]))
+        compared = read[known]
+        pop.change_rate[compared] = ((1 - self.CHANGE_RATE_WEIGHT) * pop.change_rate[compared] +
+                                     self.CHANGE_RATE_WEIGHT * changed[known])
+        pop.availability[read] = availability[valid]
+        pop.thermal_sensation[read] = thermal_sensation[valid]
+        pop.clothing_index[read] = clothing_index[valid]
+        pop.valid[read] = True
+        pop.age[read] = 0
+        pop.cursor += 1
+
+        return (bool(valid.all()),
+                np.packbits(pop.availability, bitorder='little'),
+                pop.thermal_sensation.copy(),
+                pop.clothing_index.copy(),
+                np.packbits(pop.valid, bitorder='little'),
+                pop.age.copy())
+
+    def _select_refresh_indices(self, pop):
+        number = len(pop.age)
+        slice_size = -(-number // self._refresh_slice_number)
+        if not self._refresh_prioritized:
+            slice_index = pop.cursor % self._refresh_slice_number
+            return np.arange(slice_index * slice_size, min(number, (slice_index + 1) * slice_size))
+
+        # 変化の頻度に下限を設けて、変化しない執務者もいずれ読み取られるようにする
+        priority = (pop.age + 1) * np.maximum(pop.change_rate, 1.0 / self._refresh_slice_number)
+        priority[~pop.valid] = np.inf
+        return np.sort(np.argsort(-priority, kind='stable')[:slice_size])
+
+    async def _read_occupants(self, tenant, indices):
+        insts = []
+        for k in indices:
+            insts.append(self._get_occupant_inst('binary-input', tenant, int(k) + 1, self._member.Availability))
+            insts.append(self._get_occupant_inst('analogInput', tenant, int(k) + 1, self._member.ThermalSensation))
+            insts.append(self._get_occupant_inst('analogInput', tenant, int(k) + 1, self._member.ClothingIndex))
+        vals = await self.read_present_values(self.target_ip,insts)
+
+        availability = np.zeros(len(indices), dtype=bool)
+        thermal_sensation = np.zeros(len(indices), dtype=np.int8)
+        clothing_index = np.zeros(len(indices), dtype=np.float32)
+        valid = np.zeros(len(indices), dtype=bool)
+        for k in range(len(indices)):
+            av, ts, clo = vals[3 * k:3 * k + 3]
+            if not (av[0] and ts[0] and clo[0]):
+                continue
+            availability[k] = (av[1] == 1)
+            thermal_sensation[k] = int(round(ts[1]))
+            clothing_index[k] = clo[1]
+            valid[k] = True
+        return availability, thermal_sensation, clothing_index, valid
+
+    def _get_occupant_inst(self, obj_type, tenant, occupant_index, member):
+        return obj_type + ':' + str(10000 * int(tenant.value) + 10 * occupant_index + member.value)
+
+# endregion
+
 async def main():
     oCom = OccupantCommunicator(15)
 
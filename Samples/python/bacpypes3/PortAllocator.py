@@ -0,0 +1,200 @@
+import asyncio
+import atexit
+import json
+import os
+import socket
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class PortAllocator():
+    """同じホストで動く複数のクライアントに、重ならないDevice IDとポートを割り当てるクラス
+
+    割り当てはホスト内で共有する小さな登録ファイル（JSON）に記録し、ファイルをロックして書き換えるため、
+    別のプロセスが同時に割り当てても重ならない。登録したプロセスが終了していれば、その割り当ては再利用する。
+    割り当てはプロセスの終了時に自動で解除する。
+    """
+
+# region 定数宣言
+
+    # エミュレータが使うDevice ID（0～9）とポート（47808～47817）は割り当てない
+    RESERVED_DEVICE_IDS = range(0, 10)
+    RESERVED_PORTS = range(0xBAC0, 0xBAC0 + 10)
+
+    # 既定の登録ファイル
+    DEFAULT_REGISTRY_PATH = os.path.join(tempfile.gettempdir(), 'shizuku_bacnet_ports.json')
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, port_range=range(48000, 49000), device_id_range=range(100, 4000),
+                 registry_path=None, device_ip='127.0.0.1'):
+        """インスタンスを初期化する
+
+        Args:
+            port_range (range): 割り当てるポートの範囲
+            device_id_range (range): 自動で割り当てるDevice IDの範囲
+            registry_path (str): 登録ファイルのパス（Noneの場合はDEFAULT_REGISTRY_PATH）
+            device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx、/以降のマスクは付けてもよい）
+        """
+        self.port_range = port_range
+        self.device_id_range = device_id_range
+        self.registry_path = self.DEFAULT_REGISTRY_PATH if registry_path is None else registry_path
+        self.device_ip = device_ip
+
+        # このインスタンスが割り当てたポート
+        self._allocated = []
+        atexit.register(self.release_all)
+
+# endregion
+
+# region 割り当て
+
+    def allocate(self, device_id=None, name=''):
+        """Device IDとポートを割り当てる
+
+        Args:
+            device_id (int): 使いたいDevice ID（Noneの場合は空いているIDを割り当てる）
+            name (str): 登録ファイルに記録する名前
+
+        Returns:
+            list(int,int): Device ID,ポート
+        """
+        with self._locked_registry() as registry:
+            used_ids = set(entry['device_id'] for entry in registry.values())
+            if device_id is None:
+                device_id = next((i for i in self.device_id_range
+                                  if i not in used_ids and i not in self.RESERVED_DEVICE_IDS), None)
+                if device_id is None:
+                    raise RuntimeError('no free device id in ' + str(self.device_id_range))
+            elif device_id in self.RESERVED_DEVICE_IDS:
+                raise ValueError('device id ' + str(device_id) + ' is reserved for the emulator')
+            elif device_id in used_ids:
+                raise ValueError('device id ' + str(device_id) + ' is already in use')
+
+            port = next((p for p in self.port_range
+                         if str(p) not in registry and p not in self.RESERVED_PORTS and self._is_free(p)), None)
+            if port is None:
+                raise RuntimeError('no free port in ' + str(self.port_range))
+
+            registry[str(port)] = {'device_id': device_id, 'pid': os.getpid(), 'ip': self.device_ip, 'name': name}
+            self._allocated.append(port)
+        return device_id, port
+
+    def release(self, port):
+        """割り当てを解除する
+
+        Args:
+            port (int): allocateで割り当てたポート
+        """
+        with self._locked_registry() as registry:
+            entry = registry.get(str(port))
+            if entry is not None and entry['pid'] == os.getpid():
+                del registry[str(port)]
+        if port in self._allocated:
+            self._allocated.remove(port)
+
+    def release_all(self):
+        """このインスタンスが割り当てたすべての割り当てを解除する
+        """
+        for port in list(self._allocated):
+            self.release(port)
+
+    def get_allocations(self):
+        """登録ファイルに記録されている割り当てを取得する（終了したプロセスの分は除く）
+
+        Returns:
+            dict: ポートごとの（Device ID, プロセスID, IP Address, 名前）
+        """
+        with self._locked_registry() as registry:
+            return {int(port): dict(entry) for port, entry in registry.items()}
+
+# endregion
+
+# region 補助メソッド
+
+    class _LockedRegistry():
+        def __init__(self, allocator):
+            self.allocator = allocator
+            self.file = None
+            self.registry = None
+
+        def __enter__(self):
+            self.file = open(self.allocator.registry_path, 'a+')
+            if fcntl is not None:
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            self.file.seek(0)
+            text = self.file.read()
+            try:
+                self.registry = json.loads(text) if text.strip() != '' else {}
+            except ValueError:
+                self.registry = {}
+
+            # 終了したプロセスの割り当ては消す
+            for port, entry in list(self.registry.items()):
+                if not self.allocator._is_alive(entry['pid']):
+                    del self.registry[port]
+            return self.registry
+
+        def __exit__(self, *exc_details):
+            try:
+                self.file.seek(0)
+                self.file.truncate()
+                json.dump(self.registry, self.file, indent=1)
+                self.file.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.file, fcntl.LOCK_UN)
+                self.file.close()
+
+    def _locked_registry(self):
+        return self._LockedRegistry(self)
+
+    def _is_alive(self, pid):
+        if pid == os.getpid() or os.name == 'nt':
+            # Windowsのos.killはシグナル0でもプロセスを止めてしまうため確かめない
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            # 権限がない場合などは生きているとみなす
+            return True
+        return True
+
+    def _is_free(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # PresentValueReadWriterと同じくxxx.xxx.xxx.xxx/24などの形式も受け付ける
+            sock.bind((self.device_ip.split('/')[0], port))
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+# endregion
+
+# region サンプル
+
+async def main():
+    # 割り当てだけを使う場合にVRFの通信クラスを読み込まないよう、サンプルの中で読み込む
+    from VRFSystemCommunicator import VRFSystemCommunicator
+
+    allocator = PortAllocator()
+    device_id, port = allocator.allocate(name='sample')
+    print('device id ' + str(device_id) + ', port ' + str(port))
+
+    vrfCom = VRFSystemCommunicator(device_id, port=port)
+    await vrfCom.subscribe_date_time_cov()
+    print(vrfCom.current_date_time().strftime('%Y/%m/%d %H:%M:%S'))
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -1,12 +1,23 @@
 import datetime
 import asyncio
+import logging
 
 from bacpypes3.pdu import Address, IPv4Address
 from bacpypes3.ipv4.app import NormalApplication
 from bacpypes3.primitivedata import ObjectIdentifier, Enumerated, Real, Integer, Unsigned
-from bacpypes3.basetypes import DateTime
+from bacpypes3.basetypes import DateTime, ErrorType
 from bacpypes3.local.device import DeviceObject
-from bacpypes3.apdu import ErrorRejectAbortNack
+from bacpypes3.apdu import ErrorRejectAbortNack, AbortPDU, AbortReason
+
+logger = logging.getLogger(__name__)
+
+class DeviceUnavailableError(Exception):
+    """応答しないデバイスへの要求を送らずに失敗させたことを表す例外
+    """
+
+    def __init__(self, addr):
+        super().__init__('device at ' + addr + ' is not responding (circuit open)')
+        self.addr = addr
 
 class PresentValueReadWriter():
     """BACnet通信でPresent valueを読み書きするクラス
@@ -16,7 +27,56 @@ class PresentValueReadWriter():
 
     DATETIMECONTROLLER_EXCLUSIVE_PORT = 0xBAC0 + DATETIMECONTROLLER_DEVICE_ID
 
-    def __init__(self, id, name='anonymous device', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec = 1.0):
+    # 1回のReadPropertyMultipleで読み取るオブジェクトの最大数
+    MAX_RPM_OBJECTS = 50
+
+    # 並行して送るWritePropertyの最大数
+    MAX_CONCURRENT_WRITES = 16
+
+    # DateTimeのCOV登録の寿命[sec]（寿命が切れる前にbacpypes3が購読を解除せずに登録し直す）
+    DATETIME_COV_LIFETIME_SEC = 60 * 60
+
+    # DateTimeのCOV再接続の待ち時間の下限と上限[sec]
+    DATETIME_COV_RETRY_MIN_SEC = 1.0
+    DATETIME_COV_RETRY_MAX_SEC = 60.0
+
+    # DateTimeのCOVの購読を止める際に、購読の解除の応答を待つ時間[sec]（過ぎたらタスクをキャンセルする）
+    DATETIME_COV_STOP_TIMEOUT_SEC = 15.0
+
+    # エミュレータのタイムステップの既定値[sec]（setting.iniのtimestep）
+    DEFAULT_TIMESTEP_SEC = 60
+
+    # ステップ検出用のCOVのSubscriber process identifierに加える値（加速度のCOVと区別する）
+    STEP_COV_PROCESS_ID_OFFSET = 0x10000
+
+    # Present valueのCOV登録の寿命[sec]（寿命が切れる前にbacpypes3が購読を解除せずに登録し直す）
+    POINT_COV_LIFETIME_SEC = 10 * 60
+
+    # COVの登録し直しが失敗していないかを確かめる周期[sec]
+    COV_REFRESH_CHECK_SEC = 5.0
+
+    # 回路を開く（要求を送らずに失敗させる）までの連続した無応答の回数
+    CIRCUIT_FAILURE_THRESHOLD = 3
+
+    # 回路を開いてから、デバイスが復帰したかを確かめるまでの時間[sec]
+    CIRCUIT_OPEN_SEC = 5.0
+
+    # 復帰を確かめる読み取りの応答を待つ時間[sec]
+    CIRCUIT_PROBE_TIMEOUT_SEC = 1.0
+
+    # 通信先のDevice IDが分からない場合に使うDeviceオブジェクトのインスタンス番号（受け取ったデバイス自身を指す）
+    WILDCARD_DEVICE_INSTANCE = 4194303
+
+    class _Circuit():
+        def __init__(self):
+            # 連続した無応答の回数
+            self.failures = 0
+            # 回路を開いた時刻（asyncioのループ時刻、閉じている場合はNone）
+            self.opened_at = None
+            # 復帰を確かめている最中のタスク
+            self.probe = None
+
+    def __init__(self, id, name='anonymous device', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec = 1.0, port=None):
         """インスタンスを初期化する
 
         Args:
@@ -25,6 +85,7 @@ class PresentValueReadWriter():
             device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
             emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
             time_out_sec (float): タイムアウトまでの時間[sec]
+            port (int): 通信に使うDeviceのポート（Noneの場合は0xBAC0+id、PortAllocatorで割り当てることもできる）
         """
 
         # タイムアウトまでの時間
@@ -33,26 +94,58 @@ class PresentValueReadWriter():
         # idを保存
         self.id = id
 
+        # エミュレータのIPアドレスを保存
+        self.emulator_ip = emulator_ip
+
         # DateTimeControllerのIPアドレスを保存
         self.dtc_id = emulator_ip + ':' + str(self.DATETIMECONTROLLER_EXCLUSIVE_PORT)
 
         # DateTimeのCOV登録状況
         self.dtcov_scribed = False
+        self.dt_synchronized = False
         self.acc_rate = 0
         self.base_real_datetime = datetime.datetime.today()
         self.base_sim_datetime = datetime.datetime.today()
+        self._dtcov_task = None
+        self._dtcov_stop = None
+        self._acc_changed_handlers = []
+
+        # 読み取った値を受け取る関数
+        self._read_observers = []
+
+        # ステップをまたがない読み取りの統計
+        self.step_consistency_stats = {'sweeps': 0, 'straddled': 0, 'retries': 0, 'failed': 0}
+
+        # ステップの検出
+        self.timestep_sec = self.DEFAULT_TIMESTEP_SEC
+        self.default_acc_rate = 0
+        self.latest_step = None
+        self._consumed_step = None
+        self._step_task = None
+        self._step_waiters = []
+        self.step_stats = {'steps': 0, 'unobserved': 0, 'irregular': 0}
+
+        # 通信先のアドレスごとの回路の状態
+        self._circuits = {}
+
+        # BACnetコントローラを用意
+        self.name = name
+        self.device_ip = device_ip
+        self.bacdevice = self._create_application(int(0xBAC0 + id if port is None else port))
 
+        # 要求を振り分けるBACnetコントローラ（先頭はbacdevice）と、それぞれの応答待ちの要求の数
+        self._pool = [self.bacdevice]
+        self._outstanding = [0]
+
+    def _create_application(self, port):
         this_device = DeviceObject(
-            objectName=name,
-            objectIdentifier=id,
+            objectName=self.name,
+            objectIdentifier=self.id,
             maxApduLengthAccepted=1024,
             segmentationSupported='segmentedBoth',
             vendorIdentifier=15,
         )
-
-        # BACnetコントローラを用意
-        ipv4_address = IPv4Address(device_ip, int(0xBAC0 + id))
-        self.bacdevice = NormalApplication(this_device, ipv4_address)
+        return NormalApplication(this_device, IPv4Address(self.device_ip, port))
 
 # region readproperty関連
 
@@ -67,26 +160,298 @@ class PresentValueReadWriter():
             list: 読み取り成功の真偽, Present value
         """
 
+        err = await self._check_circuit(addr)
+        if err is not None:
+            return False, err
+
         try:
-            response = await self.bacdevice.read_property(
+            response = await self._pooled_request(lambda app: app.read_property(
                 address=Address(addr),
                 objid=ObjectIdentifier(obj_id),
                 prop='present-value'
-            )
-
-            if isinstance(response, DateTime):
-                return True, datetime.datetime(
-                    year=1900 + response.date[0],
-                    month=response.date[1],
-                    day=response.date[2],
-                    hour=response.time[0],
-                    minute=response.time[1],
-                    second=response.time[2])
-            else:
-                return True, response
+            ))
+            self._record_response(addr, None)
+            value = self._convert_present_value(response)
+            await self._notify_read(addr, obj_id, value)
+            return True, value
         except ErrorRejectAbortNack as err:
+            self._record_response(addr, err)
             return False, err
 
+    async def read_present_values(self, addr, obj_ids):
+        """Read property multiple requestで複数のPresent valueをまとめて読み取る
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+            obj_ids (list(string)): 通信先のBACnet DeviceのオブジェクトIDのリスト
+
+        Returns:
+            list(list): obj_idsと同じ順序の（読み取り成功の真偽, Present value）のリスト
+        """
+
+        # APDUが大きくなりすぎないように分割し、分割したリクエストは並行して送る
+        chunks = [obj_ids[i:i + self.MAX_RPM_OBJECTS] for i in range(0, len(obj_ids), self.MAX_RPM_OBJECTS)]
+        results = await asyncio.gather(*[self._read_present_values(addr, chunk) for chunk in chunks])
+        return [val for result in results for val in result]
+
+    async def _read_present_values(self, addr, obj_ids):
+        parameter_list = []
+        for obj_id in obj_ids:
+            parameter_list.extend([ObjectIdentifier(obj_id), ['present-value']])
+
+        err = await self._check_circuit(addr)
+        if err is not None:
+            return [(False, err)] * len(obj_ids)
+
+        try:
+            response = await self._pooled_request(lambda app: app.read_property_multiple(
+                address=Address(addr),
+                parameter_list=parameter_list
+            ))
+            self._record_response(addr, None)
+        except ErrorRejectAbortNack as err:
+            self._record_response(addr, err)
+            return [(False, err)] * len(obj_ids)
+        if not isinstance(response, list) or len(response) != len(obj_ids):
+            return [(False, response)] * len(obj_ids)
+
+        vals = []
+        for obj_id, (_, _, _, value) in zip(obj_ids, response):
+            if value is None or isinstance(value, ErrorType):
+                vals.append((False, value))
+            else:
+                value = self._convert_present_value(value)
+                await self._notify_read(addr, obj_id, value)
+                vals.append((True, value))
+        return vals
+
+    def add_read_observer(self, observer):
+        """読み取りに成功した値を受け取る関数を登録する
+
+        一括読み取りの結果を他の処理（コマンドの反映確認など）で共有するために使う。
+        コルーチン関数の場合は、その処理が終わるまで読み取りの結果を返さない。
+
+        Args:
+            observer (callable): 通信先のアドレス, ObjectIdentifier, Present valueを引数にとる関数（コルーチン関数も可）
+        """
+        self._read_observers.append(observer)
+
+    def remove_read_observer(self, observer):
+        """読み取りに成功した値を受け取る関数の登録を解除する
+
+        Args:
+            observer (callable): 登録済みの関数
+        """
+        self._read_observers.remove(observer)
+
+    async def _notify_read(self, addr, obj_id, value):
+        if len(self._read_observers) == 0:
+            return
+        obj_id = ObjectIdentifier(obj_id)
+        for observer in list(self._read_observers):
+            rslt = observer(addr, obj_id, value)
+            if asyncio.iscoroutine(rslt):
+                await rslt
+
+    def _convert_present_value(self, value):
+        if isinstance(value, DateTime):
+            return datetime.datetime(
+                year=1900 + value.date[0],
+                month=value.date[1],
+                day=value.date[2],
+                hour=value.time[0],
+                minute=value.time[1],
+                second=value.time[2],
+                microsecond=0 if value.time[3] == 255 else value.time[3] * 10000) # 255は1/100秒が未指定
+        else:
+            return value
+
+# endregion
+
+# region ステップ検出関連
+
+    def load_setting_ini(self, path):
+        """エミュレータのsetting.iniからタイムステップと既定の加速度を読み込む
+
+        Args:
+            path (str): setting.iniのパス
+        """
+        with open(path, encoding='utf-8-sig') as f:
+            for line in f:
+                line = line.split('//')[0].strip().rstrip(';')
+                if line.startswith('#') or '=' not in line:
+                    continue
+                key, value = [v.strip() for v in line.split('=', 1)]
+                if key == 'timestep':
+                    self.timestep_sec = float(value)
+                elif key == 'accelerationRate':
+                    self.default_acc_rate = float(value)
+
+    async def next_step(self):
+        """エミュレータが次のタイムステップに進むまで待つ
+
+        同じステップで2回戻ることはない。前回の呼び出しの後に既に新しいステップへ進んでいた場合はすぐに戻り、
+        その間に飛ばしたステップの数を返す。ステップはDateTimeControllerの現在日時（datetimeValue:1）の
+        COVで検出し、COVが使えない場合は加速度とタイムステップから決めた間隔で読み取って検出する。
+
+        Returns:
+            list(datetime,int): 新しいステップの日時,前回の呼び出しから飛ばしたステップの数
+        """
+        if self._step_task is None or self._step_task.done():
+            self._step_task = asyncio.create_task(self._step_loop())
+
+        if self.latest_step is None or self.latest_step == self._consumed_step:
+            future = asyncio.get_running_loop().create_future()
+            self._step_waiters.append(future)
+            await future
+
+        step = self.latest_step
+        skipped = 0
+        if self._consumed_step is not None:
+            skipped = max(0, round((step - self._consumed_step).total_seconds() / self.timestep_sec) - 1)
+        self._consumed_step = step
+        return step, skipped
+
+    async def stop_step_detection(self):
+        """ステップの検出を止める
+        """
+        if self._step_task is not None:
+            self._step_task.cancel()
+            try:
+                await self._step_task
+            except asyncio.CancelledError:
+                pass
+            self._step_task = None
+
+    def get_step_poll_interval(self):
+        """ステップを読み取って検出する場合の間隔[sec]を取得する
+
+        Returns:
+            float: 1ステップの実時間の1/4（0.01～1秒）
+        """
+        acc_rate = self.acc_rate if 0 < self.acc_rate else self.default_acc_rate
+        if acc_rate <= 0:
+            return 0.25
+        return min(1.0, max(0.01, self.timestep_sec / acc_rate / 4))
+
+    async def _step_loop(self):
+        try:
+            async with self.bacdevice.change_of_value(
+                address=Address(self.dtc_id),
+                subscriber_process_identifier=self.id + self.STEP_COV_PROCESS_ID_OFFSET,
+                monitored_object_identifier=ObjectIdentifier('datetime-value:1'), # 現在の日時
+                lifetime=self.DATETIME_COV_LIFETIME_SEC,
+                issue_confirmed_notifications=False
+            ) as scm:
+                while True:
+                    try:
+                        # 通知が届かない場合に備えて、1ステップ分より長く待っても来なければ読み取って確かめる
+                        property_identifier, property_value = await asyncio.wait_for(
+                            scm.get_value(), 8 * self.get_step_poll_interval())
+                        if(f"{property_identifier}"=='present-value'):
+                            self._on_step(self._convert_present_value(property_value))
+                    except asyncio.TimeoutError:
+                        await self._poll_step()
+        except asyncio.CancelledError:
+            raise
+        except (Exception, ErrorRejectAbortNack):
+            # COVが使えない場合（エラーや無応答を含む）は読み取りで検出する
+            while True:
+                await self._poll_step()
+                await asyncio.sleep(self.get_step_poll_interval())
+
+    async def _poll_step(self):
+        val = await self.read_present_value(self.dtc_id, 'datetimeValue:1')
+        if val[0]:
+            self._on_step(val[1])
+
+    def _on_step(self, step):
+        if not isinstance(step, datetime.datetime) or (self.latest_step is not None and step <= self.latest_step):
+            return
+
+        if self.latest_step is not None:
+            # タイムステップと食い違う進み方をしていないかを確かめる
+            steps = (step - self.latest_step).total_seconds() / self.timestep_sec
+            if abs(steps - round(steps)) > 1e-6 or round(steps) < 1:
+                self.step_stats['irregular'] += 1
+            self.step_stats['unobserved'] += max(0, round(steps) - 1)
+        self.step_stats['steps'] += 1
+        self.latest_step = step
+
+        waiters, self._step_waiters = self._step_waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(step)
+
+# endregion
+
+# region ステップ整合読み取り関連
+
+    async def read_step_consistent(self, requests, max_retries=3):
+        """同じシミュレーションステップの値だけをそろえて読み取る
+
+        読み取りの前後でDateTimeControllerの現在日時（datetimeValue:1）を読み、
+        途中でステップが進んだ場合はステップが進んだ後の値がそろうまで読み直す。
+        まず全体をまとめて前後で挟み、ずれた場合はデバイスごとに前後で挟んで、
+        最新のステップの値でないデバイスだけを読み直す。
+
+        Args:
+            requests (dict): 通信先のアドレスごとのオブジェクトIDのリスト
+            max_retries (int): 読み直しの最大回数
+
+        Returns:
+            list(bool,datetime,dict): すべての値が同じステップのものか否か,最新のステップの日時,
+            アドレスごとの（値のステップの日時, （読み取り成功の真偽, Present value）のリスト）
+        """
+        self.step_consistency_stats['sweeps'] += 1
+
+        before = await self.read_present_value(self.dtc_id, 'datetimeValue:1')
+        addrs = list(requests.keys())
+        vals = await asyncio.gather(*[self.read_present_values(addr, requests[addr]) for addr in addrs])
+        after = await self.read_present_value(self.dtc_id, 'datetimeValue:1')
+        if not (before[0] and after[0]):
+            self.step_consistency_stats['failed'] += 1
+            return False, None, {addr: (None, val) for addr, val in zip(addrs, vals)}
+
+        step = after[1]
+        results = {addr: (before[1] if before[1] == step else None, val) for addr, val in zip(addrs, vals)}
+        if before[1] == step:
+            return True, step, results
+
+        self.step_consistency_stats['straddled'] += 1
+        for _ in range(max_retries):
+            self.step_consistency_stats['retries'] += 1
+            stale = [addr for addr in addrs if results[addr][0] != step]
+            brackets = await asyncio.gather(*[self._read_bracketed(addr, requests[addr]) for addr in stale])
+            for addr, rslt in zip(stale, brackets):
+                results[addr] = rslt
+
+            # さらにステップが進んだ場合は、その新しいステップにそろえ直す
+            steps = [rslt[0] for rslt in results.values() if rslt[0] is not None]
+            if 0 < len(steps):
+                step = max(steps)
+            if all(results[addr][0] == step for addr in addrs):
+                return True, step, results
+
+        self.step_consistency_stats['failed'] += 1
+        return False, step, results
+
+    def get_step_consistency_stats(self):
+        """ステップをまたがない読み取りの統計を取得する
+
+        Returns:
+            dict: 読み取り回数(sweeps),途中でステップが進んだ回数(straddled),読み直しの回数(retries),そろわなかった回数(failed)
+        """
+        return dict(self.step_consistency_stats)
+
+    async def _read_bracketed(self, addr, obj_ids):
+        before = await self.read_present_value(self.dtc_id, 'datetimeValue:1')
+        vals = await self.read_present_values(addr, obj_ids)
+        after = await self.read_present_value(self.dtc_id, 'datetimeValue:1')
+        if before[0] and after[0] and before[1] == after[1]:
+            return after[1], vals
+        return None, vals
+
 # endregion
 
 # region writeproperty関連
@@ -103,17 +468,376 @@ class PresentValueReadWriter():
             bool: 書き込み成功の真偽
         """        
 
+        err = await self._check_circuit(addr)
+        if err is not None:
+            return False, err
+
         try:
-            await self.bacdevice.write_property(
+            await self._pooled_request(lambda app: app.write_property(
                 address=Address(addr),
                 objid=ObjectIdentifier(obj_id),
                 prop='present-value',
                 value=value
-            )
+            ))
+            self._record_response(addr, None)
             return True, None
         except ErrorRejectAbortNack as err:
+            self._record_response(addr, err)
             return False, err
 
+    async def write_present_values(self, addr, obj_values):
+        """複数のPresent valueを並行して書き込む
+
+        エミュレータはWritePropertyMultipleに対応していないため、
+        WritePropertyを最大MAX_CONCURRENT_WRITES件まで並行して送る。
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+            obj_values (list(list)): （オブジェクトID, Present value）のリスト
+
+        Returns:
+            list(list): obj_valuesと同じ順序の（書き込み成功の真偽, エラー）のリスト
+        """
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_WRITES)
+
+        async def write(obj_id, value):
+            async with semaphore:
+                return await self.write_present_value(addr, obj_id, value)
+
+        return list(await asyncio.gather(*[write(obj_id, value) for obj_id, value in obj_values]))
+
+# endregion
+
+# region Present valueのCOV関連
+
+    async def subscribe_present_value_cov(self, addr, obj_id, handler, stop_event=None):
+        """Present valueのCOVを購読し続ける（キャンセルされるかstop_eventがセットされるまで戻らない）
+
+        登録し直しは寿命が切れる前にbacpypes3が購読を解除せずに行う。回路が開いている場合や、登録・登録し直しが拒否された場合は例外を送出するため、
+        呼び出し側で読み取りに切り替えるなどの対応をとる。通知が途絶えたことは検出しない（変化がないのと区別できないため、
+        必要であれば呼び出し側で読み取りと併用する）。通知された値は読み取った値と同様に登録済みの関数にも渡す。
+        キャンセルした場合は購読の解除を送らないため、購読をやめる場合はstop_eventを使う。
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (string): 通信先のBACnet DeviceのオブジェクトID
+            handler (callable): 通信先のアドレス, オブジェクトID, Present valueを引数にとる関数（コルーチン関数も可）
+            stop_event (asyncio.Event): セットされたら購読を解除して戻る
+        """
+        err = await self._check_circuit(addr)
+        if err is not None:
+            raise err
+
+        stop_task = asyncio.create_task((asyncio.Event() if stop_event is None else stop_event).wait())
+        try:
+            async with self.bacdevice.change_of_value(
+                address=Address(addr),
+                monitored_object_identifier=ObjectIdentifier(obj_id),
+                lifetime=self.POINT_COV_LIFETIME_SEC,
+                issue_confirmed_notifications=True
+            ) as scm:
+                while not stop_task.done():
+                    received, notification = await self._wait_cov_value(scm, stop_task, self.COV_REFRESH_CHECK_SEC)
+                    if not received:
+                        continue # 登録し直しの失敗は_wait_cov_valueが送出する
+                    property_identifier, property_value = notification
+                    if(f"{property_identifier}"=='present-value'):
+                        value = self._convert_present_value(property_value)
+                        await self._notify_read(addr, obj_id, value)
+                        rslt = handler(addr, obj_id, value)
+                        if asyncio.iscoroutine(rslt):
+                            await rslt
+        finally:
+            stop_task.cancel()
+
+    async def _wait_cov_value(self, scm, stop_task, timeout):
+        """COVの通知、停止、指定した時間の経過のいずれかまで待つ
+
+        bacpypes3が寿命の前に行う登録し直しが失敗しても例外は伝わらないため、ここで確かめて送出する。
+
+        Returns:
+            list: 通知を受け取ったか否か, （property_identifier, property_value）
+        """
+        get_task = asyncio.create_task(scm.get_value())
+        try:
+            await asyncio.wait([get_task, stop_task], timeout=max(0, timeout), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            received = get_task.done()
+            if not received:
+                get_task.cancel()
+        refresh_task = scm.refresh_subscription_task
+        if refresh_task is not None and refresh_task.done() and not refresh_task.cancelled() and refresh_task.exception() is not None:
+            raise refresh_task.exception()
+        return received, (get_task.result() if received else None)
+
+    async def watch(self, points, min_change=0.0, max_interval=None, poll_interval_sec=1.0, use_cov=True):
+        """点の値の変化を順に返す（async forで使う）
+
+        最初に全ての点を読み取って返し、以降は値が変わった点だけを返す。use_covがTrueの場合は各点のCOVを購読し、
+        通知が届いている点は読み取らない。COVを購読できない点はpoll_interval_secごとにまとめて読み取る。
+        取り出されるまでに同じ点が何度変わった場合は最新の値だけを返す。
+        途中でループを抜けた場合は、購読と読み取りのタスクはイテレータが閉じられた時点で止まる。
+
+        Args:
+            points (list(list(str,str))): （通信先のアドレス, オブジェクトID）のリスト
+            min_change (float): 最後に返した値からの変化がこれ未満の場合は返さない（数値以外の値は変われば返す）
+            max_interval (float): 変化がなくてもこの時間[sec]が経過したら最新の値を返す（Noneの場合は返さない）
+            poll_interval_sec (float): COVを購読できない点を読み取る周期[sec]
+            use_cov (bool): COVを使うか否か
+
+        Returns:
+            AsyncIterator: （通信先のアドレス, オブジェクトID, Present value）
+        """
+        points = [(addr, obj_id) for addr, obj_id in points]
+        loop = asyncio.get_running_loop()
+        latest = {}
+        pending = {}
+        cov_active = set()
+        changed = asyncio.Event()
+
+        def on_value(addr, obj_id, value):
+            latest[(addr, obj_id)] = value
+            pending[(addr, obj_id)] = value
+            changed.set()
+
+        def on_cov(addr, obj_id, value):
+            cov_active.add((addr, obj_id))
+            on_value(addr, obj_id, value)
+
+        async def poll():
+            by_addr = {}
+            for point in points:
+                if point not in cov_active:
+                    by_addr.setdefault(point[0], []).append(point[1])
+            for addr, obj_ids in by_addr.items():
+                vals = await self.read_present_values(addr, obj_ids)
+                for obj_id, (success, value) in zip(obj_ids, vals):
+                    if success:
+                        on_value(addr, obj_id, value)
+
+        async def poll_loop():
+            while True:
+                start = loop.time()
+                await poll()
+                await asyncio.sleep(max(0.0, poll_interval_sec - (loop.time() - start)))
+
+        async def cov(addr, obj_id):
+            cancelled = False
+            try:
+                await self.subscribe_present_value_cov(addr, obj_id, on_cov)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            except (Exception, ErrorRejectAbortNack):
+                pass
+            finally:
+                # 購読できない点は読み取りに切り替える（キャンセルされた場合はwatchごと止まるため不要）
+                if not cancelled:
+                    cov_active.discard((addr, obj_id))
+
+        tasks = [asyncio.create_task(poll_loop())]
+        if use_cov:
+            tasks += [asyncio.create_task(cov(addr, obj_id)) for addr, obj_id in points]
+        last_yielded = {}
+        try:
+            while True:
+                timeout = None
+                if max_interval is not None and 0 < len(last_yielded):
+                    timeout = max(0.0, min(t for _, t in last_yielded.values()) + max_interval - loop.time())
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+
+                now = loop.time()
+                updates = dict(pending)
+                pending.clear()
+                if max_interval is not None:
+                    for point, (_, t) in last_yielded.items():
+                        if point not in updates and max_interval <= now - t:
+                            updates[point] = latest[point]
+
+                for (addr, obj_id), value in updates.items():
+                    last = last_yielded.get((addr, obj_id))
+                    stale = last is None or (max_interval is not None and max_interval <= now - last[1])
+                    if not stale and not self._is_significant(last[0], value, min_change):
+                        continue
+                    last_yielded[(addr, obj_id)] = (value, now)
+                    yield addr, obj_id, value
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _is_significant(self, old, new, min_change):
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+            return min_change <= abs(new - old) and old != new
+        return old != new
+
+# endregion
+
+# region アプリケーションプール関連
+
+    def add_pool_applications(self, ports):
+        """要求を振り分けるBACnetコントローラを追加する
+
+        1つのBACnetコントローラが1つの通信先に対して同時に待てる要求は256件（Invoke IDの数）までのため、
+        別のポートで待ち受けるBACnetコントローラを追加し、ReadProperty、ReadPropertyMultiple、WritePropertyを
+        応答待ちの要求が最も少ないものへ振り分ける。COVの購読は常にbacdeviceで行う。
+        ポートはPortAllocatorで割り当てるとよい。
+
+        Args:
+            ports (list(int)): 追加するBACnetコントローラのポートのリスト
+        """
+        for port in ports:
+            self._pool.append(self._create_application(port))
+            self._outstanding.append(0)
+
+    def close_pool_applications(self):
+        """追加したBACnetコントローラを閉じる
+        """
+        for app in self._pool[1:]:
+            app.close()
+        self._pool = self._pool[:1]
+        self._outstanding = self._outstanding[:1]
+
+    def get_pool_outstanding(self):
+        """BACnetコントローラごとの応答待ちの要求の数を取得する
+
+        Returns:
+            list(int): 応答待ちの要求の数（先頭はbacdevice）
+        """
+        return list(self._outstanding)
+
+    async def _pooled_request(self, request):
+        if len(self._pool) == 1:
+            return await request(self.bacdevice)
+
+        index = min(range(len(self._pool)), key=lambda i: self._outstanding[i])
+        app = self._pool[index]
+        self._outstanding[index] += 1
+        try:
+            return await request(app)
+        finally:
+            # 閉じられたBACnetコントローラの分は数えない
+            if index < len(self._pool) and self._pool[index] is app:
+                self._outstanding[index] -= 1
+
+# endregion
+
+# region 回路遮断関連
+
+    def get_circuit_state(self, addr):
+        """通信先の回路の状態を取得する
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+
+        Returns:
+            str: 'closed'（通常通り送る）、'open'（送らずに失敗させる）、'half-open'（復帰を確かめる）のいずれか
+        """
+        circuit = self._circuits.get(addr)
+        if circuit is None or circuit.opened_at is None:
+            return 'closed'
+        if asyncio.get_running_loop().time() < circuit.opened_at + self.CIRCUIT_OPEN_SEC:
+            return 'open'
+        return 'half-open'
+
+    def reset_circuit(self, addr=None):
+        """回路を閉じる（アドレスを省略した場合は全通信先）
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+        """
+        if addr is None:
+            self._circuits.clear()
+        else:
+            self._circuits.pop(addr, None)
+
+    async def probe_device(self, addr, timeout_sec=None):
+        """DeviceオブジェクトのObject nameを読み取り、デバイスが応答するかを確かめる（回路の状態は変えない）
+
+        無応答以外の応答（エラーや拒否を含む）が返れば応答したとみなす。
+        Device IDはエミュレータの専用ポート（0xBAC0+Device ID）から求め、求められない場合はワイルドカードを使う。
+
+        Args:
+            addr (string): 通信先のBACnet Deviceのアドレス（xxx.xxx.xxx.xxx:port）
+            timeout_sec (float): 応答を待つ時間[sec]（Noneの場合はCIRCUIT_PROBE_TIMEOUT_SEC）
+
+        Returns:
+            bool: 応答したか否か
+        """
+        # エミュレータの専用ポートはデバイスIDから決まる（I-Amは47808へブロードキャストされ、Who-Isでは受け取れない）
+        device_id = Address(addr).addrPort - 0xBAC0
+        if not 0 <= device_id < self.WILDCARD_DEVICE_INSTANCE:
+            device_id = self.WILDCARD_DEVICE_INSTANCE
+        try:
+            await asyncio.wait_for(self.bacdevice.read_property(
+                address=Address(addr),
+                objid=ObjectIdentifier('device:' + str(device_id)),
+                prop='object-name'
+            ), self.CIRCUIT_PROBE_TIMEOUT_SEC if timeout_sec is None else timeout_sec)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except ErrorRejectAbortNack as err:
+            # エラーや拒否の応答はデバイスが動いている証拠
+            return not (isinstance(err, AbortPDU) and err.apduAbortRejectReason == AbortReason.noResponse)
+        except Exception:
+            return False
+
+    async def _check_circuit(self, addr):
+        """回路が開いていれば送らずに失敗させるための例外を返す
+
+        回路を開いてからCIRCUIT_OPEN_SEC経過していれば、Deviceオブジェクトのobject-nameを読み取って
+        デバイスが復帰したかを確かめ、無応答以外の応答（エラーや拒否を含む）が返れば回路を閉じる。
+        確かめている間に届いた要求はその結果を待つ。
+        """
+        state = self.get_circuit_state(addr)
+        if state == 'closed':
+            return None
+        if state == 'open':
+            return DeviceUnavailableError(addr)
+
+        circuit = self._circuits[addr]
+        if circuit.probe is None:
+            circuit.probe = asyncio.create_task(self._probe_device(addr))
+        probe = circuit.probe
+        if await asyncio.shield(probe):
+            return None
+        return DeviceUnavailableError(addr)
+
+    async def _probe_device(self, addr):
+        circuit = self._circuits[addr]
+        try:
+            alive = await self.probe_device(addr)
+        finally:
+            circuit.probe = None
+
+        if alive:
+            circuit.failures = 0
+            circuit.opened_at = None
+            return True
+        circuit.opened_at = asyncio.get_running_loop().time()
+        return False
+
+    def _record_response(self, addr, err):
+        # 応答がなかった場合だけを失敗とする（エラーや拒否はデバイスが動いている証拠）
+        no_response = isinstance(err, AbortPDU) and err.apduAbortRejectReason == AbortReason.noResponse
+        circuit = self._circuits.get(addr)
+        if not no_response:
+            if circuit is not None:
+                circuit.failures = 0
+                circuit.opened_at = None
+            return
+
+        if circuit is None:
+            circuit = self._circuits[addr] = self._Circuit()
+        circuit.failures += 1
+        if self.CIRCUIT_FAILURE_THRESHOLD <= circuit.failures:
+            circuit.opened_at = asyncio.get_running_loop().time()
+
 # endregion
 
 # region datetime COV関連
@@ -121,62 +845,147 @@ class PresentValueReadWriter():
     async def subscribe_date_time_cov(self):
         """シミュレーション日時の加速度に関するCOVを登録する
 
-        Args:
-            monitored_ip (str): DateTimeControllerオブジェクトのIPアドレス(xxx.xxx.xxx.xxxの形式)
+        COVの購読は監視タスクとして保持され、通信が切れた場合には待ち時間を延ばしながら再接続する。
+        戻る前に一度日時を同期する。
 
         Returns:
-            None
-        """        
-        asyncio.create_task(self.cov_loop())
+            bool: 日時の同期に成功したか否か
+        """
+        if self._dtcov_task is None or self._dtcov_task.done():
+            self._dtcov_stop = asyncio.Event()
+            self._dtcov_task = asyncio.create_task(self.cov_loop(self._dtcov_stop))
+        return await self._update_date_time()
+
+    async def unsubscribe_date_time_cov(self):
+        """シミュレーション日時の加速度に関するCOVの購読を止める
+        """
+        if self._dtcov_task is not None:
+            # キャンセルは通知の受け取りと重なると失われることがあるため、停止のイベントで止める
+            self._dtcov_stop.set()
+            await asyncio.wait([self._dtcov_task], timeout=self.DATETIME_COV_STOP_TIMEOUT_SEC)
+            if not self._dtcov_task.done():
+                self._dtcov_task.cancel()
+            try:
+                await self._dtcov_task
+            except asyncio.CancelledError:
+                pass
+            self._dtcov_task = None
+            self._dtcov_stop = None
+        self.dtcov_scribed = False
+
+    def add_acceleration_changed_handler(self, handler):
+        """加速度が変化した際に呼ばれる関数を登録する
+
+        Args:
+            handler (callable): 変化前の加速度と変化後の加速度を引数にとる関数（コルーチン関数も可）
+        """
+        self._acc_changed_handlers.append(handler)
 
-    async def cov_loop(self):
-        # 既に登録されている場合には日時だけ更新して二重登録を回避
-        if self.dtcov_scribed:
-            return self._update_date_time()
+    def remove_acceleration_changed_handler(self, handler):
+        """加速度が変化した際に呼ばれる関数の登録を解除する
+
+        Args:
+            handler (callable): 登録済みの関数
+        """
+        self._acc_changed_handlers.remove(handler)
+
+    async def cov_loop(self, stop_event=None):
+        """DateTimeのCOVを購読し続ける（stop_eventがセットされるまで戻らない）
+
+        登録し直しは寿命が切れる前にbacpypes3が購読を解除せずに行う。例外（登録し直しの失敗を含むエラーや無応答）が発生した場合は同期済みの状態を取り消し、
+        待ち時間を倍にしながら（上限あり）再登録を試みる。
+
+        Args:
+            stop_event (asyncio.Event): セットされたら購読を解除して戻る
+        """
+        retry_wait = self.DATETIME_COV_RETRY_MIN_SEC
+        stop_task = asyncio.create_task((asyncio.Event() if stop_event is None else stop_event).wait())
         try:
-            async with self.bacdevice.change_of_value(
-                address=Address(self.dtc_id),
-                subscriber_process_identifier=self.id,
-                monitored_object_identifier=ObjectIdentifier('analog-output:2'), # 加速度
-                lifetime=60*60*24*365, #1年間
-                issue_confirmed_notifications=True
-            ) as scm: #SubscriptionContextManager
-                while True:
-                    property_identifier, property_value = await scm.get_value()
-                    if(f"{property_identifier}"=='present-value'):
+            while not stop_task.done():
+                try:
+                    async with self.bacdevice.change_of_value(
+                        address=Address(self.dtc_id),
+                        subscriber_process_identifier=self.id,
+                        monitored_object_identifier=ObjectIdentifier('analog-output:2'), # 加速度
+                        lifetime=self.DATETIME_COV_LIFETIME_SEC,
+                        issue_confirmed_notifications=True
+                    ) as scm: #SubscriptionContextManager
                         self.dtcov_scribed = True
-                        await self._update_date_time()
-        except Exception as err:
-            return False
+                        retry_wait = self.DATETIME_COV_RETRY_MIN_SEC
+                        while not stop_task.done():
+                            received, notification = await self._wait_cov_value(scm, stop_task, self.COV_REFRESH_CHECK_SEC)
+                            if not received:
+                                continue # 登録し直しの失敗は_wait_cov_valueが送出する
+                            property_identifier, _ = notification
+                            if(f"{property_identifier}"=='present-value'):
+                                await self._update_date_time()
+                except asyncio.CancelledError:
+                    raise
+                except (Exception, ErrorRejectAbortNack) as err:
+                    self.dtcov_scribed = False
+                    self.dt_synchronized = False
+                    logger.warning('DateTime COV subscription failed (%s), retrying in %s sec', err, retry_wait)
+                    await asyncio.wait([stop_task], timeout=retry_wait)
+                    retry_wait = min(2 * retry_wait, self.DATETIME_COV_RETRY_MAX_SEC)
+        finally:
+            stop_task.cancel()
+            self.dtcov_scribed = False
 
     async def _update_date_time(self):
         """日時をエミュレータに合わせる
-        Args:
+
+        加速度、加速開始の現実の日時、加速開始のシミュレーション日時を1回のReadPropertyMultipleで読み取る。
+        いずれかの読み取りに失敗した場合は値を更新しない。
+
         Returns:
             bool: 成功したか否か
-        """ 
-        val = await self.read_present_value(self.dtc_id, 'analogOutput:2')
-        self.acc_rate = val[1] if val[0] else 0
-        val = await self.read_present_value(self.dtc_id, 'datetimeValue:3')
-        if val[0]:
-            self.base_real_datetime = val[1]
-        else:
-            return False
-        val = await self.read_present_value(self.dtc_id, 'datetimeValue:4')
-        if val[0]:
-            self.base_sim_datetime = val[1]
-        else:
+        """
+        vals = await self.read_present_values(self.dtc_id, ['analogOutput:2', 'datetimeValue:3', 'datetimeValue:4'])
+        if not all(val[0] for val in vals):
+            self.dt_synchronized = False
             return False
+
+        old_rate = self.acc_rate
+        self.acc_rate = vals[0][1]
+        self.base_real_datetime = vals[1][1]
+        self.base_sim_datetime = vals[2][1]
+        self.dt_synchronized = True
+
+        if old_rate != self.acc_rate:
+            for handler in list(self._acc_changed_handlers):
+                rslt = handler(old_rate, self.acc_rate)
+                if asyncio.iscoroutine(rslt):
+                    await rslt
         return True
 
     def current_date_time(self):
         """現在の日時を取得する
 
+        エミュレータとの同期が取れていない場合（dt_synchronizedがFalse）は最後に同期した値から外挿する。
+
         Returns:
             datetime: 現在の日時
         """        
         return (datetime.datetime.today() - self.base_real_datetime) * self.acc_rate + self.base_sim_datetime
 
+    async def sleep_until(self, sim_datetime, max_interval_sec=1.0):
+        """シミュレーション日時が指定の日時になるまで待つ
+
+        加速度が途中で変わっても遅れないように、最長でもmax_interval_secごとに残り時間を計算し直す。
+
+        Args:
+            sim_datetime (datetime): 待つシミュレーション日時
+            max_interval_sec (float): 残り時間を計算し直す最長の間隔[sec]
+        """
+        while True:
+            remaining = (sim_datetime - self.current_date_time()).total_seconds()
+            if remaining <= 0:
+                return
+            if 0 < self.acc_rate:
+                await asyncio.sleep(min(max_interval_sec, remaining / self.acc_rate))
+            else:
+                await asyncio.sleep(max_interval_sec)
+
 # endregion
 
 # region サンプル
@@ -1,6 +1,7 @@
-import datetime, asyncio
+import asyncio
 from VRFSystemCommunicator import VRFSystemCommunicator as vrc
 from VentilationSystemCommunicator import VentilationSystemCommunicator as vsc
+from Utilities import is_hvac_time
 
 async def main():
     vrCom = vrc(12)
@@ -10,9 +11,6 @@ async def main():
     print('Subscribe COV...')
     await vrCom.subscribe_date_time_cov()
     
-    # Number of indoor units in each VRF system
-    i_unit_num = [5,4,5,4]
-
     last_dt = vrCom.current_date_time()
     while True:
         # Output current date and time
@@ -27,58 +25,38 @@ async def main():
 
         # When the HVAC changed to operating hours
         if(not(is_hvac_time(last_dt)) and is_hvac_time(dt)):
-            for i in range(len(i_unit_num)):
-                for j in range(i_unit_num[i]):
-                    v_name = 'VRF' + str(i + 1) + '-' + str(j+1)
-
-                    print('Turning on ' + v_name + '...',end='')
-                    rslt = await vrCom.turn_on(i+1,j+1)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Turning on all VRFs...',end='')
+            print_result(await vrCom.turn_on_group('all'))
 
-                    print('Turning on ' + v_name + ' (Ventilation)...',end='')
-                    rslt = await vsCom.start_ventilation(i+1,j+1)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Turning on all VRFs (Ventilation)...',end='')
+            print_result(await vsCom.start_ventilation_group('all'))
 
-                    print('Changing mode of ' + v_name + ' to ' + str(mode) + '...',end='')
-                    rslt = await vrCom.change_mode(i+1,j+1,mode)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Changing mode of all VRFs to ' + str(mode) + '...',end='')
+            print_result(await vrCom.change_mode_group('all',mode))
 
-                    print('Changing set point temperature of ' + v_name + ' to ' + str(sp) + 'C...',end='')
-                    rslt = await vrCom.change_setpoint_temperature(i+1,j+1,sp)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Changing set point temperature of all VRFs to ' + str(sp) + 'C...',end='')
+            print_result(await vrCom.change_setpoint_temperature_group('all',sp))
 
-                    print('Changing fanspeed of ' + v_name + ' to Middle...',end='')
-                    rslt = await vrCom.change_fan_speed(i+1,j+1,vrc.FanSpeed.Middle)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Changing fanspeed of all VRFs to Middle...',end='')
+            print_result(await vrCom.change_fan_speed_group('all',vrc.FanSpeed.Middle))
 
-                    print('Changing air flow direction of ' + v_name + ' to ' + str(dir) + '...',end='')
-                    rslt = await vrCom.change_direction(i+1,j+1,dir)
-                    print('success' if rslt[0] else 'failed: ' + rslt[1])
+            print('Changing air flow direction of all VRFs to ' + str(dir) + '...',end='')
+            print_result(await vrCom.change_direction_group('all',dir))
 
         # When the HVAC changed to stop hours
         if(is_hvac_time(last_dt) and not(is_hvac_time(dt))):
-            for i in range(len(i_unit_num)):
-                for j in range(i_unit_num[i]):
-                    v_name = 'VRF' + str(i + 1) + '-' + str(j+1)
-
-                    print('Turning off ' + v_name + '...',end='')
-                    rslt = await vrCom.turn_off(i+1,j+1)
-                    print('success' if rslt else 'failed')
+            print('Turning off all VRFs...',end='')
+            print_result(await vrCom.turn_off_group('all'))
 
-                    print('Turning off ' + v_name + ' (Ventilation)...',end='')
-                    rslt = await vsCom.stop_ventilation(i+1,j+1)
-                    print('success' if rslt else 'failed')
+            print('Turning off all VRFs (Ventilation)...',end='')
+            print_result(await vsCom.stop_ventilation_group('all'))
 
         last_dt = dt # Save last date and time
         await asyncio.sleep(0.5)
 
-def is_hvac_time(dtime):
-    start_time = datetime.time(7, 0)
-    end_time = datetime.time(19, 0)   
-    now = dtime.time()
-    is_business_hour = start_time <= now <= end_time
-    is_weekday = (dtime.weekday() != 5 and dtime.weekday() != 6)
-    return is_weekday and is_business_hour
+def print_result(rslt):
+    failed = ['VRF' + str(o) + '-' + str(i) for (o, i), r in rslt.items() if not r[0]]
+    print('success' if len(failed) == 0 else 'failed: ' + ', '.join(failed))
 
 if __name__ == "__main__":
     asyncio.run(main())
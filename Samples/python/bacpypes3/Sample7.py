@@ -1,5 +1,6 @@
-import datetime, asyncio
+import asyncio
 from VentilationSystemCommunicator import VentilationSystemCommunicator as vsc
+from Utilities import is_hvac_time
 
 async def main():
     vsCom = vsc(26)
@@ -8,9 +9,6 @@ async def main():
     print('Subscribe COV...')
     await vsCom.subscribe_date_time_cov()
 
-    # Number of indoor units in each VRF system
-    i_unit_num = [5,4,5,4]
-
     while True:
         # Output current date and time
         dt = vsCom.current_date_time()
@@ -32,10 +30,9 @@ async def main():
             print('North tenant: ' + str(north_fs) + ' (' + str(north_co2) + ')')
 
             # Change fan speed
-            for i in range(len(i_unit_num)):
-                fs = south_fs if i == 0 or i==1 else north_fs
-                for j in range(i_unit_num[i]):
-                    val = await vsCom.change_fan_speed(i+1,j+1,fs)
+            await asyncio.gather(
+                vsCom.change_fan_speed_group('south',south_fs),
+                vsCom.change_fan_speed_group('north',north_fs))
         await asyncio.sleep(1.0)
 
 def get_fan_speed(co2_level):
@@ -46,13 +43,5 @@ def get_fan_speed(co2_level):
     else:
         return vsc.FanSpeed.High
 
-def is_hvac_time(dtime):
-    start_time = datetime.time(7, 0)
-    end_time = datetime.time(19, 0)   
-    now = dtime.time()
-    is_business_hour = start_time <= now <= end_time
-    is_weekday = (dtime.weekday() != 5 and dtime.weekday() != 6)
-    return is_weekday and is_business_hour
-
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,485 @@
+import asyncio
+import datetime
+import time
+
+from bacpypes3.pdu import IPv4Address
+from bacpypes3.primitivedata import ObjectIdentifier
+from bacpypes3.ipv4.app import NormalApplication
+from bacpypes3.local.device import DeviceObject
+from bacpypes3.apdu import ErrorRejectAbortNack, ErrorPDU
+from bacpypes3.object import DateTimeValueObject
+from bacpypes3.local.object import Object
+from LocalEmulator import LocalEmulator
+from LoadGenerator import LoadGenerator
+from CachingGateway import CachingGateway, GatewayClient, GatewayError
+from AcquisitionPlanner import AcquisitionPlanner
+from AccelerationGovernor import AccelerationGovernor
+from ChangeEventBus import ChangeEventBus
+from DeadbandFilter import DeadbandFilter
+from SoakTest import SoakTest
+from DeviceHealthMonitor import DeviceHealthMonitor
+from PresentValueReadWriter import PresentValueReadWriter
+
+class SelfCheck():
+    """LocalEmulatorを相手に、過去に見つかった不具合が再発していないかを確かめるクラス
+
+    確かめる項目はcheck_で始まるメソッドで、成功したらTrueを返す。項目ごとに上限時間を設け、
+    時間内に終わらない場合は失敗とする（止まったまま戻らない不具合を検出するため）。
+    """
+
+# region 定数宣言
+
+    # 1項目あたりの上限時間[sec]
+    CHECK_TIMEOUT_SEC = 30.0
+
+    # 確かめるのに使うDevice ID（エミュレータやサンプルと重ならないもの）
+    FIRST_DEVICE_ID = 70
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self):
+        """インスタンスを初期化する
+        """
+        # 項目ごとの（名前, 成功したか否か, 失敗の理由）
+        self.results = []
+        self._next_device_id = self.FIRST_DEVICE_ID
+
+# endregion
+
+# region 実行
+
+    async def run(self):
+        """全ての項目を順に確かめる
+
+        Returns:
+            bool: 全ての項目が成功したか否か
+        """
+        for name in sorted(dir(self)):
+            if name.startswith('check_'):
+                await self.run_check(name)
+        return all(ok for _, ok, _ in self.results)
+
+    async def run_check(self, name):
+        """1項目を確かめる
+
+        Args:
+            name (str): check_で始まるメソッドの名前
+
+        Returns:
+            bool: 成功したか否か
+        """
+        try:
+            ok = await asyncio.wait_for(getattr(self, name)(), self.CHECK_TIMEOUT_SEC)
+            reason = '' if ok else 'check failed'
+        except asyncio.TimeoutError:
+            ok, reason = False, 'did not finish in ' + str(self.CHECK_TIMEOUT_SEC) + ' sec'
+        except (Exception, ErrorRejectAbortNack) as err:
+            ok, reason = False, repr(err)
+        self.results.append((name, ok, reason))
+        return ok
+
+    def print_report(self):
+        """結果を表示する
+        """
+        for name, ok, reason in self.results:
+            print(('PASS  ' if ok else 'FAIL  ') + name + ('' if ok else ' (' + reason + ')'))
+
+# endregion
+
+# region 確かめる項目
+
+    async def check_date_time_cov_stops_during_notifications(self):
+        """加速度の通知が続いている最中でも、DateTimeのCOVの購読を止められること
+        """
+        emulator = LocalEmulator()
+        await emulator.start()
+        comm = self._create_comm()
+        try:
+            await comm.subscribe_date_time_cov()
+
+            async def flip():
+                rate = 600
+                while True:
+                    rate = 1200 if rate == 600 else 600
+                    emulator.set_present_value(LocalEmulator.DATETIMECONTROLLER_DEVICE_ID, 'analogOutput:2', rate)
+                    await asyncio.sleep(0.005)
+
+            flipper = asyncio.create_task(flip())
+            await asyncio.sleep(0.5)
+            try:
+                await asyncio.wait_for(comm.unsubscribe_date_time_cov(), 5.0)
+            finally:
+                flipper.cancel()
+            return comm._dtcov_task is None and len(comm.bacdevice._cov_contexts) == 0
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_date_time_cov_survives_error(self):
+        """DateTimeのCOVの購読がエラーで拒否されても、監視タスクが再登録を続けること
+        """
+        # 加速度のオブジェクトを持たないDateTimeController
+        dtc = self._create_device(LocalEmulator.DATETIMECONTROLLER_DEVICE_ID)
+        comm = self._create_comm()
+        try:
+            await comm.subscribe_date_time_cov()
+            await asyncio.sleep(2 * PresentValueReadWriter.DATETIME_COV_RETRY_MIN_SEC)
+            alive = not comm._dtcov_task.done()
+            await comm.unsubscribe_date_time_cov()
+            return alive
+        finally:
+            comm.bacdevice.close()
+            dtc.close()
+
+    async def check_step_detection_falls_back_to_polling(self):
+        """現在日時のCOVを購読できない場合に、読み取りでステップを検出すること
+        """
+        # COVに対応しない現在日時のオブジェクトを持つDateTimeController
+        class _DateTimeValueObject(Object, DateTimeValueObject):
+            pass
+        dtc = self._create_device(LocalEmulator.DATETIMECONTROLLER_DEVICE_ID)
+        emulator = LocalEmulator()
+        current = _DateTimeValueObject(objectIdentifier='datetime-value:1', objectName='current',
+                                       presentValue=emulator._to_date_time(emulator.current_datetime))
+        dtc.add_object(current)
+        comm = self._create_comm()
+        comm.default_acc_rate = 6000
+        try:
+            step = asyncio.create_task(comm.next_step())
+            await asyncio.sleep(1.0)
+            current.presentValue = emulator._to_date_time(emulator.current_datetime + datetime.timedelta(minutes=1))
+            await asyncio.wait_for(step, 5.0)
+            return not comm._step_task.done()
+        finally:
+            await comm.stop_step_detection()
+            comm.bacdevice.close()
+            dtc.close()
+
+    async def check_health_monitor_probes_with_one_wait(self):
+        """DeviceHealthMonitorが停止したデバイスを1回分の待ち時間で確かめ、応答時間に余計な待ち時間を含めないこと
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        timeout = 0.5
+        try:
+            monitor = DeviceHealthMonitor(comm, timeout_sec=timeout, devices=[('VRFController', 2), ('DummyDevice', 9)])
+            start = time.perf_counter()
+            await monitor.probe_all()
+            elapsed = time.perf_counter() - start
+            return monitor.is_up('VRFController') and not monitor.is_up('DummyDevice') \
+                and elapsed < 1.5 * timeout and monitor.status['VRFController']['rtt_sec'] < timeout
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_gateway_rejects_bad_writes(self):
+        """CachingGatewayへ型の合わない値を書き込んでも失敗が返り、以降の書き込みを続けられること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0), ('datetimeValue:1', emulator.current_datetime)])
+        await emulator.start()
+        comm = self._create_comm()
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        gateway = CachingGateway(comm, [(addr, 'analogValue:1')], sweep_interval_sec=0.2, port=0)
+        try:
+            await gateway.start()
+            # 変換できない値と、変換せずに送って書き込みの途中で失敗する値
+            rejected, _ = await asyncio.wait_for(gateway.write(addr, 'analogValue:1', 'abc'), 5.0)
+            failed, _ = await asyncio.wait_for(gateway.write(addr, 'datetimeValue:1', 'abc'), 5.0)
+            written, _ = await asyncio.wait_for(gateway.write(addr, 'analogValue:1', 3.0), 5.0)
+            return not rejected and not failed and written and gateway.values[(addr, 'analogValue:1')][0] == 3.0
+        finally:
+            await gateway.stop()
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_gateway_replies_to_bad_requests(self):
+        """CachingGatewayへの解釈できない要求にも応答が返り、クライアントが待ち続けないこと
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        gateway = CachingGateway(comm, [(addr, 'analogValue:1')], sweep_interval_sec=0.2, port=0)
+        client = None
+        try:
+            await gateway.start()
+            client = GatewayClient(port=gateway._server.sockets[0].getsockname()[1])
+            await client.connect()
+            try:
+                await asyncio.wait_for(client.read([(addr, 'analogInput:42')]), 5.0)
+                unknown_rejected = False
+            except GatewayError:
+                unknown_rejected = True
+            # 値のない書き込み
+            reply = await asyncio.wait_for(client._request({'op': 'write', 'addr': addr, 'obj_id': 'analogValue:1'}), 5.0)
+            return unknown_rejected and reply['op'] == 'written' and not reply['success']
+        finally:
+            if client is not None:
+                await client.close()
+            await gateway.stop()
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_load_generator_counts_rejected_cov(self):
+        """存在しないオブジェクトのCOVを購読しようとしても、LoadGeneratorが止まらずにエラーとして数えること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        try:
+            generator = LoadGenerator('127.0.0.1:' + str(0xBAC0 + 2), ['analogValue:1'], cov_obj_ids=['analogInput:9999'],
+                                      mix={'cov': 1.0}, rate_per_device=5.0, first_device_id=self._next_device_id)
+            self._next_device_id += 1
+            result = await asyncio.wait_for(generator.run_level(1, 2.0), 10.0)
+            return 0 < result['operations']['cov']['errors']
+        finally:
+            await emulator.stop()
+
+    async def check_circuit_closes_when_device_recovers(self):
+        """回路を開いた通信先が応答するようになれば、復帰を確かめて回路を閉じること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+
+        # 実際のエミュレータはI-Amを47808へブロードキャストするため、Who-Isへの応答は届かない
+        async def ignore_who_is(apdu):
+            pass
+        emulator._devices[2][2].do_WhoIsRequest = ignore_who_is
+
+        comm = self._create_comm()
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        try:
+            # 連続して無応答だった後、CIRCUIT_OPEN_SEC経過した状態にする
+            circuit = comm._circuits[addr] = comm._Circuit()
+            circuit.failures = PresentValueReadWriter.CIRCUIT_FAILURE_THRESHOLD
+            circuit.opened_at = asyncio.get_running_loop().time() - PresentValueReadWriter.CIRCUIT_OPEN_SEC
+            success, _ = await comm.read_present_value(addr, 'analogValue:1')
+            return success and comm.get_circuit_state(addr) == 'closed'
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_gateway_survives_rejected_cov(self):
+        """存在しないオブジェクトのCOVを購読しようとしても、CachingGatewayが読み取りで取得を続け、止められること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        try:
+            gateway = CachingGateway(comm, [(addr, 'analogValue:1'), (addr, 'analogInput:9999')],
+                                     cov_points=[(addr, 'analogInput:9999')], sweep_interval_sec=0.2, port=0)
+            await gateway.start()
+            await asyncio.sleep(1.0)
+            alive = all(not task.done() for task in gateway._tasks)
+            await gateway.stop()
+            return alive and (addr, 'analogInput:9999') not in gateway._cov_active and 2 <= gateway.stats['sweeps']
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_watch_polls_after_cov_is_rejected(self):
+        """watchでCOVの登録し直しが拒否された点を、読み取りに切り替えて返し続けること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        comm.POINT_COV_LIFETIME_SEC = 2
+        comm.COV_REFRESH_CHECK_SEC = 0.2
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        updates = comm.watch([(addr, 'analogValue:1')], poll_interval_sec=0.2)
+        try:
+            await asyncio.wait_for(updates.__anext__(), 5.0)
+            await asyncio.sleep(0.5)
+
+            # 購読できた後、登録し直しを（存在しないオブジェクトへの要求として）拒否させてから値を変える
+            app = emulator._devices[2][2]
+            subscribe = app.do_SubscribeCOVRequest
+            async def reject(apdu):
+                apdu.monitoredObjectIdentifier = ObjectIdentifier('analogInput:9999')
+                await subscribe(apdu)
+            app.do_SubscribeCOVRequest = reject
+            await asyncio.sleep(comm.POINT_COV_LIFETIME_SEC)
+            emulator.set_present_value(2, 'analogValue:1', 1.0)
+            _, _, value = await asyncio.wait_for(updates.__anext__(), 5.0)
+            return value == 1.0
+        finally:
+            await updates.aclose()
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_cov_renews_without_unsubscribing(self):
+        """COVの登録し直しで購読を解除せず、登録し直した後も通知を受け取り続けること
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        comm.POINT_COV_LIFETIME_SEC = 2
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+
+        # 購読の解除はlifetimeを持たないSubscribeCOVとして届く
+        requests = []
+        app = emulator._devices[2][2]
+        subscribe = app.do_SubscribeCOVRequest
+        async def count(apdu):
+            requests.append(apdu.lifetime is not None)
+            await subscribe(apdu)
+        app.do_SubscribeCOVRequest = count
+
+        values = []
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(comm.subscribe_present_value_cov(addr, 'analogValue:1', lambda a, o, v: values.append(v), stop_event))
+        try:
+            await asyncio.sleep(2.5)
+            emulator.set_present_value(2, 'analogValue:1', 1.0)
+            await asyncio.sleep(0.5)
+            renewed = 2 <= requests.count(True) and requests.count(False) == 0
+            stop_event.set()
+            await asyncio.wait_for(task, 5.0)
+            return renewed and 1.0 in values and requests.count(False) == 1
+        finally:
+            task.cancel()
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_governor_keeps_rate_when_write_fails(self):
+        """AccelerationGovernorで加速度を書き込めなかった場合は、元の加速度を記録して返すこと
+        """
+        comm = self._create_comm()
+        try:
+            # DateTimeControllerが応答しなくなって回路が開いた状態にする
+            circuit = comm._circuits[comm.dtc_id] = comm._Circuit()
+            circuit.failures = PresentValueReadWriter.CIRCUIT_FAILURE_THRESHOLD
+            circuit.opened_at = asyncio.get_running_loop().time()
+            comm.acc_rate = 600
+            governor = AccelerationGovernor(comm, adjust_interval_steps=1)
+            rate = await governor.record(0.0)
+            return rate == 600 and governor.history[-1][0] == 600
+        finally:
+            comm.bacdevice.close()
+
+    async def check_planner_polls_after_cov_is_rejected(self):
+        """AcquisitionPlannerでCOVを購読できなかった点を、読み取りへ戻すこと
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        point = ('127.0.0.1:' + str(0xBAC0 + 2), 'analogInput:9999')
+        try:
+            planner = AcquisitionPlanner(comm, [point], poll_interval_sec=0.2)
+            planner.start()
+            planner._switch(point, 'cov')
+            await asyncio.sleep(1.0)
+            await planner.stop()
+            state = planner.plan[point]
+            return state['mode'] == 'poll' and not state['cov_supported'] and point not in planner._cov_tasks
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_planner_retries_cov_after_outage(self):
+        """AcquisitionPlannerで一時的に購読できなかった点は、読み取りへ戻してもCOVの候補に残すこと
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        point = ('127.0.0.1:' + str(0xBAC0 + 2), 'analogValue:1')
+        try:
+            # 通信先が応答しなくなって回路が開いた状態にする
+            circuit = comm._circuits[point[0]] = comm._Circuit()
+            circuit.failures = PresentValueReadWriter.CIRCUIT_FAILURE_THRESHOLD
+            circuit.opened_at = asyncio.get_running_loop().time()
+            planner = AcquisitionPlanner(comm, [point], poll_interval_sec=0.2)
+            planner._switch(point, 'cov')
+            await asyncio.sleep(0.5)
+            state = planner.plan[point]
+            return state['mode'] == 'poll' and state['cov_supported'] and point not in planner._cov_tasks
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+    async def check_soak_test_stops_on_bacnet_error(self):
+        """SoakTestのworkloadがBACnetのエラーで失敗したら、試験がそのエラーで終わること
+        """
+        async def workload(step):
+            raise ErrorPDU()
+
+        soak = SoakTest(LocalEmulator(), [], workload, trace_allocations=False)
+        task = asyncio.create_task(soak.run())
+        done, _ = await asyncio.wait([task], timeout=5.0)
+        if len(done) == 0:
+            # 終わらない場合は止めて失敗とする（止める際に出る例外は問わない）
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return False
+        return isinstance(task.exception(), ErrorPDU)
+
+    async def check_stalled_subscriber_does_not_block_reads(self):
+        """ChangeEventBusの購読者が取り出さなくなっても、読み取りが止まらないこと
+        """
+        emulator = LocalEmulator()
+        emulator.add_device(2, 'VRFController', [('analogValue:1', 0.0)])
+        await emulator.start()
+        comm = self._create_comm()
+        addr = '127.0.0.1:' + str(0xBAC0 + 2)
+        deadband = DeadbandFilter(ChangeEventBus(max_queue=1, publish_timeout_sec=0.2))
+        deadband.attach(comm)
+        try:
+            # 最初のイベントだけ取り出して抜けた購読と、closeした購読
+            async with deadband.bus.subscribe() as stalled:
+                closed = deadband.bus.subscribe()
+                reads = []
+                for value in range(5):
+                    emulator.set_present_value(2, 'analogValue:1', float(value))
+                    reads.append(await asyncio.wait_for(comm.read_present_value(addr, 'analogValue:1'), 5.0))
+                    if value == 0:
+                        await stalled.get()
+                    if value == 2:
+                        closed.close()
+            return all(success for success, _ in reads) and 0 < deadband.bus.stats['dropped'] \
+                and len(deadband.bus._subscriptions) == 0
+        finally:
+            comm.bacdevice.close()
+            await emulator.stop()
+
+# endregion
+
+# region 補助メソッド
+
+    def _create_device(self, device_id):
+        # オブジェクトを持たないデバイス（必要なオブジェクトは呼び出し側で追加する）
+        return NormalApplication(
+            DeviceObject(objectName='selfcheck device', objectIdentifier=('device', device_id),
+                         maxApduLengthAccepted=1024, segmentationSupported='segmentedBoth', vendorIdentifier=15),
+            IPv4Address('127.0.0.1', 0xBAC0 + device_id))
+
+    def _create_comm(self):
+        comm = PresentValueReadWriter(self._next_device_id, 'selfcheck')
+        self._next_device_id += 1
+        return comm
+
+# endregion
+
+# region サンプル
+
+async def main():
+    check = SelfCheck()
+    await check.run()
+    check.print_report()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -0,0 +1,362 @@
+import asyncio
+import datetime
+import math
+import multiprocessing
+import struct
+import time
+
+from multiprocessing import resource_tracker, shared_memory
+from PortAllocator import PortAllocator
+from PresentValueReadWriter import PresentValueReadWriter
+
+class SharedPointTable():
+    """プロセス間で共有する点の表
+
+    multiprocessing.shared_memoryの上に、点のハンドル（0から始まる番号）ごとに固定長の枠を並べる。
+    枠は（版数, 値, 更新時刻, 状態）で、書き込む側は版数を奇数にしてから値を書き、偶数に戻す。
+    読み取る側は版数が偶数で、読む前後で変わっていない場合だけ値を採用する（seqlock）ため、ロックは使わない。
+    1つの枠に書き込むのは1つのプロセスだけとする。
+    """
+
+# region 定数宣言
+
+    # 枠の形式（版数, 値, 更新時刻[UNIX時間], 状態）
+    SLOT_FORMAT = '<QddQ'
+    SLOT_SIZE = struct.calcsize(SLOT_FORMAT)
+
+    # 状態
+    STATUS_EMPTY = 0
+    STATUS_VALID = 1
+    STATUS_FAILED = 2
+
+    # 書き込み中の枠を読み直す回数の上限
+    MAX_READ_RETRIES = 1000
+
+# endregion
+
+    # このプロセスで作成した共有メモリの名前
+    _created_names = set()
+
+# region コンストラクタ
+
+    def __init__(self, size, name=None, create=True):
+        """インスタンスを初期化する
+
+        Args:
+            size (int): 点の数
+            name (str): 共有メモリの名前（Noneの場合は自動で決める）
+            create (bool): 共有メモリを作成するか否か（Falseの場合は既存の共有メモリにつなぐ）
+        """
+        self.size = size
+        if create:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=max(1, size * self.SLOT_SIZE))
+            self._shm.buf[:size * self.SLOT_SIZE] = bytes(size * self.SLOT_SIZE)
+            self._created_names.add(self._shm._name)
+        else:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Python 3.12以前は、つないだだけのプロセスが終了時に共有メモリを破棄しないよう追跡を外す
+                # （作成したプロセスと、ShardedClientが起動したワーカーは追跡を共有するため外さない）
+                self._shm = shared_memory.SharedMemory(name=name)
+                if multiprocessing.parent_process() is None and self._shm._name not in self._created_names:
+                    resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.name = self._shm.name
+        self._owner = create
+
+    @classmethod
+    def attach(cls, name, size):
+        """既存の共有メモリにつなぐ
+
+        Args:
+            name (str): 共有メモリの名前
+            size (int): 点の数
+
+        Returns:
+            SharedPointTable: 共有メモリにつないだインスタンス
+        """
+        return cls(size, name, create=False)
+
+    def close(self):
+        """共有メモリから離れる（作成したインスタンスの場合は共有メモリを破棄する）
+        """
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+            self._created_names.discard(self._shm._name)
+
+# endregion
+
+# region 読み書き
+
+    def write(self, handle, value, success=True):
+        """値を書き込む
+
+        Args:
+            handle (int): 点のハンドル
+            value (float): 値（数値に変換できない場合はNaN）
+            success (bool): 読み取りに成功したか否か（Falseの場合は前回の値を残して状態だけ変える。
+            まだ値がない場合は書き込まれていないままにする）
+        """
+        offset = handle * self.SLOT_SIZE
+        buf = self._shm.buf
+        seq, old_value, updated, status = struct.unpack_from(self.SLOT_FORMAT, buf, offset)
+        if not success and status == self.STATUS_EMPTY:
+            return
+
+        # 版数を奇数にして書き込み中であることを示す
+        struct.pack_into('<Q', buf, offset, seq + 1)
+        if success:
+            struct.pack_into('<ddQ', buf, offset + 8, value, time.time(), self.STATUS_VALID)
+        else:
+            struct.pack_into('<ddQ', buf, offset + 8, old_value, updated, self.STATUS_FAILED)
+        struct.pack_into('<Q', buf, offset, seq + 2)
+
+    def read(self, handle):
+        """値を読み取る
+
+        Args:
+            handle (int): 点のハンドル
+
+        Returns:
+            list(bool,float,float): 最後の読み取りが成功したか否か, 値, 更新時刻[UNIX時間]
+            （まだ書き込まれていない場合は（False, None, None））
+        """
+        offset = handle * self.SLOT_SIZE
+        buf = self._shm.buf
+        for _ in range(self.MAX_READ_RETRIES):
+            seq1, value, updated, status = struct.unpack_from(self.SLOT_FORMAT, buf, offset)
+            if seq1 % 2 == 1:
+                time.sleep(0)
+                continue
+            seq2, = struct.unpack_from('<Q', buf, offset)
+            if seq1 != seq2:
+                continue
+            if status == self.STATUS_EMPTY:
+                return False, None, None
+            return status == self.STATUS_VALID, value, updated
+        raise RuntimeError('point ' + str(handle) + ' is being written for too long')
+
+    def read_all(self):
+        """全ての点の値を読み取る
+
+        Returns:
+            list(list(bool,float,float)): ハンドルの順の（成功の真偽, 値, 更新時刻）のリスト
+        """
+        return [self.read(handle) for handle in range(self.size)]
+
+    def get_version(self, handle):
+        """点の版数を取得する（書き込まれるたびに2ずつ増える）
+
+        Args:
+            handle (int): 点のハンドル
+
+        Returns:
+            int: 版数
+        """
+        return struct.unpack_from('<Q', self._shm.buf, handle * self.SLOT_SIZE)[0]
+
+# endregion
+
+class ShardedClient():
+    """点の読み取りを複数のワーカープロセスに分担させるクラス
+
+    点（通信先のアドレス, オブジェクトID）を登録順にハンドルで識別し、デバイスごとにまとめてから、
+    Read property multiple 1回分ずつワーカーに割り振る。各ワーカーは自分のイベントループとBACnetコントローラを持ち、
+    担当する点を周期的に読み取ってSharedPointTableへ書き込む。
+    制御を行うプロセスはSharedPointTableをロックなしで読むため、読み取りの負荷がGILを取り合わない。
+    ワーカーのDevice IDとポートはPortAllocatorで割り当てる。
+    ワーカーはspawnで起動するため、起動するスクリプトはif __name__ == "__main__":で守ること。
+    """
+
+# region 定数宣言
+
+    # ワーカーを止める際に待つ時間[sec]
+    JOIN_TIMEOUT_SEC = 5.0
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, points, worker_num=2, interval_sec=1.0, emulator_ip='127.0.0.1',
+                 device_ip='127.0.0.1', time_out_sec=1.0, allocator=None):
+        """インスタンスを初期化する
+
+        Args:
+            points (list(list(str,str))): （通信先のアドレス, オブジェクトID）のリスト（順番がハンドルになる）
+            worker_num (int): ワーカープロセスの数
+            interval_sec (float): 各ワーカーが担当する点を読み取る周期[sec]
+            emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            device_ip (str): ワーカーが通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
+            time_out_sec (float): タイムアウトまでの時間[sec]
+            allocator (PortAllocator): Device IDとポートの割り当てに使うインスタンス（Noneの場合は作成する）
+        """
+        self.points = [(addr, obj_id) for addr, obj_id in points]
+        self.handles = {point: handle for handle, point in enumerate(self.points)}
+        self.worker_num = worker_num
+        self.interval = interval_sec
+        self.emulator_ip = emulator_ip
+        self.device_ip = device_ip
+        self.time_out = time_out_sec
+        self.allocator = PortAllocator(device_ip=device_ip) if allocator is None else allocator
+
+        # ワーカーごとの担当（通信先のアドレス, [(ハンドル, オブジェクトID)]）のリスト
+        self.shards = self._make_shards()
+
+        self.table = None
+        self._workers = []
+        self._ports = []
+        self._stop_event = None
+
+# endregion
+
+# region 開始と停止
+
+    def start(self):
+        """共有メモリを用意し、ワーカープロセスを起動する
+
+        Returns:
+            str: 共有メモリの名前（他のプロセスからSharedPointTable.attachでつなぐ際に使う）
+        """
+        ctx = multiprocessing.get_context('spawn')
+        self.table = SharedPointTable(len(self.points))
+        self._stop_event = ctx.Event()
+        for index, shard in enumerate(self.shards):
+            device_id, port = self.allocator.allocate(name='shard ' + str(index))
+            self._ports.append(port)
+            worker = ctx.Process(
+                target=_run_worker,
+                args=(self.table.name, len(self.points), shard, device_id, port, self.interval,
+                      self.emulator_ip, self.device_ip, self.time_out, self._stop_event),
+                daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self.table.name
+
+    def stop(self):
+        """ワーカープロセスを止め、共有メモリを破棄する
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+        for worker in self._workers:
+            worker.join(self.JOIN_TIMEOUT_SEC)
+            if worker.is_alive():
+                worker.terminate()
+        self._workers = []
+        for port in self._ports:
+            self.allocator.release(port)
+        self._ports = []
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+# endregion
+
+# region 読み取り
+
+    def get_handle(self, addr, obj_id):
+        """点のハンドルを取得する
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+
+        Returns:
+            int: ハンドル
+        """
+        return self.handles[(addr, obj_id)]
+
+    def read(self, addr, obj_id):
+        """点の最新の値を共有メモリから読み取る
+
+        Args:
+            addr (str): 通信先のアドレス（xxx.xxx.xxx.xxx:port）
+            obj_id (str): オブジェクトID
+
+        Returns:
+            list(bool,float,float): 最後の読み取りが成功したか否か, 値, 更新時刻[UNIX時間]
+            （まだ一度も読み取れていない場合は（False, None, None））
+        """
+        return self.table.read(self.get_handle(addr, obj_id))
+
+# endregion
+
+# region 補助メソッド
+
+    def _make_shards(self):
+        # デバイスごとにRead property multiple 1回分ずつに分け、点の少ないワーカーから割り振る
+        by_addr = {}
+        for handle, (addr, obj_id) in enumerate(self.points):
+            by_addr.setdefault(addr, []).append((handle, obj_id))
+
+        chunks = []
+        for addr, items in by_addr.items():
+            for i in range(0, len(items), PresentValueReadWriter.MAX_RPM_OBJECTS):
+                chunks.append((addr, items[i:i + PresentValueReadWriter.MAX_RPM_OBJECTS]))
+
+        shards = [[] for _ in range(min(self.worker_num, len(chunks)))]
+        for chunk in sorted(chunks, key=lambda c: -len(c[1])):
+            min(shards, key=lambda s: sum(len(c[1]) for c in s)).append(chunk)
+        return shards
+
+# endregion
+
+def _to_float(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+def _run_worker(table_name, size, shard, device_id, port, interval_sec,
+                emulator_ip, device_ip, time_out_sec, stop_event):
+    asyncio.run(_worker_loop(table_name, size, shard, device_id, port, interval_sec,
+                             emulator_ip, device_ip, time_out_sec, stop_event))
+
+async def _worker_loop(table_name, size, shard, device_id, port, interval_sec,
+                       emulator_ip, device_ip, time_out_sec, stop_event):
+    table = SharedPointTable.attach(table_name, size)
+    comm = PresentValueReadWriter(device_id, 'shard worker', device_ip, emulator_ip, time_out_sec, port)
+
+    async def read_chunk(addr, items):
+        vals = await comm.read_present_values(addr, [obj_id for _, obj_id in items])
+        for (handle, _), (success, value) in zip(items, vals):
+            table.write(handle, _to_float(value) if success else math.nan, success)
+
+    try:
+        while not stop_event.is_set():
+            start = time.monotonic()
+            await asyncio.gather(*[read_chunk(addr, items) for addr, items in shard])
+            await asyncio.sleep(max(0.0, interval_sec - (time.monotonic() - start)))
+    finally:
+        comm.bacdevice.close()
+        table.close()
+
+# region サンプル
+
+async def main():
+    from VRFSystemCommunicator import VRFSystemCommunicator
+
+    # VRFの全室内機の状態を2つのワーカーで読み取る（点の一覧はクラスの表から作り、通信はワーカーに任せる）
+    target_ip = '127.0.0.1:' + str(VRFSystemCommunicator.VRFCTRL_EXCLUSIVE_PORT)
+    points = []
+    for oIndx, iIndx in VRFSystemCommunicator._get_iu_indices():
+        for _, obj_type, mem, _ in VRFSystemCommunicator._IU_SNAPSHOT_POINTS:
+            points.append((target_ip, obj_type + ':' + VRFSystemCommunicator._get_iu_objNum(oIndx, iIndx, mem.value)))
+
+    client = ShardedClient(points, worker_num=2)
+    name = client.start()
+    print('shared memory ' + name + ', ' + str(len(points)) + ' points')
+    try:
+        while True:
+            await asyncio.sleep(5)
+            vals = client.table.read_all()
+            print(str(sum(1 for success, _, _ in vals if success)) + ' / ' + str(len(vals)) + ' points valid')
+    finally:
+        client.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
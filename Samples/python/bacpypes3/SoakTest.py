@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+
+from bacpypes3.apdu import ErrorRejectAbortNack
+from LocalEmulator import LocalEmulator
+from VRFSystemCommunicator import VRFSystemCommunicator
+from Utilities import percentile
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class SoakTest():
+    """LocalEmulatorを相手に長期間（既定では1日分、LONG_DURATIONで1年分）の制御を最高速度で回し、メモリや遅延の増加を調べるクラス
+
+    LocalEmulatorのステップごとにworkloadを実行し、ステップはworkloadが終わるまで進まない。
+    sample_interval_secごとにRSS、tracemallocで追跡したメモリと増加の大きい割り当て箇所、asyncioのタスク数、
+    購読中のCOVの数、workloadの処理時間の分位点を記録し、ウォームアップ後の増加の傾き（1時間あたり）が
+    閾値を超えたら失敗とする。
+    LocalEmulatorも同じプロセスで動くため、RSSや割り当て箇所にはLocalEmulatorの分も含まれる。
+    tracemallocを有効にすると処理が数倍遅くなるため、速度を優先する場合はtrace_allocationsをFalseにする。
+    """
+
+# region 定数宣言
+
+    # 最高速度で回すための加速度（実際の速度はworkloadの処理時間で決まる）
+    MAX_ACC_RATE = 1e9
+
+    # 既定で回すシミュレーション期間
+    DEFAULT_DURATION = datetime.timedelta(days=1)
+
+    # 1年分の長期試験で回すシミュレーション期間（1ステップ100ms程度のworkloadでも15時間以上かかる）
+    LONG_DURATION = datetime.timedelta(days=365)
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, emulator, comms, workload, duration=DEFAULT_DURATION,
+                 sample_interval_sec=60.0, warmup_samples=3, top_allocators=10,
+                 max_rss_growth_mb_per_hour=5.0, max_traced_growth_mb_per_hour=2.0,
+                 max_task_growth_per_hour=1.0, max_subscription_growth_per_hour=0.5,
+                 max_latency_growth_ratio=2.0, trace_allocations=True):
+        """インスタンスを初期化する
+
+        Args:
+            emulator (LocalEmulator): 相手にするLocalEmulator（startの前であること）
+            comms (list(PresentValueReadWriter)): 調べる通信クラスのインスタンスのリスト
+            workload (callable): ステップの日時を引数にとるコルーチン関数（1ステップ分の制御）
+            duration (timedelta): 回すシミュレーション期間
+            sample_interval_sec (float): 記録する間隔[sec]
+            warmup_samples (int): 傾きの計算から除く最初の記録の数
+            top_allocators (int): 記録する割り当て箇所の数
+            max_rss_growth_mb_per_hour (float): RSSの増加の傾きの上限[MB/h]
+            max_traced_growth_mb_per_hour (float): tracemallocで追跡したメモリの増加の傾きの上限[MB/h]
+            max_task_growth_per_hour (float): タスク数の増加の傾きの上限[/h]
+            max_subscription_growth_per_hour (float): 購読中のCOVの数の増加の傾きの上限[/h]
+            max_latency_growth_ratio (float): ウォームアップ直後に対する最後の処理時間の95%値の比の上限
+            trace_allocations (bool): tracemallocで割り当て箇所を追跡するか否か
+        """
+        self.emulator = emulator
+        self.comms = list(comms)
+        self.workload = workload
+        self.duration = duration
+        self.sample_interval = sample_interval_sec
+        self.warmup_samples = warmup_samples
+        self.top_allocators = top_allocators
+        self.max_rss_growth_mb_per_hour = max_rss_growth_mb_per_hour
+        self.max_traced_growth_mb_per_hour = max_traced_growth_mb_per_hour
+        self.max_task_growth_per_hour = max_task_growth_per_hour
+        self.max_subscription_growth_per_hour = max_subscription_growth_per_hour
+        self.max_latency_growth_ratio = max_latency_growth_ratio
+        self.trace_allocations = trace_allocations
+
+        # 記録（dictのリスト）
+        self.samples = []
+
+        # 失敗の理由
+        self.failures = []
+
+        self._latencies = []
+        self._first_snapshot = None
+        self._start_time = None
+        self._next_sample_time = None
+        self._end_datetime = None
+        self._done = None
+
+# endregion
+
+# region 実行
+
+    async def run(self):
+        """シミュレーション期間の終わりまで回し、増加の傾きを判定する
+
+        Returns:
+            bool: 閾値を超える増加がなかったか否か
+        """
+        self.emulator.acc_rate = self.MAX_ACC_RATE
+        self.emulator.add_step_handler(self._on_step)
+        self._end_datetime = self.emulator.current_datetime + self.duration
+        self._done = asyncio.get_running_loop().create_future()
+
+        if self.trace_allocations:
+            tracemalloc.start()
+            self._first_snapshot = tracemalloc.take_snapshot()
+        self._start_time = time.monotonic()
+        self._next_sample_time = self._start_time + self.sample_interval
+        try:
+            await self.emulator.start()
+            for comm in self.comms:
+                await comm.subscribe_date_time_cov()
+            await self._done
+            self.sample()
+        finally:
+            await self.emulator.stop()
+            if self.trace_allocations:
+                tracemalloc.stop()
+
+        self.failures = self.check()
+        return len(self.failures) == 0
+
+    async def _on_step(self, emulator, step):
+        if self._done.done():
+            return
+        start = time.perf_counter()
+        try:
+            await self.workload(step)
+        except (Exception, ErrorRejectAbortNack) as err:
+            # BACnetのエラーも含め、LocalEmulatorのステップ処理へ漏らさずに試験を終わらせる
+            self._done.set_exception(err)
+            return
+        self._latencies.append(time.perf_counter() - start)
+
+        if self._next_sample_time <= time.monotonic():
+            self.sample()
+            self._next_sample_time += self.sample_interval
+        if self._end_datetime <= step:
+            self._done.set_result(step)
+
+    def sample(self):
+        """現在の状態を記録する
+
+        Returns:
+            dict: 記録（経過時間[h], シミュレーション日時, ステップ数, RSS[MB], 追跡したメモリ[MB],
+            タスク数, 購読中のCOVの数, 処理時間の中央値・95%値・99%値[sec], 増加の大きい割り当て箇所）
+        """
+        traced = 0
+        stats = []
+        if self.trace_allocations:
+            traced, _ = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().compare_to(self._first_snapshot, 'lineno')[:self.top_allocators]
+
+        latencies = self._latencies
+        self._latencies = []
+        record = {
+            'hours': (time.monotonic() - self._start_time) / 3600,
+            'datetime': self.emulator.current_datetime,
+            'steps': self.emulator.steps,
+            'rss_mb': self._get_rss() / 1e6,
+            'traced_mb': traced / 1e6,
+            'tasks': len(asyncio.all_tasks()),
+            'subscriptions': sum(len(getattr(comm.bacdevice, '_cov_contexts', {})) for comm in self.comms),
+            'latency_p50_sec': percentile(latencies, 50),
+            'latency_p95_sec': percentile(latencies, 95),
+            'latency_p99_sec': percentile(latencies, 99),
+            'top_allocators': [(str(s.traceback), s.size_diff) for s in stats],
+        }
+        self.samples.append(record)
+        print(record['datetime'].strftime('%Y/%m/%d %H:%M') +
+              '  rss ' + '{:.1f}'.format(record['rss_mb']) + ' MB' +
+              '  traced ' + '{:.1f}'.format(record['traced_mb']) + ' MB' +
+              '  tasks ' + str(record['tasks']) +
+              '  cov ' + str(record['subscriptions']) +
+              '  p95 ' + '{:.1f}'.format(1000 * record['latency_p95_sec']) + ' ms')
+        return record
+
+# endregion
+
+# region 判定
+
+    def check(self):
+        """ウォームアップ後の記録から増加の傾きを求め、閾値と比べる
+
+        Returns:
+            list(str): 閾値を超えた項目の説明（超えていなければ空）
+        """
+        samples = self.samples[self.warmup_samples:]
+        if len(samples) < 2:
+            return []
+
+        failures = []
+        limits = [
+            ('rss_mb', self.max_rss_growth_mb_per_hour, 'MB/h'),
+            ('traced_mb', self.max_traced_growth_mb_per_hour, 'MB/h'),
+            ('tasks', self.max_task_growth_per_hour, '/h'),
+            ('subscriptions', self.max_subscription_growth_per_hour, '/h'),
+        ]
+        hours = [s['hours'] for s in samples]
+        for key, limit, unit in limits:
+            slope = self._slope(hours, [s[key] for s in samples])
+            if limit < slope:
+                failures.append(key + ' grows ' + '{:.2f}'.format(slope) + ' ' + unit +
+                                ' (limit ' + '{:.2f}'.format(limit) + ' ' + unit + ')')
+
+        first = samples[0]['latency_p95_sec']
+        last = samples[-1]['latency_p95_sec']
+        if 0 < first and self.max_latency_growth_ratio < last / first:
+            failures.append('latency p95 grows ' + '{:.2f}'.format(last / first) + 'x' +
+                            ' (limit ' + '{:.2f}'.format(self.max_latency_growth_ratio) + 'x)')
+        return failures
+
+    def print_report(self):
+        """判定の結果と、最後の記録で増加の大きい割り当て箇所を表示する
+        """
+        print('PASSED' if len(self.failures) == 0 else 'FAILED')
+        for failure in self.failures:
+            print('  ' + failure)
+        if 0 < len(self.samples):
+            print('top allocators (growth since start):')
+            for where, size_diff in self.samples[-1]['top_allocators']:
+                print('  {:+10.1f} KB  {}'.format(size_diff / 1e3, where))
+
+# endregion
+
+# region 補助メソッド
+
+    def _get_rss(self):
+        if psutil is not None:
+            return psutil.Process().memory_info().rss
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            pass
+        if resource is not None:
+            # 現在値が得られない場合は最大値で代用する（Linuxではキロバイト単位）
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+    def _slope(self, xs, ys):
+        n = len(xs)
+        mx = sum(xs) / n
+        my = sum(ys) / n
+        sxx = sum((x - mx) ** 2 for x in xs)
+        if sxx == 0:
+            return 0.0
+        return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+
+# endregion
+
+# region サンプル
+
+async def main(duration=SoakTest.DEFAULT_DURATION):
+    vrfCom = VRFSystemCommunicator(12)
+
+    # VRFSystemCommunicatorが読み書きする点を持つVRFコントローラを用意する
+    emulator = LocalEmulator()
+    objects = []
+    for oIndx, iIndx in vrfCom._get_iu_indices():
+        for _, obj_type, mem, _ in vrfCom._IU_SNAPSHOT_POINTS:
+            objects.append((obj_type + ':' + vrfCom._get_iu_objNum(oIndx, iIndx, mem.value),
+                            1 if obj_type == 'multiStateInput' else 0))
+        for obj_type, mem, _ in vrfCom._IU_SETTING_POINTS.values():
+            objects.append((obj_type + ':' + vrfCom._get_iu_objNum(oIndx, iIndx, mem.value),
+                            26.0 if obj_type == 'analogValue' else 1 if obj_type == 'multiStateOutput' else 0))
+    for oIndx in range(1, len(vrfCom.I_UNIT_NUM) + 1):
+        for _, obj_type, mem, _ in vrfCom._OU_SNAPSHOT_POINTS:
+            objects.append((obj_type + ':' + vrfCom._get_ou_objNum(oIndx, mem.value), 0))
+    emulator.add_device(VRFSystemCommunicator.VRFCTRL_DEVICE_ID, 'VRFController', objects)
+
+    # 毎ステップ全台の状態を読み、1時間ごとに全台の室温設定値を書き込む
+    async def workload(step):
+        await vrfCom.snapshot()
+        if step.minute == 0:
+            await vrfCom.change_setpoint_temperature_group('all', 24 + step.hour % 4)
+
+    soak = SoakTest(emulator, [vrfCom], workload, duration=duration, sample_interval_sec=10.0)
+    passed = await soak.run()
+    soak.print_report()
+    return passed
+
+if __name__ == "__main__":
+    # 1年分回す場合は --days 365（SoakTest.LONG_DURATION）を指定する
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=float, default=SoakTest.DEFAULT_DURATION.days, help='simulated days to run')
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(datetime.timedelta(days=args.days))) else 1)
+
+# endregion
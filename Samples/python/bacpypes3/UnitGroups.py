@@ -0,0 +1,111 @@
+class UnitGroups():
+    """室内機（および同じ番号の全熱交換器）のグループを管理するクラス
+
+    既定で以下のグループを持つ。
+        all: 全室内機
+        vrf1～vrf4: 室外機系統ごとの室内機
+        south, north: テナントごとの室内機
+    """
+
+# region 定数宣言
+
+    # 各系統の室内機の台数
+    I_UNIT_NUM = [5,4,5,4]
+
+    # 各テナントの室外機番号
+    TENANT_O_UNITS = {'south': [1,2], 'north': [3,4]}
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self):
+        """インスタンスを初期化する
+        """
+        self._groups = {}
+
+        self.add_group('all', [(i + 1, j + 1) for i in range(len(self.I_UNIT_NUM)) for j in range(self.I_UNIT_NUM[i])])
+        for i in range(len(self.I_UNIT_NUM)):
+            self.add_group('vrf' + str(i + 1), [(i + 1, j + 1) for j in range(self.I_UNIT_NUM[i])])
+        for tenant, o_units in self.TENANT_O_UNITS.items():
+            self.add_group(tenant, [(o, j + 1) for o in o_units for j in range(self.I_UNIT_NUM[o - 1])])
+
+# endregion
+
+# region グループの操作
+
+    def add_group(self, name, units):
+        """グループを追加する（同名のグループは置き換える）
+
+        Args:
+            name (str): グループ名
+            units (list(list(int,int))): (室外機番号, 室内機番号)のリスト
+        """
+        self._groups[name] = [(int(o), int(i)) for o, i in units]
+
+    def remove_group(self, name):
+        """グループを削除する
+
+        Args:
+            name (str): グループ名
+        """
+        del self._groups[name]
+
+    def get_names(self):
+        """グループ名の一覧を取得する
+
+        Returns:
+            list(str): グループ名のリスト
+        """
+        return list(self._groups.keys())
+
+    def get_units(self, group):
+        """グループに属する室内機を取得する
+
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+
+        Returns:
+            list(list(int,int)): (室外機番号, 室内機番号)のリスト
+        """
+        if isinstance(group, str):
+            if group not in self._groups:
+                raise ValueError('unknown unit group: ' + group)
+            return list(self._groups[group])
+        return [(int(o), int(i)) for o, i in group]
+
+    def get_tenant(self, oUnitIndex):
+        """室外機系統が属するテナント名を取得する
+
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+
+        Returns:
+            str: テナント名（'south'または'north'）
+        """
+        for tenant, o_units in self.TENANT_O_UNITS.items():
+            if oUnitIndex in o_units:
+                return tenant
+        raise ValueError('unknown outdoor unit: ' + str(oUnitIndex))
+
+    def get_zone(self, oUnitIndex, iUnitIndex):
+        """室内機が空調するテナントとゾーン番号を取得する
+
+        ゾーン番号はテナント内の室外機系統の順に室内機を数えた番号（1～9）。
+
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+            iUnitIndex (int): 室内機番号（1～5）
+
+        Returns:
+            list(str,int): テナント名（'south'または'north'）,ゾーン番号
+        """
+        tenant = self.get_tenant(oUnitIndex)
+        zone = iUnitIndex
+        for o in self.TENANT_O_UNITS[tenant]:
+            if o == oUnitIndex:
+                break
+            zone += self.I_UNIT_NUM[o - 1]
+        return tenant, zone
+
+# endregion
@@ -0,0 +1,53 @@
+import datetime
+
+# region 運転時間帯
+
+def is_hvac_time(dtime):
+    """空調の運転時間帯（平日の7:00～19:00）か否かを判定する
+
+    Args:
+        dtime (datetime): 日時
+
+    Returns:
+        bool: 運転時間帯か否か
+    """
+    start_time = datetime.time(7, 0)
+    end_time = datetime.time(19, 0)
+    now = dtime.time()
+    is_business_hour = start_time <= now <= end_time
+    is_weekday = (dtime.weekday() != 5 and dtime.weekday() != 6)
+    return is_weekday and is_business_hour
+
+# endregion
+
+# region 統計
+
+def percentile(values, q):
+    """百分位数を求める（最近傍順位法）
+
+    Args:
+        values (list(float)): 値のリスト（並べ替えていなくてもよい）
+        q (float): 百分位[%]
+
+    Returns:
+        float: 百分位数（値がない場合は0.0）
+    """
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+# endregion
+
+# region サンプル
+
+def main():
+    dtime = datetime.datetime(2015, 7, 1, 9, 0)
+    print(dtime.strftime('%Y/%m/%d %H:%M') + ' is ' + ('' if is_hvac_time(dtime) else 'not ') + 'HVAC time')
+    latencies = [0.012, 0.008, 0.030, 0.011, 0.009]
+    print('p50 ' + str(percentile(latencies, 50)) + ' sec, p95 ' + str(percentile(latencies, 95)) + ' sec')
+
+if __name__ == "__main__":
+    main()
+
+# endregion
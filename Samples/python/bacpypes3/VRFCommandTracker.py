@@ -0,0 +1,216 @@
+import asyncio
+import datetime
+
+from bacpypes3.primitivedata import ObjectIdentifier
+from VRFSystemCommunicator import VRFSystemCommunicator
+
+class VRFCommandTracker():
+    """設定（*_Setting）の書き込みが状態（*_Status）に反映されるまでを追跡するクラス
+
+    状態の点はVRFSystemCommunicatorの読み取り（snapshotなどの一括読み取りを含む）から受け取り、
+    しばらく読み取られていない点だけをまとめて読み取る。
+    タイムアウトはシミュレーション日時で判定するため、subscribe_date_time_covを呼んでおく必要がある。
+    """
+
+# region 定数宣言
+
+    # アナログ値が一致しているとみなす差
+    ANALOG_TOLERANCE = 0.05
+
+# endregion
+
+# region 内部クラス
+
+    class _Command():
+        def __init__(self, expected, deadline, future):
+            # 状態に反映されるべき値
+            self.expected = expected
+            # タイムアウトするシミュレーション日時
+            self.deadline = deadline
+            # 反映されたらTrue、タイムアウトしたらFalseを返すFuture
+            self.future = future
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, vrf_comm, poll_interval_sec=1.0, timeout=datetime.timedelta(minutes=5)):
+        """インスタンスを初期化する
+
+        Args:
+            vrf_comm (VRFSystemCommunicator): 通信に使うVRFSystemCommunicator
+            poll_interval_sec (float): 読み取られていない状態の点を読み取りに行く間隔[sec]
+            timeout (timedelta): 既定のタイムアウトまでのシミュレーション時間
+        """
+        self.vrf_comm = vrf_comm
+        self.poll_interval = poll_interval_sec
+        self.timeout = timeout
+
+        # 状態の点のObjectIdentifierごとの追跡中のコマンド（1点につき最新の1件）
+        self._pending = {}
+
+        # 状態の点を最後に受け取った時刻（asyncioのループ時刻）
+        self._last_seen = {}
+
+        self._task = None
+        vrf_comm.add_read_observer(self._on_read)
+
+# endregion
+
+# region コマンドの登録
+
+    def track(self, setting_obj_id, value, timeout=None):
+        """書き込んだ設定の反映を追跡する
+
+        Args:
+            setting_obj_id (str): 設定の点のオブジェクトID
+            value (Union[Real,Enumerated,Unsigned]): 書き込んだPresent value
+            timeout (timedelta): タイムアウトまでのシミュレーション時間（Noneの場合は既定値）
+
+        Returns:
+            Future: 反映されたらTrue、タイムアウトしたらFalseになるFuture
+        """
+        status_id = ObjectIdentifier(self.vrf_comm._get_status_obj_id(setting_obj_id))
+        deadline = self.vrf_comm.current_date_time() + (self.timeout if timeout is None else timeout)
+        future = asyncio.get_running_loop().create_future()
+
+        # 同じ点を追跡中の古いコマンドは新しい値で上書きされたとみなす
+        old = self._pending.get(status_id)
+        if old is not None and not old.future.done():
+            old.future.set_result(False)
+        self._pending[status_id] = self._Command(float(value), deadline, future)
+        self._last_seen.setdefault(status_id, 0)
+        return future
+
+    async def issue(self, setting_obj_id, value, timeout=None):
+        """設定を書き込み、その反映を追跡する
+
+        Args:
+            setting_obj_id (str): 設定の点のオブジェクトID
+            value (Union[Real,Enumerated,Unsigned]): 書き込むPresent value
+            timeout (timedelta): タイムアウトまでのシミュレーション時間（Noneの場合は既定値）
+
+        Returns:
+            Future: 反映されたらTrue、書き込みに失敗したかタイムアウトしたらFalseになるFuture
+        """
+        rslt = await self.vrf_comm.write_present_value(self.vrf_comm.target_ip, setting_obj_id, value)
+        if not rslt[0]:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(False)
+            return future
+        return self.track(setting_obj_id, value, timeout)
+
+    async def issue_iu_setting(self, oUnitIndex, iUnitIndex, name, value, timeout=None):
+        """室内機の設定を書き込み、その反映を追跡する
+
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+            iUnitIndex (int): 室内機番号（1～5）
+            name (str): 設定の項目名（'on_off', 'mode', 'setpoint_temperature', 'fan_speed', 'direction', 'local_control_permitted'）
+            value (Union[bool,float,Mode,FanSpeed,Direction]): 設定値
+            timeout (timedelta): タイムアウトまでのシミュレーション時間（Noneの場合は既定値）
+
+        Returns:
+            Future: 反映されたらTrue、書き込みに失敗したかタイムアウトしたらFalseになるFuture
+        """
+        obj_id, bac_value = self.vrf_comm._get_iu_setting(oUnitIndex, iUnitIndex, name, value)
+        return await self.issue(obj_id, bac_value, timeout)
+
+    def pending_count(self):
+        """追跡中のコマンドの数を取得する
+
+        Returns:
+            int: 追跡中のコマンドの数
+        """
+        return len(self._pending)
+
+# endregion
+
+# region 状態の確認
+
+    def start(self):
+        """読み取られていない状態の点を定期的に読み取るタスクを開始する
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        """定期的な読み取りを止め、追跡中のコマンドをすべてFalseで終える
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for cmd in self._pending.values():
+            if not cmd.future.done():
+                cmd.future.set_result(False)
+        self._pending.clear()
+        self._last_seen.clear()
+
+    async def poll(self):
+        """しばらく読み取られていない状態の点をまとめて読み取り、タイムアウトを判定する
+        """
+        now = asyncio.get_running_loop().time()
+        stale = [str(sid[0]) + ':' + str(sid[1]) for sid in self._pending
+                 if now - self._last_seen.get(sid, 0) >= self.poll_interval]
+        if 0 < len(stale):
+            # 結果は_on_readで受け取る
+            await self.vrf_comm.read_present_values(self.vrf_comm.target_ip, stale)
+        self._expire()
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if 0 < len(self._pending):
+                await self.poll()
+
+    def _on_read(self, addr, obj_id, value):
+        if addr != self.vrf_comm.target_ip or obj_id not in self._pending:
+            return
+        self._last_seen[obj_id] = asyncio.get_running_loop().time()
+
+        cmd = self._pending[obj_id]
+        if cmd.future.done() or abs(float(value) - cmd.expected) < self.ANALOG_TOLERANCE:
+            if not cmd.future.done():
+                cmd.future.set_result(True)
+            del self._pending[obj_id]
+            del self._last_seen[obj_id]
+
+    def _expire(self):
+        now = self.vrf_comm.current_date_time()
+        for sid, cmd in list(self._pending.items()):
+            if cmd.future.done() or cmd.deadline <= now:
+                if not cmd.future.done():
+                    cmd.future.set_result(False)
+                del self._pending[sid]
+                self._last_seen.pop(sid, None)
+
+# endregion
+
+# region サンプル
+
+async def main():
+    vrfCom = VRFSystemCommunicator(12)
+    await vrfCom.subscribe_date_time_cov()
+
+    tracker = VRFCommandTracker(vrfCom)
+    tracker.start()
+
+    # VRF1-2を起動して冷房26Cに設定し、反映を待つ
+    futures = [
+        await tracker.issue_iu_setting(1, 2, 'on_off', True),
+        await tracker.issue_iu_setting(1, 2, 'mode', VRFSystemCommunicator.Mode.Cooling),
+        await tracker.issue_iu_setting(1, 2, 'setpoint_temperature', 26),
+    ]
+    rslts = await asyncio.gather(*futures)
+    print('reflected' if all(rslts) else 'not reflected: ' + str(rslts))
+
+    await tracker.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -1,8 +1,15 @@
 import asyncio
 import PresentValueReadWriter
 
+from UnitGroups import UnitGroups
+
 from enum import Enum
-from bacpypes3.primitivedata import Enumerated, Real, Unsigned
+from bacpypes3.primitivedata import Enumerated, Real, Unsigned, ObjectIdentifier
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
@@ -12,6 +19,9 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
     VRFCTRL_EXCLUSIVE_PORT = 0xBAC0 + VRFCTRL_DEVICE_ID
 
+    # 各系統の室内機の台数
+    I_UNIT_NUM = UnitGroups.I_UNIT_NUM
+
 # endregion
 
 # region 列挙型定義
@@ -90,7 +100,42 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
 # endregion
 
-    def __init__(self, id, name='vrfComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0):
+# region スナップショットで読み取る点
+
+    # 室内機の点（列名, オブジェクトタイプ, メンバー, numpyの型）
+    _IU_SNAPSHOT_POINTS = [
+        ('on_off', 'binaryInput', _member.OnOff_Status, '?'),
+        ('mode', 'multiStateInput', _member.OperationMode_Status, 'u1'),
+        ('setpoint_temperature', 'analogInput', _member.Setpoint_Status, 'f4'),
+        ('return_air_temperature', 'analogInput', _member.MeasuredRoomTemperature, 'f4'),
+        ('return_air_relative_humidity', 'analogInput', _member.MeasuredRelativeHumidity, 'f4'),
+        ('fan_speed', 'multiStateInput', _member.FanSpeed_Status, 'u1'),
+        ('direction', 'multiStateInput', _member.AirflowDirection_Status, 'u1'),
+        ('local_control_permitted', 'binaryInput', _member.RemoteControllerPermittion_Setpoint_Status, '?'),
+        ('electricity', 'analogInput', _member.Electricity, 'f4'),
+    ]
+
+    # 室外機の点（列名, オブジェクトタイプ, メンバー, numpyの型）
+    _OU_SNAPSHOT_POINTS = [
+        ('refrigerant_temperature_control', 'binaryInput', _member.ForcedRefrigerantTemperature_Status, '?'),
+        ('evaporating_temperature', 'analogInput', _member.EvaporatingTemperatureSetpoint_Status, 'f4'),
+        ('condensing_temperature', 'analogInput', _member.CondensingTemperatureSetpoint_Status, 'f4'),
+        ('electricity', 'analogInput', _member.Electricity, 'f4'),
+    ]
+
+    # 室内機の設定の点（対応するスナップショットの列名: (オブジェクトタイプ, メンバー, BACnetの型)）
+    _IU_SETTING_POINTS = {
+        'on_off': ('binaryOutput', _member.OnOff_Setting, Enumerated),
+        'mode': ('multiStateOutput', _member.OperationMode_Setting, Unsigned),
+        'setpoint_temperature': ('analogValue', _member.Setpoint_Setting, Real),
+        'fan_speed': ('multiStateOutput', _member.FanSpeed_Setting, Unsigned),
+        'direction': ('multiStateOutput', _member.AirflowDirection_Setting, Unsigned),
+        'local_control_permitted': ('binaryValue', _member.RemoteControllerPermittion_Setpoint_Setting, Enumerated),
+    }
+
+# endregion
+
+    def __init__(self, id, name='vrfComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0, port=None):
         """インスタンスを初期化する
 
         Args:
@@ -98,10 +143,14 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             name (str): 通信用のDeviceの名前
             device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
             emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            port (int): 通信に使うDeviceのポート（Noneの場合は0xBAC0+id）
         """
-        super().__init__(id, name, device_ip, emulator_ip, time_out_sec)
+        super().__init__(id, name, device_ip, emulator_ip, time_out_sec, port)
         self.target_ip = emulator_ip + ':' + str(self.VRFCTRL_EXCLUSIVE_PORT)
 
+        # 室内機のグループ
+        self.groups = UnitGroups()
+
 # region 発停関連
 
     async def turn_on(self, oUnitIndex, iUnitIndex):
@@ -163,7 +212,7 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,Mode): 読み取り成功の真偽,運転モード
         """        
         inst = 'multiStateInput:' + self._get_iu_objNum(oUnitIndex,iUnitIndex,self._member.OperationMode_Status.value)
-        val = await self.read_present_value(self.target_ip,inst,Unsigned)
+        val = await self.read_present_value(self.target_ip,inst)
         return val[0], self.Mode.Cooling if val[1] == 1 else (self.Mode.Heating if val[1] == 2 else self.Mode.ThermoOff)
 
 # endregion
@@ -269,7 +318,7 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,Direction): 読み取り成功の真偽,風向
         """        
         inst = 'multiStateInput:' + self._get_iu_objNum(oUnitIndex,iUnitIndex,self._member.AirflowDirection_Status.value)
-        val = await self.read_present_value(self.target_ip,inst,Unsigned)
+        val = await self.read_present_value(self.target_ip,inst)
 
         if(val[1] == 1):
             return val[0], self.Direction.Horizontal
@@ -317,7 +366,7 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,bool): 読み取り成功の真偽,手元リモコン操作が許可されているか否か
         """
         inst = 'binaryInput:' + self._get_iu_objNum(oUnitIndex,iUnitIndex,self._member.RemoteControllerPermittion_Setpoint_Status.value)
-        val = await self.read_present_value(self.target_ip,inst,Enumerated)
+        val = await self.read_present_value(self.target_ip,inst)
         return val[0], (val[1] == 1)
 
 # endregion
@@ -377,8 +426,8 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
         Returns:
             list(bool,float): 読み取り成功の真偽,蒸発温度設定値[C]
         """
-        inst = 'analogInput:' + self._get_ou_objNum(oUnitIndex,self._member.CondensingTemperatureSetpoint_Status.value)
-        return await self.read_present_value(self.target_ip,inst,Real)
+        inst = 'analogInput:' + self._get_ou_objNum(oUnitIndex,self._member.EvaporatingTemperatureSetpoint_Status.value)
+        return await self.read_present_value(self.target_ip,inst)
     
     async def change_condensing_temperature(self, oUnitIndex, condensingTemperature):
         """凝縮温度設定値[C]を変える
@@ -399,7 +448,7 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,float): 読み取り成功の真偽,凝縮温度設定値[C]
         """
         inst = 'analogInput:' + self._get_ou_objNum(oUnitIndex,self._member.CondensingTemperatureSetpoint_Status.value)
-        return await self.read_present_value(self.target_ip,inst,Real)
+        return await self.read_present_value(self.target_ip,inst)
 
 # endregion
 
@@ -414,7 +463,7 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,float): 読み取り成功の真偽,室内機の消費電力[kW]
         """
         inst = 'analogInput:' + self._get_iu_objNum(oUnitIndex,iUnitIndex,self._member.Electricity.value)
-        return await self.read_present_value(self.target_ip,inst,Real)
+        return await self.read_present_value(self.target_ip,inst)
     
     async def get_outdoor_unit_electricity(self, oUnitIndex):
         """室外機の消費電力[kW]を取得する
@@ -424,13 +473,191 @@ class VRFSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
             list(bool,float): 読み取り成功の真偽,室外機の消費電力[kW]
         """
         inst = 'analogInput:' + self._get_ou_objNum(oUnitIndex,self._member.Electricity.value)
-        return await self.read_present_value(self.target_ip,inst,Real)
+        return await self.read_present_value(self.target_ip,inst)
+
+# endregion
+
+# region グループ操作
+
+    async def turn_on_group(self, group):
+        """グループの室内機を並行して起動する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'on_off', True)
+
+    async def turn_off_group(self, group):
+        """グループの室内機を並行して停止する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'on_off', False)
+
+    async def change_mode_group(self, group, mode):
+        """グループの室内機の運転モードを並行して変える
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+            mode (Mode): 運転モード
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'mode', mode)
+
+    async def change_setpoint_temperature_group(self, group, sp):
+        """グループの室内機の室温設定値[C]を並行して変える
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+            sp (float): 室温設定値[C]
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'setpoint_temperature', sp)
+
+    async def change_fan_speed_group(self, group, speed):
+        """グループの室内機のファン風量を並行して変える
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+            speed (FanSpeed): ファン風量
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'fan_speed', speed)
+
+    async def change_direction_group(self, group, direction):
+        """グループの室内機の風向を並行して変える
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+            direction (Direction): 風向
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'direction', direction)
+
+    async def permit_local_control_group(self, group):
+        """グループの室内機の手元リモコン操作を並行して許可する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'local_control_permitted', True)
+
+    async def prohibit_local_control_group(self, group):
+        """グループの室内機の手元リモコン操作を並行して禁止する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_iu_group(group, 'local_control_permitted', False)
+
+    async def _write_iu_group(self, group, name, value):
+        units = self.groups.get_units(group)
+        obj_values = [self._get_iu_setting(oIndx,iIndx,name,value) for oIndx, iIndx in units]
+        rslts = await self.write_present_values(self.target_ip,obj_values)
+        return dict(zip(units, rslts))
+
+# endregion
+
+# region 一括読み取り
+
+    async def snapshot(self):
+        """全室内機・全室外機の状態をReadPropertyMultipleでまとめて読み取る
+
+        室内機は（室外機番号, 室内機番号）の順に1行ずつ、室外機は室外機番号の順に1行ずつ並ぶ。
+        運転モード、ファン風量、風向はそれぞれMode、FanSpeed、Directionの値で格納する。
+        読み取りに失敗した値は0のままとなり、有効性の配列の同じ列がFalseになる。
+
+        Returns:
+            list(ndarray,ndarray,ndarray,ndarray): 室内機の状態,室内機の値の有効性,室外機の状態,室外機の値の有効性
+        """
+        if np is None:
+            raise ImportError('snapshot() requires numpy')
+
+        iu_indices = self._get_iu_indices()
+        ou_indices = list(range(1, len(self.I_UNIT_NUM) + 1))
+
+        obj_ids = []
+        for oIndx, iIndx in iu_indices:
+            for _, obj_type, mem, _ in self._IU_SNAPSHOT_POINTS:
+                obj_ids.append(obj_type + ':' + self._get_iu_objNum(oIndx,iIndx,mem.value))
+        for oIndx in ou_indices:
+            for _, obj_type, mem, _ in self._OU_SNAPSHOT_POINTS:
+                obj_ids.append(obj_type + ':' + self._get_ou_objNum(oIndx,mem.value))
+        vals = await self.read_present_values(self.target_ip,obj_ids)
+
+        iu, iu_valid = self._make_snapshot_array([('o_unit', 'u1'), ('i_unit', 'u1')], self._IU_SNAPSHOT_POINTS, vals[:len(iu_indices) * len(self._IU_SNAPSHOT_POINTS)], len(iu_indices))
+        iu['o_unit'] = [idx[0] for idx in iu_indices]
+        iu['i_unit'] = [idx[1] for idx in iu_indices]
+        ou, ou_valid = self._make_snapshot_array([('o_unit', 'u1')], self._OU_SNAPSHOT_POINTS, vals[len(iu_indices) * len(self._IU_SNAPSHOT_POINTS):], len(ou_indices))
+        ou['o_unit'] = ou_indices
+        return iu, iu_valid, ou, ou_valid
+
+    def _make_snapshot_array(self, keys, points, vals, row_num):
+        arr = np.zeros(row_num, dtype=keys + [(name, typ) for name, _, _, typ in points])
+        valid = np.zeros(row_num, dtype=[(name, '?') for name, _, _, _ in points])
+        for i in range(row_num):
+            for j, (name, _, _, typ) in enumerate(points):
+                success, value = vals[i * len(points) + j]
+                if not success:
+                    continue
+                if typ == '?':
+                    arr[name][i] = (value == 1)
+                elif typ == 'f4':
+                    arr[name][i] = float(value)
+                else:
+                    arr[name][i] = int(value)
+                valid[name][i] = True
+        return arr, valid
 
 # endregion
 
 # region 補助メソッド
 
-    def _get_iu_objNum(self,oUnitIndex,iUnitIndex,mem_id):
+    def _get_iu_setting(self, oUnitIndex, iUnitIndex, name, value):
+        """室内機の設定を書き込むためのオブジェクトIDとPresent valueを作る
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+            iUnitIndex (int): 室内機番号（1～5）
+            name (str): _IU_SETTING_POINTSの項目名
+            value (Union[bool,float,Mode,FanSpeed,Direction]): 設定値
+        Returns:
+            list(str,Union[Enumerated,Unsigned,Real]): オブジェクトID,Present value
+        """
+        obj_type, mem, data_type = self._IU_SETTING_POINTS[name]
+        if isinstance(value, Enum):
+            value = value.value
+        elif isinstance(value, bool):
+            value = 1 if value else 0
+        return obj_type + ':' + self._get_iu_objNum(oUnitIndex,iUnitIndex,mem.value), data_type(value)
+
+    def _get_status_obj_id(self, setting_obj_id):
+        """設定の点に対応する状態の点のオブジェクトIDを取得する
+        Args:
+            setting_obj_id (str): 設定の点のオブジェクトID（例: 'analogValue:1105'）
+        Returns:
+            str: 状態の点のオブジェクトID（例: 'analogInput:1106'）
+        """
+        obj_type, obj_num = ObjectIdentifier(setting_obj_id)
+        status_type = {
+            'binary-output': 'binaryInput',
+            'binary-value': 'binaryInput',
+            'multi-state-output': 'multiStateInput',
+            'analog-value': 'analogInput',
+        }[str(obj_type)]
+        # 状態のメンバー番号は設定のメンバー番号 + 1
+        return status_type + ':' + str(obj_num + 1)
+
+    @classmethod
+    def _get_iu_indices(cls):
+        return [(i + 1, j + 1) for i in range(len(cls.I_UNIT_NUM)) for j in range(cls.I_UNIT_NUM[i])]
+
+    @staticmethod
+    def _get_iu_objNum(oUnitIndex,iUnitIndex,mem_id):
         return str(1000 * oUnitIndex + 100 * iUnitIndex + mem_id)
     
     def _get_ou_objNum(self,oUnitIndex,mem_id):
@@ -454,44 +681,30 @@ async def main():
         pass
 
 async def turn_off(vrfCom):
-    # 各系統の室内機の台数
-    i_unit_num = [5,4,5,4]
-
-    for i in range(len(i_unit_num)):
-        for j in range(i_unit_num[i]):
-            print('vrf' + str(i + 1) + '-' + str(j+1))
-
-            print('turn off...',end='')
-            rslt = await vrfCom.turn_off(i+1,j+1)
-            print('success' if rslt[0] else 'failed')
+    print('turn off...',end='')
+    rslt = await vrfCom.turn_off_group('all')
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
 async def turn_on(vrfCom):
-    # 各系統の室内機の台数
-    i_unit_num = [5,4,5,4]
-
-    for i in range(len(i_unit_num)):
-        for j in range(i_unit_num[i]):
-            print('vrf' + str(i + 1) + '-' + str(j+1))
-
-            print('turn on...',end='')
-            rslt = await vrfCom.turn_on(i+1,j+1)
-            print('success' if rslt[0] else 'failed')
+    print('turn on...',end='')
+    rslt = await vrfCom.turn_on_group('all')
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
-            print('change mode...',end='')
-            rslt = await vrfCom.change_mode(i+1,j+1,VRFSystemCommunicator.Mode.Cooling)
-            print('success' if rslt[0] else 'failed')
+    print('change mode...',end='')
+    rslt = await vrfCom.change_mode_group('all',VRFSystemCommunicator.Mode.Cooling)
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
-            print('change set point temperature...',end='')
-            rslt = await vrfCom.change_setpoint_temperature(i+1,j+1,26)
-            print('success' if rslt[0] else 'failed')
+    print('change set point temperature...',end='')
+    rslt = await vrfCom.change_setpoint_temperature_group('all',26)
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
-            print('change fanspeed...',end='')
-            rslt = await vrfCom.change_fan_speed(i+1,j+1,VRFSystemCommunicator.FanSpeed.Middle)
-            print('success' if rslt[0] else 'failed')
+    print('change fanspeed...',end='')
+    rslt = await vrfCom.change_fan_speed_group('all',VRFSystemCommunicator.FanSpeed.Middle)
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
-            print('change direction...',end='')
-            rslt = await vrfCom.change_direction(i+1,j+1,VRFSystemCommunicator.Direction.Degree_450)
-            print('success' if rslt[0] else 'failed')
+    print('change direction...',end='')
+    rslt = await vrfCom.change_direction_group('all',VRFSystemCommunicator.Direction.Degree_450)
+    print('success' if all(r[0] for r in rslt.values()) else 'failed')
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,176 @@
+import asyncio
+
+from enum import Enum
+from VRFSystemCommunicator import VRFSystemCommunicator
+
+class VRFSystemReconciler():
+    """室内機の目標状態を保持し、エミュレータの状態との差分だけを書き込むクラス
+    """
+
+# region 定数宣言
+
+    # 室温設定値が一致しているとみなす差[C]
+    SETPOINT_TOLERANCE = 0.05
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, vrf_comm):
+        """インスタンスを初期化する
+
+        Args:
+            vrf_comm (VRFSystemCommunicator): 通信に使うVRFSystemCommunicator
+        """
+        self.vrf_comm = vrf_comm
+
+        # (室外機番号, 室内機番号)ごとの目標状態
+        self.desired_states = {}
+
+# endregion
+
+# region 目標状態の設定
+
+    def set_desired_state(self, oUnitIndex, iUnitIndex, on_off=None, mode=None, setpoint_temperature=None,
+                          fan_speed=None, direction=None, local_control_permitted=None):
+        """室内機の目標状態を設定する（Noneの項目は現在の目標を変えない）
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+            iUnitIndex (int): 室内機番号（1～5）
+            on_off (bool): 起動しているか否か
+            mode (Mode): 運転モード
+            setpoint_temperature (float): 室温設定値[C]
+            fan_speed (FanSpeed): ファン風量
+            direction (Direction): 風向
+            local_control_permitted (bool): 手元リモコン操作を許可するか否か
+        """
+        state = self.desired_states.setdefault((oUnitIndex, iUnitIndex), {})
+        items = {
+            'on_off': on_off,
+            'mode': mode,
+            'setpoint_temperature': setpoint_temperature,
+            'fan_speed': fan_speed,
+            'direction': direction,
+            'local_control_permitted': local_control_permitted,
+        }
+        for name, value in items.items():
+            if value is not None:
+                state[name] = value
+
+    def clear_desired_state(self, oUnitIndex=None, iUnitIndex=None):
+        """目標状態を消去する（番号を省略した場合は全室内機）
+        Args:
+            oUnitIndex (int): 室外機番号（1～4）
+            iUnitIndex (int): 室内機番号（1～5）
+        """
+        if oUnitIndex is None:
+            self.desired_states.clear()
+        else:
+            self.desired_states.pop((oUnitIndex, iUnitIndex), None)
+
+# endregion
+
+# region 差分の計算と書き込み
+
+    def get_differences(self, iu, iu_valid):
+        """スナップショットと目標状態の差分を求める
+        Args:
+            iu (ndarray): VRFSystemCommunicator.snapshotで得た室内機の状態
+            iu_valid (ndarray): VRFSystemCommunicator.snapshotで得た室内機の値の有効性
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの、目標と異なる項目とその目標値
+        """
+        rows = {(int(iu['o_unit'][k]), int(iu['i_unit'][k])): k for k in range(len(iu))}
+
+        diffs = {}
+        for key, state in self.desired_states.items():
+            k = rows.get(key)
+            for name, value in state.items():
+                if k is None or not iu_valid[name][k] or not self._is_same(name, value, iu[name][k]):
+                    diffs.setdefault(key, {})[name] = value
+        return diffs
+
+    async def diff(self):
+        """エミュレータの状態を読み取り、目標状態との差分を求める
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの、目標と異なる項目とその目標値
+        """
+        iu, iu_valid, _, _ = await self.vrf_comm.snapshot()
+        return self.get_differences(iu, iu_valid)
+
+    async def reconcile(self):
+        """目標状態と異なる項目だけを並行して書き込む
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの、書き込んだ項目と（書き込み成功の真偽, エラー）
+        """
+        diffs = await self.diff()
+
+        keys = []
+        obj_values = []
+        for (oIndx, iIndx), state in diffs.items():
+            for name, value in state.items():
+                keys.append(((oIndx, iIndx), name))
+                obj_values.append(self.vrf_comm._get_iu_setting(oIndx, iIndx, name, value))
+        rslts = await self.vrf_comm.write_present_values(self.vrf_comm.target_ip, obj_values)
+
+        written = {}
+        for (unit, name), rslt in zip(keys, rslts):
+            written.setdefault(unit, {})[name] = rslt
+        return written
+
+    async def wait_converged(self, timeout_sec=10.0, interval_sec=1.0):
+        """エミュレータの状態が目標状態に一致するまで待つ
+        Args:
+            timeout_sec (float): タイムアウトまでの時間[sec]
+            interval_sec (float): 状態を読み取る間隔[sec]
+        Returns:
+            list(bool,dict): 一致したか否か,残っている差分
+        """
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + timeout_sec
+        while True:
+            diffs = await self.diff()
+            if len(diffs) == 0:
+                return True, diffs
+            if end_time <= loop.time():
+                return False, diffs
+            await asyncio.sleep(min(interval_sec, max(0, end_time - loop.time())))
+
+# endregion
+
+# region 補助メソッド
+
+    def _is_same(self, name, desired, current):
+        if isinstance(desired, Enum):
+            desired = desired.value
+        if name == 'setpoint_temperature':
+            return abs(float(current) - desired) < self.SETPOINT_TOLERANCE
+        return current == desired
+
+# endregion
+
+# region サンプル
+
+async def main():
+    vrfCom = VRFSystemCommunicator(12)
+    reconciler = VRFSystemReconciler(vrfCom)
+
+    # 全室内機を冷房26Cで起動する
+    for oIndx, iIndx in vrfCom._get_iu_indices():
+        reconciler.set_desired_state(oIndx, iIndx,
+                                     on_off=True,
+                                     mode=VRFSystemCommunicator.Mode.Cooling,
+                                     setpoint_temperature=26,
+                                     fan_speed=VRFSystemCommunicator.FanSpeed.Middle,
+                                     direction=VRFSystemCommunicator.Direction.Degree_450)
+
+    written = await reconciler.reconcile()
+    print(str(sum(len(v) for v in written.values())) + ' points written')
+
+    converged, diffs = await reconciler.wait_converged(timeout_sec=30)
+    print('converged' if converged else 'not converged: ' + str(diffs))
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion
@@ -4,6 +4,7 @@ import asyncio
 
 from enum import Enum
 from bacpypes3.primitivedata import Enumerated, Unsigned
+from UnitGroups import UnitGroups
 
 class VentilationSystemCommunicator(PresentValueReadWriter.PresentValueReadWriter):
 
@@ -41,7 +42,7 @@ class VentilationSystemCommunicator(PresentValueReadWriter.PresentValueReadWrite
 
 # region コンストラクタ
 
-    def __init__(self, id, name='vntComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0):
+    def __init__(self, id, name='vntComm', device_ip='127.0.0.1', emulator_ip='127.0.0.1', time_out_sec=1.0, port=None):
         """インスタンスを初期化する
 
         Args:
@@ -49,10 +50,14 @@ class VentilationSystemCommunicator(PresentValueReadWriter.PresentValueReadWrite
             name (str): 通信用のDeviceの名前
             device_ip (str): 通信に使うDeviceのIP Address（xxx.xxx.xxx.xxx）
             emulator_ip (str): エミュレータのIP Address（xxx.xxx.xxx.xxx）
+            port (int): 通信に使うDeviceのポート（Noneの場合は0xBAC0+id）
         """
-        super().__init__(id, name, device_ip, emulator_ip, time_out_sec)
+        super().__init__(id, name, device_ip, emulator_ip, time_out_sec, port)
         self.target_ip = emulator_ip + ':' + str(self.VENTCTRL_EXCLUSIVE_PORT)
 
+        # 全熱交換器（室内機と同じ番号）のグループ
+        self.groups = UnitGroups()
+
 # endregion
 
 # region テナント別の処理
@@ -74,6 +79,28 @@ class VentilationSystemCommunicator(PresentValueReadWriter.PresentValueReadWrite
         inst = 'analogInput:' + str(self._member.NorthCO2Level.value)
         return await self.read_present_value(self.target_ip,inst)
 
+    def watch_tenant_CO2_levels(self, min_change=10.0, max_interval=None):
+        """南側と北側のテナントのCO2濃度[ppm]の変化を順に返す（async forで使う）
+        Args:
+            min_change (float): 最後に返した値からの変化がこれ未満の場合は返さない[ppm]
+            max_interval (float): 変化がなくてもこの時間[sec]が経過したら最新の値を返す（Noneの場合は返さない）
+        Returns:
+            AsyncIterator: （'south'または'north', CO2濃度[ppm]）
+        """
+        tenants = {
+            'analogInput:' + str(self._member.SouthCO2Level.value): 'south',
+            'analogInput:' + str(self._member.NorthCO2Level.value): 'north',
+        }
+
+        async def watch():
+            updates = self.watch([(self.target_ip, inst) for inst in tenants], min_change, max_interval)
+            try:
+                async for _, obj_id, value in updates:
+                    yield tenants[obj_id], value
+            finally:
+                await updates.aclose()
+        return watch()
+
 # endregion    
 
 # region Hex
@@ -154,8 +181,64 @@ class VentilationSystemCommunicator(PresentValueReadWriter.PresentValueReadWrite
 
 # endregion
 
+# region グループ操作
+
+    async def start_ventilation_group(self, group):
+        """グループの換気（全熱交換器）を並行して起動する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_group(group,'binaryOutput',self._member.HexOnOff.value,Enumerated(1))
+
+    async def stop_ventilation_group(self, group):
+        """グループの換気（全熱交換器）を並行して停止する
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_group(group,'binaryOutput',self._member.HexOnOff.value,Enumerated(0))
+
+    async def enable_bypass_control_group(self, group):
+        """グループのバイパス制御を並行して有効にする
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_group(group,'binaryOutput',self._member.HexBypassEnabled.value,Enumerated(1))
+
+    async def disable_bypass_control_group(self, group):
+        """グループのバイパス制御を並行して無効にする
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_group(group,'binaryOutput',self._member.HexBypassEnabled.value,Enumerated(0))
+
+    async def change_fan_speed_group(self, group, speed):
+        """グループのファン風量を並行して変える
+        Args:
+            group (Union[str,list(list(int,int))]): グループ名、または(室外機番号, 室内機番号)のリスト
+            speed (FanSpeed): ファン風量
+        Returns:
+            dict: (室外機番号, 室内機番号)ごとの（命令が成功したか否か, エラー）
+        """
+        return await self._write_group(group,'multiStateOutput',self._member.HexFanSpeed.value,Unsigned(speed.value))
+
+# endregion
+
 # region 補助メソッド
 
+    async def _write_group(self, group, obj_type, mem_id, value):
+        units = self.groups.get_units(group)
+        obj_values = [(obj_type + ':' + self._get_instance_number(oIndx,iIndx,mem_id), value) for oIndx, iIndx in units]
+        rslts = await self.write_present_values(self.target_ip,obj_values)
+        return dict(zip(units, rslts))
+
     def _get_instance_number(self,oUnitIndex,iUnitIndex,mem_id):
         return str(1000 * oUnitIndex + 100 * iUnitIndex + mem_id)
 
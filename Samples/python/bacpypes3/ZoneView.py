@@ -0,0 +1,161 @@
+import asyncio
+
+from UnitGroups import UnitGroups
+from EnvironmentCommunicator import EnvironmentCommunicator
+from VRFSystemCommunicator import VRFSystemCommunicator
+from VentilationSystemCommunicator import VentilationSystemCommunicator
+from OccupantCommunicator import OccupantCommunicator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class ZoneView():
+    """ゾーンごとの環境・空調・換気・執務者の情報を4つのデバイスから並行して読み取るクラス
+
+    1行が1台の室内機（= 1つのゾーン）に対応する表を作る。
+    各デバイスへはReadPropertyMultipleでまとめて読み取り、4つのデバイスへの要求は並行して送る。
+    """
+
+# region 定数宣言
+
+    # 表の列（列名, numpyの型）
+    COLUMNS = [
+        ('o_unit', 'u1'),
+        ('i_unit', 'u1'),
+        ('tenant', 'u1'),
+        ('zone', 'u1'),
+        ('zone_drybulb_temperature', 'f4'),
+        ('zone_relative_humidity', 'f4'),
+        ('setpoint_temperature', 'f4'),
+        ('return_air_temperature', 'f4'),
+        ('ventilation_fan_speed', 'u1'),
+        ('occupant_number', 'f4'),
+        ('averaged_thermal_sensation', 'f4'),
+        ('averaged_clothing_index', 'f4'),
+        ('thermally_dissatisfied_rate', 'f4'),
+        ('dissatisfied_rate_caused_by_draft', 'f4'),
+        ('dissatisfied_rate_caused_by_vertical_temperature_distribution', 'f4'),
+    ]
+
+# endregion
+
+# region コンストラクタ
+
+    def __init__(self, comm):
+        """インスタンスを初期化する
+
+        Args:
+            comm (PresentValueReadWriter): 通信に使うインスタンス（どの通信クラスでもよい）
+        """
+        if np is None:
+            raise ImportError('ZoneView requires numpy')
+
+        self.comm = comm
+        self.groups = UnitGroups()
+        self.units = self.groups.get_units('all')
+
+        ip = comm.emulator_ip + ':'
+        env_ip = ip + str(EnvironmentCommunicator.ENVIRONMENTMONITOR_EXCLUSIVE_PORT)
+        vrf_ip = ip + str(VRFSystemCommunicator.VRFCTRL_EXCLUSIVE_PORT)
+        vnt_ip = ip + str(VentilationSystemCommunicator.VENTCTRL_EXCLUSIVE_PORT)
+        occ_ip = ip + str(OccupantCommunicator.OCCUPANTMONITOR_EXCLUSIVE_PORT)
+
+        envMem = EnvironmentCommunicator._member
+        vrfMem = VRFSystemCommunicator._member
+        vntMem = VentilationSystemCommunicator._member
+        occMem = OccupantCommunicator._member
+
+        # 室内機・ゾーンの対応とデバイスごとの読み取る点（行番号, 列名, オブジェクトID）を前もって作っておく
+        self._keys = []
+        self._points = {env_ip: [], vrf_ip: [], vnt_ip: [], occ_ip: []}
+        for row, (oIndx, iIndx) in enumerate(self.units):
+            tenant, zone = self.groups.get_zone(oIndx, iIndx)
+            tenant = OccupantCommunicator.Tenant.South if tenant == 'south' else OccupantCommunicator.Tenant.North
+            self._keys.append((oIndx, iIndx, tenant.value, zone))
+
+            iuNum = 1000 * oIndx + 100 * iIndx
+            znNum = 10000 * tenant.value + 1000 * zone
+            self._points[env_ip] += [
+                (row, 'zone_drybulb_temperature', 'analogInput:' + str(iuNum + envMem.DrybulbTemperature.value)),
+                (row, 'zone_relative_humidity', 'analogInput:' + str(iuNum + envMem.RelativeHumdity.value)),
+            ]
+            self._points[vrf_ip] += [
+                (row, 'setpoint_temperature', 'analogInput:' + str(iuNum + vrfMem.Setpoint_Status.value)),
+                (row, 'return_air_temperature', 'analogInput:' + str(iuNum + vrfMem.MeasuredRoomTemperature.value)),
+            ]
+            self._points[vnt_ip] += [
+                (row, 'ventilation_fan_speed', 'multiStateOutput:' + str(iuNum + vntMem.HexFanSpeed.value)),
+            ]
+            self._points[occ_ip] += [
+                (row, 'occupant_number', 'analogInput:' + str(znNum + occMem.OccupantNumber.value)),
+                (row, 'averaged_thermal_sensation', 'analogInput:' + str(znNum + occMem.ThermalSensation.value)),
+                (row, 'averaged_clothing_index', 'analogInput:' + str(znNum + occMem.ClothingIndex.value)),
+                (row, 'thermally_dissatisfied_rate', 'analogInput:' + str(znNum + occMem.Dissatisfied_Thermal.value)),
+                (row, 'dissatisfied_rate_caused_by_draft', 'analogInput:' + str(znNum + occMem.Dissatisfied_Draft.value)),
+                (row, 'dissatisfied_rate_caused_by_vertical_temperature_distribution', 'analogInput:' + str(znNum + occMem.Dissatisfied_VerticalTemp.value)),
+            ]
+
+# endregion
+
+# region 読み取り
+
+    async def read(self):
+        """全ゾーンの情報を読み取る
+
+        Returns:
+            list(ndarray,ndarray): ゾーンごとの情報の表,値の有効性（同じ列名の真偽の表）
+        """
+        addrs = list(self._points.keys())
+        rslts = await asyncio.gather(*[
+            self.comm.read_present_values(addr, [obj_id for _, _, obj_id in self._points[addr]]) for addr in addrs])
+        return self._make_table(dict(zip(addrs, rslts)))
+
+    async def read_step_consistent(self, max_retries=3):
+        """全ゾーンの情報を、すべて同じシミュレーションステップの値で読み取る
+
+        Args:
+            max_retries (int): 途中でステップが進んだ場合に読み直す最大回数
+
+        Returns:
+            list(bool,datetime,ndarray,ndarray): すべての値が同じステップのものか否か,ステップの日時,ゾーンごとの情報の表,値の有効性
+        """
+        requests = {addr: [obj_id for _, _, obj_id in points] for addr, points in self._points.items()}
+        success, step, results = await self.comm.read_step_consistent(requests, max_retries)
+        table, valid = self._make_table({addr: rslt[1] for addr, rslt in results.items()})
+        return success, step, table, valid
+
+    def _make_table(self, rslts):
+        table = np.zeros(len(self.units), dtype=self.COLUMNS)
+        valid = np.zeros(len(self.units), dtype=[(name, '?') for name, _ in self.COLUMNS[4:]])
+        for col, (name, _) in enumerate(self.COLUMNS[:4]):
+            table[name] = [key[col] for key in self._keys]
+
+        for addr, vals in rslts.items():
+            for (row, name, _), (success, value) in zip(self._points[addr], vals):
+                if success:
+                    table[name][row] = value
+                    valid[name][row] = True
+        return table, valid
+
+# endregion
+
+# region サンプル
+
+async def main():
+    view = ZoneView(VRFSystemCommunicator(12))
+    while True:
+        table, valid = await view.read()
+        for row in table:
+            print('VRF' + str(row['o_unit']) + '-' + str(row['i_unit']) +
+                  ' (tenant ' + str(row['tenant']) + ', zone ' + str(row['zone']) + '): ' +
+                  '{:.1f}'.format(row['zone_drybulb_temperature']) + ' C, ' +
+                  'SP ' + '{:.1f}'.format(row['setpoint_temperature']) + ' C, ' +
+                  'TS ' + '{:.2f}'.format(row['averaged_thermal_sensation']))
+        await asyncio.sleep(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# endregion